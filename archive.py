@@ -0,0 +1,214 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+from board import Board
+from position import Position, STARTING_FEN, move_name, square_file, square_rank
+
+# A game archive is two append-only files:
+#   <path>      game records one after another
+#   <path>.idx  the offset of every record as an unsigned 64-bit integer, so game n is one seek away
+# A record is a 4 byte header (move count, result, length of the start FEN or 0 for the initial
+# position), the FEN if there is one, then one little-endian 16-bit word per move:
+#   bits 0-5 from square, bits 6-11 to square (rank * 8 + file, rank 0 at the top like the 0x88
+#   squares), bits 12-15 the promotion piece type (Piece.queen, Piece.rook, ...) or 0
+RECORD_HEADER = struct.Struct("<HBB")
+OFFSET = struct.Struct("<Q")
+
+RESULTS = ("*", "1-0", "0-1", "1/2-1/2")
+
+
+def encode_move(move):
+    from_sq, to_sq, promotion = move
+    return ((from_sq >> 4) * 8 + (from_sq & 7)) | ((to_sq >> 4) * 8 + (to_sq & 7)) << 6 | promotion << 12
+
+
+def decode_move(code):
+    from_sq = code & 63
+    to_sq = code >> 6 & 63
+    return ((from_sq >> 3) << 4 | from_sq & 7, (to_sq >> 3) << 4 | to_sq & 7, code >> 12)
+
+
+class GameRecord:
+    def __init__(self, moves, start_fen=STARTING_FEN, result="*"):
+        self.moves = moves
+        self.start_fen = start_fen
+        self.result = result
+
+
+class ArchiveWriter:
+    # Appends games. Each record is written before its index entry, so a crash can at worst leave
+    # a record without an entry, which readers never see.
+    def __init__(self, path):
+        self.data = open(path, "ab")
+        self.index = open(path + ".idx", "ab")
+        self.count = self.index.tell() // OFFSET.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+    def append(self, moves, start_fen=STARTING_FEN, result="*"):
+        # Returns the new game's number
+        fen = b"" if start_fen == STARTING_FEN else start_fen.encode("ascii")
+        if len(moves) > 0xFFFF or len(fen) > 0xFF:
+            raise ValueError("game too long for the archive format")
+
+        words = array('H', [encode_move(move) for move in moves])
+        if sys.byteorder == "big":
+            words.byteswap()
+
+        offset = self.data.tell()
+        self.data.write(RECORD_HEADER.pack(len(moves), RESULTS.index(result), len(fen)) + fen + words.tobytes())
+        self.index.write(OFFSET.pack(offset))
+        self.count += 1
+        return self.count - 1
+
+    def flush(self):
+        self.data.flush()
+        self.index.flush()
+
+
+class ArchiveReader:
+    # Random access to an archive through memory maps. Opening costs nothing however big the
+    # archive is; reading game n touches its index entry and its record only.
+    def __init__(self, path):
+        self.path = path
+        self.data_file = open(path, "rb")
+        self.index_file = open(path + ".idx", "rb")
+        self.count = os.fstat(self.index_file.fileno()).st_size // OFFSET.size
+        self.data = mmap.mmap(self.data_file.fileno(), 0, access=mmap.ACCESS_READ) if self.count else b""
+        self.index = mmap.mmap(self.index_file.fileno(), 0, access=mmap.ACCESS_READ) if self.count else b""
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.count:
+            self.data.close()
+            self.index.close()
+        self.data_file.close()
+        self.index_file.close()
+
+    def __getitem__(self, number):
+        if not 0 <= number < self.count:
+            raise IndexError(f"game {number} not in archive of {self.count}")
+        offset = OFFSET.unpack_from(self.index, number * OFFSET.size)[0]
+        move_count, result, fen_length = RECORD_HEADER.unpack_from(self.data, offset)
+        offset += RECORD_HEADER.size
+        start_fen = self.data[offset:offset + fen_length].decode("ascii") if fen_length else STARTING_FEN
+        offset += fen_length
+
+        words = array('H', self.data[offset:offset + 2 * move_count])
+        if sys.byteorder == "big":
+            words.byteswap()
+        return GameRecord([decode_move(code) for code in words], start_fen, RESULTS[result])
+
+    def __iter__(self):
+        for number in range(self.count):
+            yield self[number]
+
+    def replay(self, number):
+        # Yields the position after each move of game number, playing the moves one at a time as
+        # they're asked for. It is the same Position every time; copy() it to keep a state.
+        record = self[number]
+        position = Position(record.start_fen)
+        for move in record.moves:
+            position.make_move(move)
+            yield position
+
+    def board(self, number, ply=None):
+        # A Board showing game number after ply moves (the final position by default)
+        record = self[number]
+        board = Board()
+        board.load_fen(record.start_fen)
+        moves = record.moves if ply is None else record.moves[:ply]
+        for move in moves:
+            board.position.make_move(move)
+        board.sync_pieces()
+        board.update_move_table()
+        if moves:
+            from_sq, to_sq, _ = moves[-1]
+            board.last_move = (square_file(from_sq), square_rank(from_sq), square_file(to_sq), square_rank(to_sq))
+
+        # The rules decide checkmate and the draws; a final result they don't explain (a resignation,
+        # a loss on time, an agreed draw) is taken from the record
+        result = board.position.game_result()
+        if ply is None and record.result != "*" and (result is None or result[0] != record.result):
+            result = (record.result, "recorded")
+        board.result = result
+        if result is not None:
+            board.checkmate = result[1] == "checkmate"
+            board.stalemate = result[1] == "stalemate"
+        return board
+
+
+def import_pgn(pgn_path, archive_path):
+    # Appends every game of a PGN file; returns (games, moves, games skipped for illegal moves)
+    from pgn import read_pgn
+
+    games = moves = skipped = 0
+    with ArchiveWriter(archive_path) as writer:
+        for game in read_pgn(pgn_path):
+            try:
+                game_moves = list(game.mainline())
+            except ValueError:
+                skipped += 1
+                continue
+            writer.append(game_moves, game.start_fen(), game.result if game.result in RESULTS else "*")
+            games += 1
+            moves += len(game_moves)
+    return games, moves, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and read binary game archives.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    importer = subparsers.add_parser("import", help="append the games of a PGN file to an archive")
+    importer.add_argument("pgn")
+    importer.add_argument("archive")
+    show = subparsers.add_parser("show", help="print one game of an archive")
+    show.add_argument("archive")
+    show.add_argument("game", type=int)
+    stats = subparsers.add_parser("stats", help="size and read speed of an archive")
+    stats.add_argument("archive")
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        start = time.perf_counter()
+        games, moves, skipped = import_pgn(args.pgn, args.archive)
+        print(f"{games} games, {moves} moves imported in {time.perf_counter() - start:.1f}s, {skipped} skipped")
+    elif args.command == "show":
+        with ArchiveReader(args.archive) as reader:
+            record = reader[args.game]
+            print(record.start_fen)
+            print(" ".join(move_name(move) for move in record.moves), record.result)
+    else:
+        with ArchiveReader(args.archive) as reader:
+            size = os.path.getsize(args.archive) + os.path.getsize(args.archive + ".idx")
+            start = time.perf_counter()
+            moves = sum(len(record.moves) for record in reader)
+            elapsed = time.perf_counter() - start
+            print(f"{len(reader)} games, {moves} moves, {size} bytes ({size / max(moves, 1):.2f} bytes per move)")
+            print(f"read every game in {elapsed:.2f}s ({len(reader) / elapsed if elapsed else 0:,.0f} games/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from epd import parse_epd
+from evaluate import evaluate
+from position import Position
+
+FIELDS = ["fen", "legal_moves", "in_check", "checkmate", "stalemate", "evaluation", "error"]
+
+# Each worker process sets up one Position and reuses it for every line it is sent
+_position = None
+
+
+def init_worker():
+    global _position
+    _position = Position(None)
+
+
+def analyze(position, line):
+    # One result dict for a FEN or EPD line. A line that can't be analyzed gets an error instead,
+    # whatever went wrong, so one bad line never takes down a worker and the rest of its chunk.
+    try:
+        fen, _ = parse_epd(line)
+        position.set_fen(fen)
+        color = position.color_to_move
+        moves = position.legal_moves(color)
+        in_check = position.is_in_check(color)
+        evaluation = evaluate(position)
+    except ValueError as error:
+        return {"fen": line, "error": str(error)}
+    except Exception as error:
+        return {"fen": line, "error": f"{type(error).__name__}: {error}"}
+
+    return {
+        "fen": fen,
+        "legal_moves": len(moves),
+        "in_check": in_check,
+        "checkmate": in_check and not moves,
+        "stalemate": not in_check and not moves,
+        "evaluation": evaluation
+    }
+
+
+def analyze_chunk(lines):
+    if _position is None:
+        init_worker()
+    start = time.perf_counter()
+    results = [analyze(_position, line) for line in lines]
+    return os.getpid(), time.perf_counter() - start, results
+
+
+def chunked(lines, chunk_size):
+    chunk = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        chunk.append(line)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def analyze_stream(lines, workers=None, chunk_size=500, stats=None):
+    # Yields one result per position, in input order. Lines are sent to the pool in chunks, and only
+    # a couple of chunks per worker are in flight at a time, so input of any size runs in bounded memory.
+    # stats, if given, is filled with {worker pid: [positions, busy seconds]}.
+    workers = workers or os.cpu_count() or 1
+    pending = deque()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        for chunk in chunked(lines, chunk_size):
+            pending.append(executor.submit(analyze_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield from collect(pending.popleft(), stats)
+        while pending:
+            yield from collect(pending.popleft(), stats)
+
+
+def collect(future, stats):
+    pid, busy, results = future.result()
+    if stats is not None:
+        worker = stats.setdefault(pid, [0, 0.0])
+        worker[0] += len(results)
+        worker[1] += busy
+    return results
+
+
+def write_results(results, output, output_format):
+    count = 0
+    if output_format == "csv":
+        writer = csv.DictWriter(output, fieldnames=FIELDS)
+        writer.writeheader()
+        for result in results:
+            writer.writerow(result)
+            count += 1
+    else:
+        for result in results:
+            output.write(json.dumps(result) + "\n")
+            count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Legal move counts, check/mate status and evaluation for many positions.")
+    parser.add_argument("input", nargs="?", default="-", help="file with one FEN or EPD per line (default: stdin)")
+    parser.add_argument("-o", "--output", default="-", help="where to write the results (default: stdout)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="positions sent to a worker at a time")
+    args = parser.parse_args(argv)
+
+    input_file = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    output_file = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+
+    stats = {}
+    start = time.perf_counter()
+    try:
+        count = write_results(analyze_stream(input_file, args.workers, args.chunk_size, stats), output_file, args.format)
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"{count} positions in {elapsed:.2f}s ({count / elapsed if elapsed else 0:,.0f} positions/s)", file=sys.stderr)
+    for pid, (positions, busy) in sorted(stats.items()):
+        print(f"  worker {pid}: {positions} positions, {busy:.2f}s busy ({positions / busy if busy else 0:,.0f} positions/s)",
+              file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
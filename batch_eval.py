@@ -0,0 +1,224 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from batch import chunked
+from evaluate import PIECE_VALUES, SQUARE_SCORES
+from piece import Piece
+from position import SQUARES
+
+# Static evaluation of many positions at once. A batch is an (N, 64) int8 array of piece codes
+# (Piece.pawn..Piece.king | Piece.white/Piece.black, 0 for empty) with squares 0-63 in FEN order,
+# a8 to h1, which is rank * 8 + file with rank 0 at the top like the 0x88 squares. Every term is
+# computed for the whole batch with array operations, FEN parsing included.
+TERMS = ("material", "piece_square", "mobility", "score")
+
+PIECE_CODES = [kind | color for color in (Piece.white, Piece.black)
+               for kind in (Piece.pawn, Piece.knight, Piece.bishop, Piece.rook, Piece.queen, Piece.king)]
+
+# Per FEN placement character: the piece code it stands for and how many squares it covers. Digits
+# are that many empty squares, '/' covers none, and anything else is marked invalid with -1.
+FEN_CODES = np.zeros(256, dtype=np.int8)
+FEN_WIDTHS = np.full(256, -1, dtype=np.int8)
+FEN_WIDTHS[ord('/')] = 0
+for _count in range(1, 9):
+    FEN_WIDTHS[ord(str(_count))] = _count
+for _letter, _kind in {'p': Piece.pawn, 'n': Piece.knight, 'b': Piece.bishop, 'r': Piece.rook,
+                       'q': Piece.queen, 'k': Piece.king}.items():
+    FEN_CODES[ord(_letter)] = _kind | Piece.black
+    FEN_CODES[ord(_letter.upper())] = _kind | Piece.white
+    FEN_WIDTHS[ord(_letter)] = FEN_WIDTHS[ord(_letter.upper())] = 1
+
+# evaluate.SQUARE_SCORES flattened to piece code * 64 + square, so a batch is scored with one gather
+SCORE_TABLE = np.zeros(32 * 64, dtype=np.int16)
+for _code in PIECE_CODES:
+    for _index, _sq in enumerate(SQUARES):
+        SCORE_TABLE[_code * 64 + _index] = SQUARE_SCORES[_code][_sq]
+SQUARE_OFFSETS = np.arange(64, dtype=np.int16)
+
+# Bitboard masks that stop shifts wrapping from one edge of the board to the other
+NOT_FILE_A = np.uint64(0xFEFEFEFEFEFEFEFE)
+NOT_FILE_H = np.uint64(0x7F7F7F7F7F7F7F7F)
+NOT_FILE_AB = np.uint64(0xFCFCFCFCFCFCFCFC)
+NOT_FILE_GH = np.uint64(0x3F3F3F3F3F3F3F3F)
+
+# (shift, mask): positive shifts go left, towards h1. Bit n is square n, so +1 is one file right
+# and +8 one rank down the board.
+ROOK_SHIFTS = ((-8, None), (8, None), (1, NOT_FILE_A), (-1, NOT_FILE_H))
+BISHOP_SHIFTS = ((-7, NOT_FILE_A), (9, NOT_FILE_A), (-9, NOT_FILE_H), (7, NOT_FILE_H))
+KNIGHT_SHIFTS = ((-17, NOT_FILE_H), (-15, NOT_FILE_A), (-10, NOT_FILE_GH), (-6, NOT_FILE_AB),
+                 (6, NOT_FILE_GH), (10, NOT_FILE_AB), (15, NOT_FILE_H), (17, NOT_FILE_A))
+
+# Positions handled per array operation when reading a stream; keeps temporaries in cache-friendly sizes
+DEFAULT_CHUNK_SIZE = 65536
+
+
+def pack_fens(fens):
+    # (boards, white_to_move) for a list of FEN strings, parsed as one byte array: the placement of
+    # every line is found with a search for its first space, then expanded to 64 squares by
+    # repeating each character's code by the number of squares it covers.
+    if not fens:
+        return np.zeros((0, 64), dtype=np.int8), np.zeros(0, dtype=bool)
+    text = np.frombuffer(("\n".join(fens) + "\n").encode("ascii"), dtype=np.uint8)
+    ends = np.flatnonzero(text == ord('\n'))
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    spaces = np.flatnonzero(text == ord(' '))
+    if len(spaces) == 0:
+        raise ValueError(f"FEN needs a side to move at position 0: {fens[0]!r}")
+    placement_ends = spaces[np.minimum(np.searchsorted(spaces, starts), len(spaces) - 1)]
+    missing = placement_ends >= ends
+    if missing.any():
+        index = int(np.argmax(missing))
+        raise ValueError(f"FEN needs a side to move at position {index}: {fens[index]!r}")
+
+    # Mark the placement characters: +1 where a placement starts, -1 where it ends
+    inside = np.zeros(len(text) + 1, dtype=np.int8)
+    inside[starts] = 1
+    inside[placement_ends] -= 1
+    characters = text[np.cumsum(inside[:-1], dtype=np.int8).view(bool)]
+
+    widths = FEN_WIDTHS[characters]
+    first_characters = np.concatenate(([0], np.cumsum(placement_ends - starts)[:-1]))
+    slashes = np.flatnonzero(characters == ord('/'))
+    invalid = (np.add.reduceat(widths, first_characters, dtype=np.int32) != 64) | (
+        np.minimum.reduceat(widths, first_characters) < 0) | (
+        np.diff(np.searchsorted(slashes, first_characters), append=len(slashes)) != 7)
+    if not invalid.any():
+        # With 7 slashes a line, every rank is 8 squares wide when the running count of squares
+        # reaches 8, 16, ... 56 at a line's slashes, plus 64 for every line before it
+        counted = np.cumsum(widths, dtype=np.int32)[slashes]
+        numbers = np.arange(len(slashes))
+        invalid = counted != 8 * (numbers + numbers // 7 + 1)
+        invalid = np.bincount(numbers[invalid] // 7, minlength=len(fens)) > 0
+    if invalid.any():
+        index = int(np.argmax(invalid))
+        raise ValueError(f"bad FEN placement at position {index}: {fens[index]!r}")
+
+    boards = np.repeat(FEN_CODES[characters], widths).reshape(-1, 64)
+    return boards, text[placement_ends + 1] == ord('w')
+
+
+def pack_positions(positions):
+    # The same arrays for Position objects
+    boards = np.array([position.squares for position in positions], dtype=np.int8)[:, SQUARES]
+    return boards, np.array([position.color_to_move == Piece.white for position in positions], dtype=bool)
+
+
+def to_planes(boards):
+    # (N, 12, 64) int8 one-hot planes in PIECE_CODES order: white pawn..king, then black pawn..king
+    return (boards[:, None, :] == np.array(PIECE_CODES, dtype=np.int8)[None, :, None]).astype(np.int8)
+
+
+def piece_bitboards(boards):
+    # {piece code: (N,) uint64}, bit n set when square n holds that piece
+    bitboards = {}
+    for code in PIECE_CODES:
+        bits = np.packbits(boards == code, axis=1, bitorder="little")
+        bitboards[code] = bits.view("<u8").ravel()
+    return bitboards
+
+
+def shift(bitboard, amount, mask):
+    bitboard = bitboard << np.uint64(amount) if amount > 0 else bitboard >> np.uint64(-amount)
+    return bitboard if mask is None else bitboard & mask
+
+
+def slider_targets(sliders, empty, amount, mask):
+    # Squares the sliders reach in one direction, up to and including the first piece (Kogge-Stone fill)
+    if mask is not None:
+        empty = empty & mask
+    sliders = sliders | empty & shift(sliders, amount, None)
+    empty = empty & shift(empty, amount, None)
+    sliders = sliders | empty & shift(sliders, 2 * amount, None)
+    empty = empty & shift(empty, 2 * amount, None)
+    sliders = sliders | empty & shift(sliders, 4 * amount, None)
+    return shift(sliders, amount, mask)
+
+
+def side_mobility(bitboards, color, occupied):
+    # Pseudo-legal knight, bishop, rook and queen moves for one side, summed over its pieces. Each
+    # direction is counted separately so pieces sharing a target square all get it.
+    own = np.zeros_like(occupied)
+    for kind in (Piece.pawn, Piece.knight, Piece.bishop, Piece.rook, Piece.queen, Piece.king):
+        own |= bitboards[kind | color]
+    not_own = ~own
+    empty = ~occupied
+
+    count = np.zeros(len(occupied), dtype=np.int32)
+    knights = bitboards[Piece.knight | color]
+    for amount, mask in KNIGHT_SHIFTS:
+        count += np.bitwise_count(shift(knights, amount, mask) & not_own)
+
+    queens = bitboards[Piece.queen | color]
+    for sliders, shifts in ((bitboards[Piece.rook | color] | queens, ROOK_SHIFTS),
+                            (bitboards[Piece.bishop | color] | queens, BISHOP_SHIFTS)):
+        for amount, mask in shifts:
+            count += np.bitwise_count(slider_targets(sliders, empty, amount, mask) & not_own)
+    return count
+
+
+def evaluate_batch(boards, white_to_move):
+    # (N, 4) int32 with the TERMS columns. material, piece_square and mobility are from white's point
+    # of view; score is material + piece_square from the side to move's, the same as evaluate.evaluate.
+    bitboards = piece_bitboards(boards)
+    occupied = np.zeros(len(boards), dtype=np.uint64)
+    for bitboard in bitboards.values():
+        occupied |= bitboard
+
+    material = np.zeros(len(boards), dtype=np.int32)
+    for kind in (Piece.pawn, Piece.knight, Piece.bishop, Piece.rook, Piece.queen):
+        counts = (np.bitwise_count(bitboards[kind | Piece.white]).astype(np.int32)
+                  - np.bitwise_count(bitboards[kind | Piece.black]))
+        material += PIECE_VALUES[kind] * counts
+
+    total = SCORE_TABLE[boards.astype(np.int16) * 64 + SQUARE_OFFSETS].sum(axis=1, dtype=np.int32)
+
+    terms = np.empty((len(boards), len(TERMS)), dtype=np.int32)
+    terms[:, 0] = material
+    terms[:, 1] = total - material
+    terms[:, 2] = side_mobility(bitboards, Piece.white, occupied) - side_mobility(bitboards, Piece.black, occupied)
+    terms[:, 3] = np.where(white_to_move, total, -total)
+    return terms
+
+
+def evaluate_fens(fens):
+    return evaluate_batch(*pack_fens(fens))
+
+
+def evaluate_stream(lines, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Yields an (n, 4) array per chunk of FEN or EPD lines; blank lines and # comments are skipped
+    for chunk in chunked(lines, chunk_size):
+        yield evaluate_fens(chunk)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate a file of FENs with vectorized NumPy code.")
+    parser.add_argument("input", help="FEN or EPD file, one position per line ('-' for stdin)")
+    parser.add_argument("-o", "--output", help=".npy file for the (N, 4) array of " + ", ".join(TERMS))
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    start = time.perf_counter()
+    try:
+        results = list(evaluate_stream(source, args.chunk_size))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    elapsed = time.perf_counter() - start
+
+    terms = np.concatenate(results) if results else np.empty((0, len(TERMS)), dtype=np.int32)
+    if args.output:
+        np.save(args.output, terms)
+    else:
+        for row in terms:
+            print(" ".join(str(value) for value in row))
+    print(f"{len(terms)} positions in {elapsed:.2f}s ({len(terms) / elapsed if elapsed else 0:,.0f} positions/s)",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,16 @@
-# TODO: check/checkmate detection, turn management
+from collections import OrderedDict
 
-import pygame as pg
-import copy
+from events import EventBus, MoveMade, Capture, Promotion, Check, Checkmate, GameEnded, TurnChanged, InvalidMove
+from pgn import game_from_moves, format_game
 from piece import Piece
+from position import Position, STARTING_FEN, TYPE_MASK, COLOR_MASK, square, square_file, square_rank
+from renderer import BoardRenderer
+
+# How many positions' move tables to keep around for undo and replaying a game
+MOVE_CACHE_SIZE = 64
 
 class Board:
-    def __init__(self, screen):
+    def __init__(self, screen=None):
         self.screen = screen
 
         self.dim = 8
@@ -18,27 +23,57 @@ class Board:
         self.dark_color = (14.5, 17.3, 22.4)
         self.highlight_color = (0, 255, 0)
 
-        self.starting_fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR"
+        self.starting_fen = STARTING_FEN
 
         self.selected_piece = None
         self.selected_coords = None
 
-        self.color_to_move = Piece.white
+        # Squares outlined in highlight_color: the selected piece and where it can go
+        self.highlighted = set()
 
         self.promoting = False
         self.promotion_square = None
         self.promotion_color = None
+        self.promotion_from = None
 
         self.last_move = None
 
+        # The FEN the current game started from; with position.moves_played() it replays the game
+        self.start_fen = None
+
         self.checkmate = False
+        self.stalemate = False
+        # (result, reason) once the game has ended by the rules, e.g. ("1/2-1/2", "repetition")
+        self.result = None
+
+        # Legal moves for the side to move keyed by from square, built once per ply.
+        # move_cache keeps recent tables by position key, least recently used first.
+        self.move_table = {}
+        self.move_table_key = None
+        self.move_cache = OrderedDict()
 
         self.draw_pieces = False
 
+        # Moves, captures, checks, invalid clicks and so on are published here for observers to pick up
+        self.events = EventBus()
+
+        # The rules run on this compact position; self.board is only the piece view drawn on screen
+        self.position = Position(None)
+
+        self.renderer = BoardRenderer(self)
+
         self.create_board()
         if self.draw_pieces:
-            self.place_pieces_from_fen(self.starting_fen)
-        
+            self.load_fen(self.starting_fen)
+
+
+    @property
+    def color_to_move(self):
+        return self.position.color_to_move
+
+    @property
+    def game_over(self):
+        return self.result is not None
 
     def create_board(self):
         for file in range(self.dim):
@@ -46,7 +81,10 @@ class Board:
             for rank in range(self.dim):
                 self.board[file].append(0)
 
-    def create_graphical_board(self):
+    def create_graphical_board(self, surface):
+        # pygame is only needed once something is drawn, so headless boards never import it
+        import pygame as pg
+
         for file in range(self.dim):
             for rank in range(self.dim):
 
@@ -54,55 +92,63 @@ class Board:
 
                 square_color = self.light_color if is_light_square else self.dark_color
                 square_pos = (file * self.square_size, rank * self.square_size + self.offset)
-                
-                pg.draw.rect(self.screen, square_color, pg.Rect(square_pos, (self.square_size, self.square_size)))
-
-    def place_pieces_from_fen(self, fen):
-        piece_map = {
-            'p': Piece.pawn,
-            'r': Piece.rook,
-            'n': Piece.knight,
-            'b': Piece.bishop,
-            'q': Piece.queen,
-            'k': Piece.king
-        }
-
-        ranks = fen.split('/')
-
-        for rank_index, row in enumerate(ranks):
-            file = 0
-            for char in row:
-                if char.isdigit():
-                    file += int(char)
-                else:
-                    color = Piece.white if char.isupper() else Piece.black
-                    piece_type = piece_map[char.lower()]
-                    x = file * self.square_size
-                    y = rank_index * self.square_size + self.offset
-                    piece = Piece(self.screen, piece_type, color, (x, y))
-                    if self.draw_pieces:
-                        piece.display_piece()
-                    self.board[file][rank_index] = piece
-                    file += 1
-
-    def update_piece_positions(self):
+
+                pg.draw.rect(surface, square_color, pg.Rect(square_pos, (self.square_size, self.square_size)))
+
+    def load_fen(self, fen):
+        self.position.set_fen(fen)
+        self.start_fen = fen
+        self.sync_pieces()
+
+        self.last_move = None
+        self.selected_piece = None
+        self.selected_coords = None
+        self.highlighted = set()
+        self.promoting = False
+        self.promotion_square = None
+        self.promotion_color = None
+        self.promotion_from = None
+        self.checkmate = False
+        self.stalemate = False
+        self.result = None
+
+        self.update_move_table()
+        self.renderer.mark_all_dirty()
+
+    def get_fen(self):
+        return self.position.to_fen()
+
+    def sync_pieces(self):
+        # Bring the piece view in line with the position. Pieces are shared flyweights, so this only
+        # stores references, and only squares whose piece changed get repainted.
         for file in range(self.dim):
+            column = self.board[file]
             for rank in range(self.dim):
-                piece = self.board[file][rank]
-                if piece != 0:
-                    x = file * self.square_size
-                    y = rank * self.square_size + self.offset
-                    piece.position = (x, y)
-                    if self.draw_pieces:
-                        piece.display_piece()
+                code = self.position.piece_at(file, rank)
+                piece = Piece.from_code(code) if code else 0
+                if column[rank] is not piece:
+                    column[rank] = piece
+                    self.renderer.mark_dirty(file, rank)
+
+    def get_pgn(self, headers=None):
+        # The game so far as PGN
+        result = self.result[0] if self.result else "*"
+        moves = self.position.moves_played()
+        return format_game(game_from_moves(moves, self.start_fen or STARTING_FEN, headers, result))
+
+    def set_highlighted(self, squares):
+        # Both the old and the new highlighted squares need repainting
+        for file, rank in self.highlighted ^ squares:
+            self.renderer.mark_dirty(file, rank)
+        self.highlighted = squares
 
     def draw(self):
-        self.create_graphical_board()
-        self.update_piece_positions()
+        # Repaints only what changed since the last frame and returns the rects to update on the display
+        return self.renderer.draw()
 
     def handle_click(self, mousex, mousey):
 
-        if self.checkmate:
+        if self.game_over:
             return
 
         # Determine which square was clicked
@@ -110,7 +156,10 @@ class Board:
         # Subtract self.offset from mousey before dividing to get the correct rank
         rank = (mousey - self.offset) // self.square_size
 
-        
+        # Ignore clicks beside the board
+        if not (0 <= file < self.dim and 0 <= rank < self.dim):
+            return
+
         # If there's no piece selected and the clicked square has a piece, select it
         # If there's a piece selected, move it to the clicked square
         if self.selected_piece == None and self.board[file][rank] != 0:
@@ -121,374 +170,188 @@ class Board:
             if self.selected_piece.color != self.color_to_move:
                 self.selected_piece = None
                 self.selected_coords = None
-                current_color = "white" if self.color_to_move == 8 else "black"
-                print("waiting for " + current_color + " to move")
+                self.emit(InvalidMove, InvalidMove.WRONG_TURN, square(file, rank))
                 return
 
+            self.set_highlighted({(file, rank)} | set(self.get_valid_moves(file, rank)))
+
         elif self.selected_piece != None:
 
-            valid_moves = self.get_valid_moves(self.selected_piece)
+            valid_moves = self.get_valid_moves(*self.selected_coords)
 
             if not self.promoting:
                 if (file, rank) in valid_moves:
-                    
-                    # Store the old file and rank in variable, and set where the piece used to be to 0
+
                     old_file, old_rank = self.selected_coords
-                    self.board[old_file][old_rank] = 0
-
-                    # Handle Castling Rook Move
-                    if self.selected_piece.piece_type == Piece.king and not self.selected_piece.has_moved:
-                        back_rank = 7 if self.selected_piece.color == Piece.white else 0
-
-                        # Kingside
-                        if (file, rank) == (6, back_rank):
-                            rook = self.board[7][back_rank]
-                            self.board[5][back_rank] = rook
-                            self.board[7][back_rank] = 0
-                            rook.position = (5 * self.square_size, back_rank * self.square_size)
-                            rook.has_moved = True
-                        
-                        # Queenside
-                        if (file, rank) == (2, back_rank):
-                            rook = self.board[0][back_rank]
-                            self.board[3][back_rank] = rook
-                            self.board[0][back_rank] = 0
-                            rook.position = (3 * self.square_size, back_rank * self.square_size)
-
-                    # Handle pawn special moves
-                    if self.selected_piece.piece_type == Piece.pawn:
-
-                        # Promotion
-                        promote_rank = 0 if self.selected_piece.color == Piece.white else 7
-
-                        if rank == promote_rank:
-                            self.promoting = True
-                            self.promotion_square = (file, rank)
-                            self.promotion_color = self.selected_piece.color
-                            
-                            self.board[file][rank] = self.selected_piece
-                            self.selected_piece = None
-                            self.selected_coords = None
-                            return
-
-                        # En passant capture
-                        if file != old_file and self.board[file][rank] == 0:
-                            captured_rank = old_rank
-                            self.board[file][captured_rank] = 0
-
-
-                        
-                    
-                    # Set the new pieces location based on what square the player clicked.
-                    self.board[file][rank] = self.selected_piece
-                    self.selected_piece.has_moved = True
-                    self.selected_piece.position = (file * self.square_size, rank * self.square_size + self.offset)
 
-                    self.selected_piece = None
-                    self.selected_coords = None
+                    # Promotion: show the pawn on its new square and wait for the player to pick a piece
+                    promote_rank = 0 if self.selected_piece.color == Piece.white else 7
+                    if self.selected_piece.piece_type == Piece.pawn and rank == promote_rank:
+                        self.promoting = True
+                        self.promotion_square = (file, rank)
+                        self.promotion_color = self.selected_piece.color
+                        self.promotion_from = (old_file, old_rank)
 
-                    self.last_move = (old_file, old_rank, file, rank)
-                    print(self.last_move)
+                        self.board[old_file][old_rank] = 0
+                        self.board[file][rank] = self.selected_piece
+                        self.renderer.mark_dirty(old_file, old_rank)
+                        self.renderer.mark_dirty(file, rank)
 
-                    self.switch_turns()
+                        self.selected_piece = None
+                        self.selected_coords = None
+                        self.set_highlighted(set())
+                        return
 
-                    if self.is_checkmate(self.color_to_move):
-                        self.checkmate = True
-                        print("CHECKMATE")
-                    
+                    self.selected_piece = None
+                    self.selected_coords = None
+                    self.set_highlighted(set())
+                    self.play_move((old_file, old_rank), (file, rank))
 
                 else:
-                    print("Invalid move for the selected piece.")
+                    self.emit(InvalidMove, InvalidMove.ILLEGAL, square(file, rank))
                     self.selected_piece = None
                     self.selected_coords = None
+                    self.set_highlighted(set())
             else:
-                print(f"{self.promotion_color} needs to promote first!")
-            
-        
+                self.emit(InvalidMove, InvalidMove.PROMOTION_PENDING, square(file, rank))
+
+
+    def promote(self, piece_type):
+        # Finish the move that is waiting on the player's promotion choice
+        from_pos = self.promotion_from
+        to_pos = self.promotion_square
+
+        self.promoting = False
+        self.promotion_square = None
+        self.promotion_color = None
+        self.promotion_from = None
+
+        self.play_move(from_pos, to_pos, piece_type)
+
+    def play_move(self, from_pos, to_pos, promotion=None):
+        self.make_move(from_pos, to_pos, promotion)
+
+        self.last_move = (from_pos[0], from_pos[1], to_pos[0], to_pos[1])
+        if self.events.subscribers:
+            self.emit_move_events()
+
+        self.switch_turns()
+
+        # Checkmate, stalemate and the draw rules, usually decided by the first legal move found
+        self.result = self.position.game_result()
+        if self.result is not None:
+            result, reason = self.result
+            self.checkmate = reason == "checkmate"
+            self.stalemate = reason == "stalemate"
+            if self.checkmate:
+                self.emit(Checkmate, result)
+            self.emit(GameEnded, result, reason)
+        elif self.events.wants(Check) and self.is_in_check(self.color_to_move):
+            self.emit(Check, self.color_to_move)
+
+    def emit(self, event_type, *args):
+        # The event is only built, FEN and all, when someone is listening for its kind
+        if self.events.wants(event_type):
+            self.events.publish(event_type(self.position, *args))
+
+    def emit_move_events(self):
+        move, piece, captured, _, en_passant, _, _ = self.position.undo_stack[-1]
+        captured_sq = move[1]
+        if not captured and piece & TYPE_MASK == Piece.pawn and move[1] == en_passant:
+            # En passant takes the pawn beside the target square
+            captured = Piece.pawn | self.color_to_move
+            captured_sq = move[1] + 16 if piece & COLOR_MASK == Piece.white else move[1] - 16
+
+        self.emit(MoveMade, move, piece, captured)
+        if captured:
+            self.emit(Capture, move, piece, captured, captured_sq)
+        if move[2]:
+            self.emit(Promotion, move, piece & COLOR_MASK)
 
     def switch_turns(self):
-        # Switch turns
-        if self.color_to_move == Piece.white:
-            self.color_to_move = Piece.black
-            print("it is now blacks turn")
+        # make_move has already handed the move over. The new side's move table is built when a
+        # piece is first selected, so a move nobody looks at costs nothing.
+        self.emit(TurnChanged)
+
+    def update_move_table(self):
+        # Legal moves for the side to move, grouped by from square; a position seen recently is reused
+        key = self.position.key
+        if key == self.move_table_key:
+            return self.move_table
+
+        table = self.move_cache.get(key)
+        if table is None:
+            table = {}
+            for move in self.position.legal_moves():
+                table.setdefault(move[0], []).append(move)
+            self.move_cache[key] = table
+            if len(self.move_cache) > MOVE_CACHE_SIZE:
+                self.move_cache.popitem(last=False)
         else:
-            self.color_to_move = Piece.white
-            print("it is now whites turn")
+            self.move_cache.move_to_end(key)
 
-    def get_valid_moves(self, piece):
-        valid_moves = []
+        self.move_table = table
+        self.move_table_key = key
+        return table
 
-        file = piece.position[0] // self.square_size
-        # Subtract self.offset from y before dividing to get the correct rank
-        rank = (piece.position[1] - self.offset) // self.square_size
-
-        
-        if piece.piece_type == Piece.pawn:
-            self.pawn_valid_moves(file, rank, piece, valid_moves)
-        
-        if piece.piece_type == Piece.knight:
-            self.knight_valid_moves(file, rank, piece, valid_moves)
-            
-        
-        if piece.piece_type == Piece.rook:
-            self.rook_valid_moves(file, rank, piece, valid_moves)
-            
-        
-        if piece.piece_type == Piece.bishop:
-            self.bishop_valid_moves(file, rank, piece, valid_moves)
-        
-        if piece.piece_type == Piece.queen:
-            self.queen_valid_moves(file, rank, piece, valid_moves)
-        
-        if piece.piece_type == Piece.king:
-            self.king_valid_moves(file, rank, piece, valid_moves)
-        
-        legal_moves = []
-        for move in valid_moves:
-            board_copy = self.copy_board()
-            board_copy.move_piece((file, rank), move)
-            if not board_copy.is_in_check(piece.color):
-                legal_moves.append(move)
-
-        return legal_moves
-    
-    def pawn_valid_moves(self, file, rank, piece, valid_moves):
-        direction = -1 if piece.color == Piece.white else 1
-
-        # One square forward
-        next_rank = rank + direction
-        if 0 <= next_rank < self.dim and self.board[file][next_rank] == 0:
-            valid_moves.append((file, next_rank))
-        
-        # Two squares forward from starting position
-        if not piece.has_moved:
-            next_rank = rank + 2 * direction
-            if 0 <= next_rank < self.dim and self.board[file][next_rank] == 0 and self.board[file][rank + direction] == 0:
-                valid_moves.append((file, next_rank))
-        
-        # Capture left
-        if file - 1 >= 0 and 0 <= next_rank < self.dim:
-            target = self.board[file - 1][next_rank]
-            if target != 0 and target.color != piece.color:
-                valid_moves.append((file - 1, next_rank))
-        
-        # Capture right
-        if file + 1 < self.dim and 0 <= next_rank < self.dim:
-            target = self.board[file + 1][next_rank]
-            if target != 0 and target.color != piece.color:
-                valid_moves.append((file + 1, next_rank))
-
-        # En Passant
-        if self.last_move:
-            from_file, from_rank, to_file, to_rank = self.last_move
-
-            moved_piece = self.board[to_file][to_rank]
-            if moved_piece.piece_type == Piece.pawn and abs(to_rank - from_rank) == 2:
-                if abs(to_file - file) == 1 and to_rank == rank:
-                    valid_moves.append((to_file, to_rank + direction))
-        
-
-    def rook_valid_moves(self, file, rank, piece, valid_moves):
-        # Loop over all possible directions
-            directions = [(1,0), (-1, 0), (0, 1), (0, -1)] # Right, left, down, up
-            for dx, dy in directions:
-                next_file, next_rank = file, rank
-                while True:
-                    next_file += dx
-                    next_rank += dy
-
-                    # If out of bounds of the board array, break the loop.
-                    if not (0 <= next_file < self.dim and 0 <= next_rank < self.dim):
-                        break
-                    
-                    # If the target piece is empty or occupied by the other color, move there.
-                    target_piece = self.board[next_file][next_rank]
-                    if target_piece == 0:
-                        valid_moves.append((next_file, next_rank))
-                    elif target_piece.color != piece.color:
-                        valid_moves.append((next_file, next_rank))
-                        break
-                    else:
-                        break
-
-    def knight_valid_moves(self, file, rank, piece, valid_moves):
-        # L-shaped moves
-            knight_moves = [
-                (2, 1), (2, -1), (-2, 1), (-2, -1),
-                (1, 2), (1, -2), (-1, 2), (-1, -2)
-            ]
-
-            # For each knight move, check if it's valid
-            for dx, dy in knight_moves:
-                next_file = file + dx
-                next_rank = rank + dy
-
-                if 0 <= next_file < self.dim and 0 <= next_rank < self.dim:
-                    target_piece = self.board[next_file][next_rank]
-                    # if the target square occupied by a piece of the same color, capture it.
-                    # If the target square is empty, move there.
-                    if target_piece == 0 or target_piece.color != piece.color:
-                        valid_moves.append((next_file, next_rank))
-
-    def bishop_valid_moves(self, file, rank, piece, valid_moves):
-        directions = [(1, 1), (1, -1), (-1, 1), (-1, -1)] # Right down, Right up, left down, left up
-            
-        for dx, dy in directions:
-            next_file, next_rank = file, rank
-            while True:
-                next_file += dx
-                next_rank += dy
-
-                if not (0 <= next_file < self.dim and 0 <= next_rank < self.dim):
-                    break
-
-                target_piece = self.board[next_file][next_rank]
-                if target_piece == 0:
-                    valid_moves.append((next_file, next_rank))
-                elif target_piece.color != piece.color:
-                    valid_moves.append((next_file, next_rank))
-                    break
-                else:
-                    break
-
-    def queen_valid_moves(self, file, rank, piece, valid_moves):
-        directions = [(1, 0), (-1, 0), (0, 1), (0, -1),
-                      (1, 1), (1, -1), (-1, 1), (-1, -1)]
-        
-        for dx, dy in directions:
-            next_file, next_rank = file, rank
-            while True:
-                next_file += dx
-                next_rank += dy
-
-                if not (0 <= next_file < self.dim and 0 <= next_rank < self.dim):
-                    break
-
-                target_piece = self.board[next_file][next_rank]
-                if target_piece == 0:
-                    valid_moves.append((next_file, next_rank))
-                elif target_piece.color != piece.color:
-                    valid_moves.append((next_file, next_rank))
-                    break
-                else:
-                    break
-
-    def king_valid_moves(self, file, rank, piece, valid_moves):
-        directions = [(1, 0), (-1, 0), (0, 1), (0, -1),
-                      (1, 1), (1, -1), (-1, 1), (-1, -1)]
-        
-        # Basic King Movement
-        for dx, dy in directions:
-            next_file = file + dx
-            next_rank = rank + dy
-            if 0 <= next_file < self.dim and 0 <= next_rank < self.dim:
-                target_piece = self.board[next_file][next_rank]
-                if target_piece == 0 or target_piece.color != piece.color:
-                    valid_moves.append((next_file, next_rank))
-        
-        # Castling
-        if not piece.has_moved:
-            back_rank = 7 if piece.color == Piece.white else 0
-            
-            # Kingside
-            if all(self.board[f][back_rank] == 0 for f in (5, 6)):
-                rook = self.board[7][back_rank]
-                if rook != 0 and rook.piece_type == Piece.rook and not rook.has_moved:
-                    valid_moves.append((6, back_rank))
-            
-            # Queenside
-            if all(self.board[f][back_rank] == 0 for f in (1, 2, 3)):
-                rook = self.board[0][back_rank]
-                if rook != 0 and rook.piece_type == Piece.rook and not rook.has_moved:
-                    valid_moves.append((2, back_rank))
-    
-    def is_in_check(self, color):
-        # Get the king's position
-        king_pos = None
-        for file in range(self.dim):
-            for rank in range(self.dim):
-                piece = self.board[file][rank]
-                if piece != 0 and piece.piece_type == Piece.king and piece.color == color:
-                    king_pos = (file, rank)
-                    break
-        # Check opponent's pseudo-legal moves
-        opponent_color = Piece.black if color == Piece.white else Piece.white
-        for file in range(self.dim):
-            for rank in range(self.dim):
-                piece = self.board[file][rank]
-                if piece != 0 and piece.color == opponent_color:
-                    moves = self.get_pseudo_legal_moves(piece)
-                    if king_pos in moves:
-                        return True
-        return False
-
-    def get_pseudo_legal_moves(self, piece):
+    def get_valid_moves(self, file, rank):
+        # Where the piece on (file, rank) can go. The opponent's pieces have no moves in the table,
+        # it only holds the side to move.
         valid_moves = []
-        file = piece.position[0] // self.square_size
-        rank = (piece.position[1] - self.offset) // self.square_size
-        if piece.piece_type == Piece.pawn:
-            self.pawn_valid_moves(file, rank, piece, valid_moves)
-        if piece.piece_type == Piece.knight:
-            self.knight_valid_moves(file, rank, piece, valid_moves)
-        if piece.piece_type == Piece.rook:
-            self.rook_valid_moves(file, rank, piece, valid_moves)
-        if piece.piece_type == Piece.bishop:
-            self.bishop_valid_moves(file, rank, piece, valid_moves)
-        if piece.piece_type == Piece.queen:
-            self.queen_valid_moves(file, rank, piece, valid_moves)
-        if piece.piece_type == Piece.king:
-            self.king_valid_moves(file, rank, piece, valid_moves)
+        for _, to_sq, promotion in self.update_move_table().get(square(file, rank), ()):
+            # The four promotion choices all go to the same square
+            if promotion in (0, Piece.queen):
+                valid_moves.append((square_file(to_sq), square_rank(to_sq)))
         return valid_moves
-    
+
+    def get_all_valid_moves(self, color):
+        # Every legal move for one side as (from, to, promotion) tuples.
+        # A pawn reaching the last rank gives one move per promotion piece.
+        all_moves = []
+        for from_sq, to_sq, promotion in self.position.legal_moves(color):
+            all_moves.append(((square_file(from_sq), square_rank(from_sq)),
+                              (square_file(to_sq), square_rank(to_sq)),
+                              promotion or None))
+        return all_moves
+
+    def is_in_check(self, color):
+        return self.position.is_in_check(color)
+
+    def has_legal_moves(self, color):
+        # The side to move's table is reused when it's already built, otherwise stop at the first move
+        if color == self.color_to_move and self.move_table_key == self.position.key:
+            return bool(self.move_table)
+        return self.position.has_any_legal_move(color)
+
     def is_checkmate(self, color):
-        # If we're not in check, return
-        # If we are in check, go through all possible moves of this color
-        if not self.is_in_check(color):
-            return False
-        
-        for file in range(self.dim):
-            for rank in range(self.dim):
-                piece = self.board[file][rank]
-                if piece != 0 and piece.color == color:
-                    moves = self.get_valid_moves(piece)
-                    for move in moves:
-                        board_copy = self.copy_board()
-                        board_copy.draw_pieces = False
-                        board_copy.move_piece((file, rank), move)
-                        if not board_copy.is_in_check(color):
-                            return False
-        
-        return True
+        return self.is_in_check(color) and not self.has_legal_moves(color)
+
+    def is_stalemate(self, color):
+        return not self.is_in_check(color) and not self.has_legal_moves(color)
 
     def copy_board(self):
         new_board = Board(self.screen)
-        for file in range(self.dim):
-            for rank in range(self.dim):
-                piece = self.board[file][rank]
-                if piece != 0:
-                    new_piece = Piece(
-                        self.screen,
-                        piece.piece_type,
-                        piece.color,
-                        piece.position
-                    )
-                    new_piece.has_moved = piece.has_moved
-                    new_piece.just_moved = piece.just_moved
-                    new_board.board[file][rank] = new_piece
-                else:
-                    new_board.board[file][rank] = 0
-        new_board.color_to_move = self.color_to_move
-        # Copy other relevant attributes as needed
+        new_board.position = self.position.copy()
+        new_board.sync_pieces()
         return new_board
-    
-    def move_piece(self, from_pos, to_pos):
-        from_file, from_rank = from_pos
-        to_file, to_rank = to_pos
-
-        piece = self.board[from_file][from_rank]
-
-        self.board[to_file][to_rank] = piece
-        self.board[from_file][from_rank] = 0
-        if piece:
-            piece.position = (to_file * self.square_size, to_rank * self.square_size + self.offset)
-            piece.has_moved = True
\ No newline at end of file
+
+    def make_move(self, from_pos, to_pos, promotion=None):
+        # Play a move on this board in place; unmake_move takes it back
+        self.position.make_move((square(*from_pos), square(*to_pos), promotion or 0))
+        self.sync_pieces()
+
+    def unmake_move(self):
+        self.position.unmake_move()
+        self.sync_pieces()
+        self.update_move_table()
+        # The last move is now the one before the move taken back, if there was one
+        stack = self.position.undo_stack
+        if stack:
+            from_sq, to_sq, _ = stack[-1][0]
+            self.last_move = (square_file(from_sq), square_rank(from_sq), square_file(to_sq), square_rank(to_sq))
+        else:
+            self.last_move = None
+        # A move was played from here, so it can't be the end of the game
+        self.checkmate = False
+        self.stalemate = False
+        self.result = None
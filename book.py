@@ -0,0 +1,167 @@
+import mmap
+import random
+import struct
+
+from piece import Piece
+from polyglot_random import RANDOM64
+from position import SQUARES, TYPE_MASK, COLOR_MASK, WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE
+from tables import PAWN_ATTACKS
+
+# Polyglot .bin books are sorted arrays of 16-byte big-endian entries:
+# key (8 bytes), move (2), weight (2), learn (4)
+ENTRY = struct.Struct(">QHHI")
+KEY = struct.Struct(">Q")
+ENTRY_SIZE = 16
+
+# Polyglot piece kind order: black pawn, white pawn, black knight, white knight, ...
+POLYGLOT_KINDS = (Piece.pawn, Piece.knight, Piece.bishop, Piece.rook, Piece.queen, Piece.king)
+
+# POLYGLOT_PIECE_KEYS[piece code][0x88 square], so a key is one lookup per piece
+POLYGLOT_PIECE_KEYS = [[0] * 128 for _ in range(32)]
+for _index, _kind in enumerate(POLYGLOT_KINDS):
+    for _sq in SQUARES:
+        # Polyglot rows count up from the first rank, our ranks count down from the eighth
+        _offset = 8 * (7 - (_sq >> 4)) + (_sq & 7)
+        POLYGLOT_PIECE_KEYS[_kind | Piece.black][_sq] = RANDOM64[64 * (2 * _index) + _offset]
+        POLYGLOT_PIECE_KEYS[_kind | Piece.white][_sq] = RANDOM64[64 * (2 * _index + 1) + _offset]
+
+POLYGLOT_CASTLING = ((WHITE_KINGSIDE, RANDOM64[768]), (WHITE_QUEENSIDE, RANDOM64[769]),
+                     (BLACK_KINGSIDE, RANDOM64[770]), (BLACK_QUEENSIDE, RANDOM64[771]))
+POLYGLOT_EN_PASSANT = RANDOM64[772:780]
+POLYGLOT_WHITE_TO_MOVE = RANDOM64[780]
+
+# Polyglot promotion numbers: none, knight, bishop, rook, queen
+POLYGLOT_PROMOTIONS = (0, Piece.knight, Piece.bishop, Piece.rook, Piece.queen)
+
+
+def polyglot_key(position):
+    # The Polyglot hash of a position. It differs from Position.key, which uses our own random numbers.
+    key = 0
+    squares = position.squares
+    for sq in SQUARES:
+        piece = squares[sq]
+        if piece:
+            key ^= POLYGLOT_PIECE_KEYS[piece][sq]
+
+    for right, right_key in POLYGLOT_CASTLING:
+        if position.castling & right:
+            key ^= right_key
+
+    # Like our own keys, en passant only counts when a pawn of the side to move could make the capture
+    if position.en_passant is not None:
+        pawn = Piece.pawn | position.color_to_move
+        for sq in PAWN_ATTACKS[position.color_to_move ^ COLOR_MASK][position.en_passant]:
+            if squares[sq] == pawn:
+                key ^= POLYGLOT_EN_PASSANT[position.en_passant & 7]
+                break
+
+    if position.color_to_move == Piece.white:
+        key ^= POLYGLOT_WHITE_TO_MOVE
+    return key
+
+
+def decode_move(position, raw):
+    # A Polyglot move as our (from, to, promotion) tuple. Polyglot writes castling as the king
+    # taking its own rook (e1h1), we write it as the king's two square step (e1g1).
+    to_sq = (7 - (raw >> 3 & 7)) << 4 | raw & 7
+    from_sq = (7 - (raw >> 9 & 7)) << 4 | raw >> 6 & 7
+    promotion = POLYGLOT_PROMOTIONS[raw >> 12 & 7]
+
+    piece = position.squares[from_sq]
+    target = position.squares[to_sq]
+    if piece & TYPE_MASK == Piece.king and target == Piece.rook | (piece & COLOR_MASK):
+        to_sq = from_sq + 2 if to_sq > from_sq else from_sq - 2
+    return (from_sq, to_sq, promotion)
+
+
+def encode_move(position, move):
+    from_sq, to_sq, promotion = move
+    if position.squares[from_sq] & TYPE_MASK == Piece.king and to_sq - from_sq in (2, -2):
+        to_sq = (from_sq & 0x70) | (7 if to_sq > from_sq else 0)
+    return ((to_sq & 7) | (7 - (to_sq >> 4)) << 3 | (from_sq & 7) << 6 | (7 - (from_sq >> 4)) << 9
+            | POLYGLOT_PROMOTIONS.index(promotion) << 12)
+
+
+class OpeningBook:
+    # A Polyglot book read straight from a memory mapped file. Nothing is loaded up front: a probe
+    # binary searches the sorted entries, touching a couple of dozen pages at most. Processes that
+    # open the same book share its pages through the OS page cache. Pickling a book (to hand it to a
+    # worker process) only sends the path; the worker maps the file itself.
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = len(self.map) // ENTRY_SIZE
+
+    def __len__(self):
+        return self.size
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def first_index(self, key):
+        # Index of the first entry with this key, or of where it would be
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) >> 1
+            if KEY.unpack_from(self.map, middle * ENTRY_SIZE)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def entries(self, position):
+        # [(move, weight, learn), ...] for position, only moves that are legal in it
+        key = polyglot_key(position)
+        found = []
+        index = self.first_index(key)
+        while index < self.size:
+            entry_key, raw_move, weight, learn = ENTRY.unpack_from(self.map, index * ENTRY_SIZE)
+            if entry_key != key:
+                break
+            found.append((decode_move(position, raw_move), weight, learn))
+            index += 1
+
+        # Books can be wrong or meant for a different variant, so only legal moves are returned
+        if not found:
+            return found
+        legal = set(position.legal_moves())
+        return [entry for entry in found if entry[0] in legal]
+
+    def pick(self, position, best=False, rng=random):
+        # A book move for position, or None once out of book. By default moves are picked with
+        # probability proportional to their weight; best=True always takes the highest weight.
+        entries = self.entries(position)
+        if not entries:
+            return None
+        if best:
+            return max(entries, key=lambda entry: entry[1])[0]
+
+        total = sum(weight for _, weight, _ in entries)
+        if total == 0:
+            return rng.choice(entries)[0]
+        choice = rng.randrange(total)
+        for move, weight, _ in entries:
+            choice -= weight
+            if choice < 0:
+                return move
+
+
+def write_book(path, entries):
+    # Write (key, raw move, weight, learn) entries as a Polyglot book, sorted the way probes expect
+    with open(path, "wb") as file:
+        for entry in sorted(entries, key=lambda entry: (entry[0], -entry[2])):
+            file.write(ENTRY.pack(*entry))
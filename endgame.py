@@ -0,0 +1,338 @@
+import argparse
+import mmap
+import os
+import sys
+import time
+
+from piece import Piece
+from position import Position, SQUARES, TYPE_MASK, COLOR_MASK, move_name
+
+# Exact results for king and queen, rook or pawn against a lone king, built offline by retrograde
+# analysis and stored one byte per position:
+#   0      draw (also used for index slots that aren't legal positions)
+#   d + 1  the side to move is mated in d plies with best play: d odd is a win, d even a loss
+# Tables are built with the strong side as white; probes flip colors when black is the strong side.
+# Positions are stored symmetry reduced: without pawns the strong king is moved into the a8-d8-d5
+# triangle (10 squares) by flips and a diagonal reflection, and with a pawn the board is mirrored
+# so the pawn stands on files a-d.
+TABLES = {"kqk": Piece.queen, "krk": Piece.rook, "kpk": Piece.pawn}
+
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+DEFAULT_DIRECTORY = "endgames"
+
+# Squares in these tables are 0-63, rank * 8 + file with rank 0 at the top like the 0x88 squares
+TO_0X88 = [(sq >> 3) << 4 | (sq & 7) for sq in range(64)]
+
+
+def to_64(sq):
+    return (sq >> 4) * 8 + (sq & 7)
+
+
+def _flip_file(sq):
+    return sq ^ 7
+
+
+def _flip_rank(sq):
+    return sq ^ 56
+
+
+def _transpose(sq):
+    return (sq & 7) << 3 | sq >> 3
+
+
+_TRANSFORMS = []
+for _transpose_first in (False, True):
+    for _flips in range(4):
+        _TRANSFORMS.append(tuple(
+            (_flip_file(s) if _flips & 1 else s) ^ (56 if _flips & 2 else 0)
+            for s in (_transpose(sq) if _transpose_first else sq for sq in range(64))))
+
+# The ten squares f <= r <= 3, and for every king square the first symmetry that takes it there
+TRIANGLE = {}
+for _sq in range(64):
+    if (_sq & 7) <= (_sq >> 3) <= 3:
+        TRIANGLE[_sq] = len(TRIANGLE)
+KING_TRANSFORM = [next(transform for transform in _TRANSFORMS if transform[sq] in TRIANGLE) for sq in range(64)]
+
+TABLE_SIZES = {"kqk": 2 * 10 * 64 * 64, "krk": 2 * 10 * 64 * 64, "kpk": 2 * 24 * 64 * 64}
+
+
+def table_index(name, strong_to_move, strong_king, weak_king, piece):
+    # Index of a position given in the strong-side-is-white orientation, squares 0-63
+    stm = 0 if strong_to_move else 1
+    if name == "kpk":
+        if piece & 7 > 3:
+            strong_king, weak_king, piece = strong_king ^ 7, weak_king ^ 7, piece ^ 7
+        pawn = (piece & 7) * 6 + (piece >> 3) - 1
+        return ((stm * 24 + pawn) * 64 + strong_king) * 64 + weak_king
+
+    transform = KING_TRANSFORM[strong_king]
+    return ((stm * 10 + TRIANGLE[transform[strong_king]]) * 64 + transform[weak_king]) * 64 + transform[piece]
+
+
+def table_entries(name):
+    # Every index slot as (index, strong to move, strong king, weak king, piece), squares 0-63
+    for strong_to_move in (True, False):
+        if name == "kpk":
+            pieces = [file + 8 * rank for file in range(4) for rank in range(1, 7)]
+            kings = range(64)
+        else:
+            pieces = range(64)
+            kings = sorted(TRIANGLE, key=TRIANGLE.get)
+        for piece in pieces:
+            for strong_king in kings:
+                for weak_king in range(64):
+                    yield (table_index(name, strong_to_move, strong_king, weak_king, piece),
+                           strong_to_move, strong_king, weak_king, piece)
+
+
+def decode(value):
+    # (result, plies to mate) for a stored byte, from the side to move's point of view
+    if value == 0:
+        return DRAW, 0
+    plies = value - 1
+    return (WIN if plies & 1 else LOSS), plies
+
+
+def generate_table(name, finished_tables):
+    # Retrograde analysis: find every mate, then walk backwards one ply at a time. A position is won
+    # in d + 1 if some move reaches a position lost in d, and lost in d + 1 once every move reaches a
+    # position won in d or less. Moves that leave the table (captures into KK, promotions into KQK
+    # or KRK) are looked up in finished_tables, which holds the bytes of the tables already built.
+    piece_type = TABLES[name]
+    size = TABLE_SIZES[name]
+    values = bytearray(size)
+    remaining = [0] * size
+    predecessors = [None] * size
+    buckets = [[]]
+
+    position = Position(None)
+    squares = position.squares
+    for index, strong_to_move, strong_king, weak_king, piece in table_entries(name):
+        kings_apart = abs((strong_king & 7) - (weak_king & 7)) > 1 or abs((strong_king >> 3) - (weak_king >> 3)) > 1
+        if strong_king == weak_king or piece in (strong_king, weak_king) or not kings_apart:
+            continue
+
+        white_king, black_king, extra = TO_0X88[strong_king], TO_0X88[weak_king], TO_0X88[piece]
+        squares[white_king] = Piece.king | Piece.white
+        squares[black_king] = Piece.king | Piece.black
+        squares[extra] = piece_type | Piece.white
+        position.king_squares = {Piece.white: white_king, Piece.black: black_king}
+        position.color_to_move = Piece.white if strong_to_move else Piece.black
+        position.castling = 0
+        position.en_passant = None
+
+        # The side that just moved can't have left its king in check
+        waiting = position.color_to_move ^ COLOR_MASK
+        if not position.is_square_attacked(position.king_squares[waiting], position.color_to_move):
+            moves = position.legal_moves()
+            if not moves:
+                if position.is_in_check(position.color_to_move):
+                    buckets[0].append(index)
+            for from_sq, to_sq, promotion in moves:
+                if to_sq == extra:
+                    # The lone king takes the piece: a draw, so this position can never be lost.
+                    # Counting the move without ever crossing it off keeps remaining above zero.
+                    remaining[index] += 1
+                    continue
+                if from_sq == extra and promotion:
+                    exit_table = {Piece.queen: "kqk", Piece.rook: "krk"}.get(promotion)
+                    if exit_table is not None and exit_table in finished_tables:
+                        value = finished_tables[exit_table][table_index(exit_table, False, strong_king, weak_king, to_64(to_sq))]
+                        result, plies = decode(value)
+                        if result == LOSS:
+                            while len(buckets) <= plies + 1:
+                                buckets.append([])
+                            buckets[plies + 1].append(index)
+                    continue
+
+                new_king = to_64(to_sq)
+                if from_sq == white_king:
+                    successor = table_index(name, False, new_king, weak_king, piece)
+                elif from_sq == black_king:
+                    successor = table_index(name, True, strong_king, new_king, piece)
+                else:
+                    successor = table_index(name, False, strong_king, weak_king, new_king)
+                remaining[index] += 1
+                if predecessors[successor] is None:
+                    predecessors[successor] = []
+                predecessors[successor].append(index)
+
+        squares[white_king] = squares[black_king] = squares[extra] = 0
+
+    plies = 0
+    while plies < len(buckets):
+        for index in buckets[plies]:
+            if values[index]:
+                continue
+            values[index] = plies + 1
+            for predecessor in predecessors[index] or ():
+                if values[predecessor]:
+                    continue
+                if plies & 1 == 0:
+                    # This position is lost, so moving into it wins
+                    target = plies + 1
+                else:
+                    # Lost once every move leads to a win for the other side
+                    remaining[predecessor] -= 1
+                    if remaining[predecessor]:
+                        continue
+                    target = plies + 1
+                if target >= len(buckets):
+                    buckets.append([])
+                buckets[target].append(predecessor)
+        plies += 1
+    return values
+
+
+def generate(directory=DEFAULT_DIRECTORY, names=("kqk", "krk", "kpk")):
+    # Builds the tables in dependency order (KPK promotes into the other two) and writes them to directory
+    os.makedirs(directory, exist_ok=True)
+    finished = {}
+    for name in sorted(names, key=lambda name: name == "kpk"):
+        if name == "kpk":
+            for needed in ("kqk", "krk"):
+                if needed not in finished:
+                    path = os.path.join(directory, needed + ".bin")
+                    if os.path.exists(path):
+                        with open(path, "rb") as file:
+                            finished[needed] = file.read()
+                    else:
+                        finished[needed] = generate_table(needed, finished)
+
+        start = time.perf_counter()
+        finished[name] = generate_table(name, finished)
+        with open(os.path.join(directory, name + ".bin"), "wb") as file:
+            file.write(finished[name])
+        values = finished[name]
+        longest = max(values) - 1
+        print(f"{name}: {len(values)} bytes, longest mate {longest} plies, {time.perf_counter() - start:.1f}s")
+
+
+class EndgameTables:
+    # Probes the tables found in directory. Each file is memory mapped, so opening them costs nothing
+    # and processes using the same files share their pages.
+    def __init__(self, directory=DEFAULT_DIRECTORY):
+        self.directory = directory
+        self.files = {}
+        self.maps = {}
+        for name in TABLES:
+            path = os.path.join(directory, name + ".bin")
+            if os.path.exists(path) and os.path.getsize(path) == TABLE_SIZES[name]:
+                self.files[name] = open(path, "rb")
+                self.maps[name] = mmap.mmap(self.files[name].fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __bool__(self):
+        return bool(self.maps)
+
+    def __getstate__(self):
+        return {"directory": self.directory}
+
+    def __setstate__(self, state):
+        self.__init__(state["directory"])
+
+    def close(self):
+        for table in self.maps.values():
+            table.close()
+        for file in self.files.values():
+            file.close()
+        self.maps = {}
+        self.files = {}
+
+    def probe(self, position):
+        # (result, plies to mate) from the side to move's point of view, or None if no table covers
+        # the position. Bare kings are a draw.
+        if position.castling:
+            return None
+
+        pieces = []
+        for sq in SQUARES:
+            piece = position.squares[sq]
+            if piece:
+                pieces.append((sq, piece))
+                if len(pieces) > 3:
+                    return None
+
+        if len(pieces) == 2:
+            return DRAW, 0
+        extra = [(sq, piece) for sq, piece in pieces if piece & TYPE_MASK != Piece.king]
+        if len(extra) != 1:
+            return None
+        extra_sq, extra_piece = extra[0]
+        name = {Piece.queen: "kqk", Piece.rook: "krk", Piece.pawn: "kpk"}.get(extra_piece & TYPE_MASK)
+        if name is None:
+            # A lone bishop or knight can't mate
+            return DRAW, 0
+        table = self.maps.get(name)
+        if table is None:
+            return None
+
+        strong = extra_piece & COLOR_MASK
+        weak = strong ^ COLOR_MASK
+        strong_king = to_64(position.king_squares[strong])
+        weak_king = to_64(position.king_squares[weak])
+        piece = to_64(extra_sq)
+        if strong == Piece.black:
+            # Tables have the strong side moving up the board as white
+            strong_king, weak_king, piece = strong_king ^ 56, weak_king ^ 56, piece ^ 56
+
+        index = table_index(name, position.color_to_move == strong, strong_king, weak_king, piece)
+        return decode(table[index])
+
+    def best_move(self, position):
+        # (move, result, plies) for the fastest win, a draw, or the longest defence; None if the
+        # position isn't covered
+        if self.probe(position) is None:
+            return None
+
+        best = None
+        best_rank = None
+        for move in position.legal_moves():
+            position.make_move(move)
+            reply = self.probe(position)
+            position.unmake_move()
+            if reply is None:
+                continue
+
+            result, plies = reply
+            # Rank from the mover's point of view: quick wins first, then draws, then slow losses
+            if result == LOSS:
+                rank = (2, -plies)
+            elif result == DRAW:
+                rank = (1, 0)
+            else:
+                rank = (0, plies)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = (move, -result, plies + 1 if result != DRAW else 0), rank
+        return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or probe the KQK, KRK and KPK endgame tables.")
+    parser.add_argument("--dir", default=DEFAULT_DIRECTORY, help=f"where the tables live (default: {DEFAULT_DIRECTORY})")
+    parser.add_argument("--generate", action="store_true", help="build the tables")
+    parser.add_argument("--fen", help="probe a position")
+    args = parser.parse_args(argv)
+
+    if args.generate:
+        generate(args.dir)
+    if args.fen:
+        tables = EndgameTables(args.dir)
+        position = Position(args.fen)
+        probe = tables.probe(position)
+        if probe is None:
+            print("not in the tables")
+            return 1
+        result, plies = probe
+        print({WIN: f"win, mate in {plies} plies", DRAW: "draw", LOSS: f"loss, mated in {plies} plies"}[result])
+        best = tables.best_move(position)
+        if best is not None:
+            print("best move", move_name(best[0]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,483 @@
+import multiprocessing
+import queue
+import threading
+import time
+import traceback
+
+from book import OpeningBook
+from endgame import EndgameTables, WIN, LOSS
+from evaluate import evaluate, PIECE_VALUES
+from piece import Piece
+from position import Position, TYPE_MASK, move_name
+from transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+
+MATE_SCORE = 100000
+MAX_PLY = 100
+INFINITY = 1000000
+
+# How many nodes to search between looks at the clock and the stop flag
+CHECK_INTERVAL = 1024
+
+
+class SearchStopped(Exception):
+    # Unwinds the search from wherever it is when time, nodes or a stop request run out
+    pass
+
+
+class Search:
+    # Iterative deepening alpha-beta with a quiescence search, a transposition table and
+    # move ordering by TT move, MVV-LVA for captures, killer moves and the history heuristic.
+    # With endgame tables, positions they cover are looked up instead of searched.
+    def __init__(self, tt_size_mb=16, tablebases=None):
+        self.tt = TranspositionTable(tt_size_mb)
+        self.tablebases = tablebases
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        self.history = [0] * (128 * 128)
+
+        self.nodes = 0
+        self.next_check = CHECK_INTERVAL
+        self.start_time = 0.0
+        self.deadline = None
+        self.movetime = None
+        self.node_limit = None
+        self.stop_event = None
+        self.ponderhit_event = None
+        self.pondering = False
+
+    def search(self, position, depth=None, movetime=None, nodes=None,
+               stop_event=None, ponderhit_event=None, on_info=None):
+        # Search position (which is left as it was) and return (best move, expected reply, score).
+        # movetime is in seconds. If ponderhit_event is given the search ponders: it ignores its
+        # limits, and keeps going, until that event is set, then starts its clock from there.
+        # on_info(info) is called after every completed iteration.
+        self.nodes = 0
+        self.next_check = CHECK_INTERVAL if nodes is None else min(CHECK_INTERVAL, nodes)
+        self.movetime = movetime
+        self.node_limit = nodes
+        self.stop_event = stop_event
+        self.ponderhit_event = ponderhit_event
+        self.pondering = ponderhit_event is not None and not ponderhit_event.is_set()
+        self.start_time = time.perf_counter()
+        self.deadline = None
+        if not self.pondering:
+            self.start_clock()
+
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        self.history = [0] * (128 * 128)
+        self.tt.new_search()
+
+        root_moves = position.legal_moves()
+        if not root_moves:
+            return None, None, -MATE_SCORE if position.is_in_check(position.color_to_move) else 0
+
+        if self.tablebases:
+            found = self.tablebases.best_move(position)
+            if found is not None:
+                move, result, plies = found
+                return move, None, tablebase_score(result, plies, 0)
+
+        best_move, best_score = root_moves[0], 0
+        pv = [best_move]
+        base = len(position.undo_stack)
+        max_depth = min(depth or MAX_PLY - 1, MAX_PLY - 1)
+
+        for current_depth in range(1, max_depth + 1):
+            self.root_best = None
+            try:
+                score = self.search_root(position, current_depth, root_moves, best_move)
+            except SearchStopped:
+                # Put the position back, and keep a move from the unfinished iteration only if it
+                # already beat the previous best move, which is always searched first
+                while len(position.undo_stack) > base:
+                    position.unmake_move()
+                if self.root_best is not None and self.root_best[0] != best_move:
+                    best_move, best_score = self.root_best
+                    pv = [best_move]
+                break
+
+            best_move, best_score = self.root_best
+            pv = self.principal_variation(position, current_depth)
+            if on_info is not None:
+                elapsed = time.perf_counter() - self.start_time
+                on_info({
+                    "depth": current_depth,
+                    "score": score,
+                    "nodes": self.nodes,
+                    "time": elapsed,
+                    "nps": int(self.nodes / elapsed) if elapsed > 0 else 0,
+                    "pv": [move_name(move) for move in pv],
+                    "hashfull": self.tt.hashfull()
+                })
+
+            # A forced mate has been found, deeper iterations can't improve on it
+            if abs(score) >= MATE_SCORE - MAX_PLY and not self.pondering:
+                break
+
+        # While pondering the result is only wanted once the opponent has moved, or on a stop
+        while self.pondering:
+            if stop_event is not None and stop_event.is_set():
+                break
+            if ponderhit_event.wait(0.01):
+                break
+
+        ponder_move = pv[1] if len(pv) > 1 and pv[0] == best_move else None
+        return best_move, ponder_move, best_score
+
+    def start_clock(self):
+        self.pondering = False
+        if self.movetime is not None:
+            self.deadline = time.perf_counter() + self.movetime
+
+    def check_limits(self):
+        if self.stop_event is not None and self.stop_event.is_set():
+            raise SearchStopped()
+
+        self.next_check = self.nodes + CHECK_INTERVAL
+        if self.pondering:
+            if not self.ponderhit_event.is_set():
+                return
+            self.start_clock()
+
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchStopped()
+        if self.node_limit is not None:
+            if self.nodes >= self.node_limit:
+                raise SearchStopped()
+            self.next_check = min(self.next_check, self.node_limit)
+
+    def search_root(self, position, depth, root_moves, previous_best):
+        # The previous iteration's best move goes first, the rest by the usual ordering
+        ordered = self.order_moves(position, root_moves, previous_best, 0)
+
+        alpha = -INFINITY
+        for move in ordered:
+            position.make_move(move)
+            score = -self.alpha_beta(position, depth - 1, -INFINITY, -alpha, 1)
+            position.unmake_move()
+
+            if score > alpha:
+                alpha = score
+                self.root_best = (move, score)
+
+        self.tt.store(position.key, depth, alpha, EXACT, self.root_best[0])
+        return alpha
+
+    def alpha_beta(self, position, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes >= self.next_check:
+            self.check_limits()
+
+        if position.halfmove_clock >= 100 or self.is_repetition(position):
+            return 0
+
+        # Only a capture can bring the material down into a table's ending, or below what can mate
+        if position.undo_stack[-1][2]:
+            if position.insufficient_material():
+                return 0
+            if self.tablebases:
+                probe = self.tablebases.probe(position)
+                if probe is not None:
+                    return tablebase_score(probe[0], probe[1], ply)
+
+        color = position.color_to_move
+        in_check = position.is_in_check(color)
+        if in_check:
+            depth += 1
+
+        if depth <= 0 or ply >= MAX_PLY:
+            return self.quiescence(position, alpha, beta, ply)
+
+        tt_move = None
+        entry = self.tt.probe(position.key)
+        if entry is not None:
+            entry_depth, entry_score, flag, tt_move = entry
+            if entry_depth >= depth:
+                entry_score = score_from_tt(entry_score, ply)
+                if flag == EXACT:
+                    return entry_score
+                if flag == LOWER_BOUND and entry_score >= beta:
+                    return entry_score
+                if flag == UPPER_BOUND and entry_score <= alpha:
+                    return entry_score
+
+        moves = position.legal_moves(color)
+        if not moves:
+            return -MATE_SCORE + ply if in_check else 0
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = None
+        squares = position.squares
+        for move in self.order_moves(position, moves, tt_move, ply):
+            quiet = squares[move[1]] == 0 and not move[2] and not (
+                move[1] == position.en_passant and squares[move[0]] & TYPE_MASK == Piece.pawn)
+
+            position.make_move(move)
+            score = -self.alpha_beta(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake_move()
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                # A quiet move that refutes this line is worth trying early in sibling positions too
+                if quiet:
+                    killers = self.killers[ply]
+                    if killers[0] != move:
+                        killers[1] = killers[0]
+                        killers[0] = move
+                    self.history[move[0] << 7 | move[1]] += depth * depth
+                break
+
+        if best_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_score >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.tt.store(position.key, depth, score_to_tt(best_score, ply), flag, best_move)
+        return best_score
+
+    def quiescence(self, position, alpha, beta, ply):
+        # Only captures and promotions, until the position is quiet enough to trust the static score
+        self.nodes += 1
+        if self.nodes >= self.next_check:
+            self.check_limits()
+
+        stand_pat = evaluate(position)
+        if stand_pat >= beta or ply >= MAX_PLY:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        color = position.color_to_move
+        squares = position.squares
+        captures = []
+        for move in position.pseudo_legal_moves(color):
+            if squares[move[1]] or move[2] or (move[1] == position.en_passant and squares[move[0]] & TYPE_MASK == Piece.pawn):
+                captures.append(move)
+        captures = position.filter_legal_moves(captures, color)
+
+        for move in self.order_moves(position, captures, None, ply):
+            position.make_move(move)
+            score = -self.quiescence(position, -beta, -alpha, ply + 1)
+            position.unmake_move()
+
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def order_moves(self, position, moves, tt_move, ply):
+        squares = position.squares
+        killers = self.killers[ply] if ply <= MAX_PLY else (None, None)
+        history = self.history
+
+        def move_score(move):
+            if move == tt_move:
+                return 10000000
+            from_sq, to_sq, promotion = move
+            victim = squares[to_sq]
+            if victim or promotion:
+                # MVV-LVA: most valuable victim first, cheapest attacker breaking ties
+                gain = PIECE_VALUES[victim & TYPE_MASK] if victim else 0
+                if promotion:
+                    gain += PIECE_VALUES[promotion]
+                return 1000000 + gain * 10 - PIECE_VALUES[squares[from_sq] & TYPE_MASK] // 10
+            if to_sq == position.en_passant and squares[from_sq] & TYPE_MASK == Piece.pawn:
+                return 1000000 + PIECE_VALUES[Piece.pawn] * 10
+            if move == killers[0]:
+                return 900000
+            if move == killers[1]:
+                return 800000
+            return history[from_sq << 7 | to_sq]
+
+        return sorted(moves, key=move_score, reverse=True)
+
+    def is_repetition(self, position):
+        # The same position (same side to move) earlier in the game or the search line, since the last
+        # capture or pawn move. Inside the search one repetition is already scored as a draw.
+        key = position.key
+        stack = position.undo_stack
+        for plies_back in range(2, min(position.halfmove_clock, len(stack)) + 1, 2):
+            if stack[-plies_back][6] == key:
+                return True
+        return False
+
+    def principal_variation(self, position, depth):
+        # Follow best moves through the transposition table
+        pv = []
+        for _ in range(depth):
+            entry = self.tt.probe(position.key)
+            if entry is None or entry[3] is None or entry[3] not in position.legal_moves():
+                break
+            pv.append(entry[3])
+            position.make_move(entry[3])
+        for _ in pv:
+            position.unmake_move()
+        return pv
+
+
+def tablebase_score(result, plies, ply):
+    # A table result as a search score, with mates counted from the root like the search's own
+    if result == WIN:
+        return MATE_SCORE - ply - plies
+    if result == LOSS:
+        return -MATE_SCORE + ply + plies
+    return 0
+
+
+def score_to_tt(score, ply):
+    # Mate scores are stored relative to the node, not the root, so they stay right when reached by another path
+    if score >= MATE_SCORE - MAX_PLY:
+        return score + ply
+    if score <= -MATE_SCORE + MAX_PLY:
+        return score - ply
+    return score
+
+
+def score_from_tt(score, ply):
+    if score >= MATE_SCORE - MAX_PLY:
+        return score - ply
+    if score <= -MATE_SCORE + MAX_PLY:
+        return score + ply
+    return score
+
+
+def run_request(search, book, results, stop_event, ponderhit_event, search_id, fen, moves, limits):
+    # One request of run_worker's: (best_move, ponder_move, score)
+    position = Position(fen)
+    for move in moves:
+        position.make_move(move)
+
+    ponder = limits.pop("ponder", False)
+    if book is not None and not ponder:
+        book_move = book.pick(position)
+        if book_move is not None:
+            return book_move, None, 0
+
+    return search.search(
+        position,
+        stop_event=stop_event,
+        ponderhit_event=ponderhit_event if ponder else None,
+        on_info=lambda info: results.put(("info", search_id, info)),
+        **limits
+    )
+
+
+def run_worker(requests, results, stop_event, ponderhit_event, tt_size_mb, book_path=None, tablebase_dir=None):
+    # Search loop shared by thread and process workers: takes (id, fen, moves, limits) requests
+    # and puts back ("info", id, info) while searching and ("bestmove", id, move, ponder, score) at the end.
+    # Positions found in the opening book are answered from it without searching; each worker maps
+    # the book file itself, so workers share its pages rather than each holding a copy. The same goes
+    # for the endgame tables in tablebase_dir.
+    search = Search(tt_size_mb, EndgameTables(tablebase_dir) if tablebase_dir else None)
+    book = OpeningBook(book_path) if book_path else None
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+
+        search_id, fen, moves, limits = request
+        try:
+            best_move, ponder_move, score = run_request(search, book, results, stop_event, ponderhit_event,
+                                                        search_id, fen, moves, limits)
+        except Exception:
+            # A request that can't be searched still gets its (null) bestmove, so the caller waiting
+            # for this search to finish is never left hanging and the worker lives on
+            traceback.print_exc()
+            best_move, ponder_move, score = None, None, 0
+        results.put(("bestmove", search_id, best_move, ponder_move, score))
+
+    if book is not None:
+        book.close()
+
+
+class EngineWorker:
+    # Runs searches off the calling thread, in a thread or (use_process=True) in a separate process
+    # so the search never competes with the UI for the GIL. Results come back through callbacks
+    # called on a listener thread: on_bestmove(search_id, move, ponder_move, score) and
+    # on_info(search_id, info). The pygame loop uses them to post events to itself.
+    # book_path is an optional Polyglot opening book, tablebase_dir a directory of endgame tables.
+    def __init__(self, on_bestmove, on_info=None, use_process=False, tt_size_mb=16, book_path=None,
+                 tablebase_dir=None):
+        self.on_bestmove = on_bestmove
+        self.on_info = on_info
+
+        if use_process:
+            context = multiprocessing.get_context()
+            self.requests = context.Queue()
+            self.results = context.Queue()
+            self.stop_event = context.Event()
+            self.ponderhit_event = context.Event()
+            worker_type = context.Process
+        else:
+            self.requests = queue.Queue()
+            self.results = queue.Queue()
+            self.stop_event = threading.Event()
+            self.ponderhit_event = threading.Event()
+            worker_type = threading.Thread
+
+        self.worker = worker_type(target=run_worker, daemon=True,
+                                  args=(self.requests, self.results, self.stop_event, self.ponderhit_event, tt_size_mb,
+                                        book_path, tablebase_dir))
+        self.worker.start()
+
+        self.search_id = 0
+        self.idle = threading.Event()
+        self.idle.set()
+        self.listener = threading.Thread(target=self.listen, daemon=True)
+        self.listener.start()
+
+    def start(self, fen, moves=(), ponder=False, **limits):
+        # Search the position reached from fen by moves. Limits are depth, movetime (seconds) and nodes;
+        # with none of them it searches until stop(). Any search still running is cancelled first.
+        self.cancel()
+        self.idle.wait()
+
+        self.stop_event.clear()
+        self.ponderhit_event.clear()
+        self.idle.clear()
+        self.search_id += 1
+        self.requests.put((self.search_id, fen, list(moves), dict(limits, ponder=ponder)))
+        return self.search_id
+
+    def stop(self):
+        # Finish the current search now and report the best move found so far
+        self.stop_event.set()
+
+    def cancel(self):
+        # Stop the current search and throw its result away
+        self.search_id += 1
+        self.stop_event.set()
+
+    def ponderhit(self):
+        # The opponent played the expected move: the ponder search becomes a normal, timed one
+        self.ponderhit_event.set()
+
+    def is_searching(self):
+        return not self.idle.is_set()
+
+    def close(self):
+        self.cancel()
+        self.requests.put(None)
+        self.worker.join(timeout=5)
+        self.results.put(None)
+        self.listener.join(timeout=5)
+
+    def listen(self):
+        while True:
+            message = self.results.get()
+            if message is None:
+                break
+
+            kind, search_id = message[0], message[1]
+            if kind == "bestmove":
+                if search_id == self.search_id:
+                    self.on_bestmove(search_id, *message[2:])
+                self.idle.set()
+            elif search_id == self.search_id and self.on_info is not None:
+                self.on_info(search_id, message[2])
@@ -0,0 +1,89 @@
+import re
+
+# A line may carry full FEN move clocks before any EPD operations
+CLOCKS = re.compile(r"(\d+)\s+(\d+)\s*(.*)$")
+
+
+def parse_operations(text):
+    # "bm Nf3; id \"test 1\";" -> {"bm": ["Nf3"], "id": ["test 1"]}
+    operations = {}
+    if '"' not in text:
+        for operation in text.split(';'):
+            tokens = operation.split()
+            if tokens:
+                operations[tokens[0]] = tokens[1:]
+        return operations
+
+    # Quoted operands may contain spaces and semicolons, so walk the text one character at a time
+    tokens = []
+    token = ""
+    quoted = False
+    in_token = False
+    for char in text + ';':
+        if quoted:
+            if char == '"':
+                quoted = False
+            else:
+                token += char
+        elif char == '"':
+            quoted = True
+            in_token = True
+        elif char == ';' or char.isspace():
+            if in_token:
+                tokens.append(token)
+                token = ""
+                in_token = False
+            if char == ';' and tokens:
+                operations[tokens[0]] = tokens[1:]
+                tokens = []
+        else:
+            token += char
+            in_token = True
+    return operations
+
+
+def format_operations(operations):
+    parts = []
+    for opcode, operands in operations.items():
+        quoted = [f'"{operand}"' if not operand or ' ' in operand or ';' in operand else operand for operand in operands]
+        parts.append(" ".join([opcode] + quoted) + ";")
+    return " ".join(parts)
+
+
+def parse_epd(line):
+    # Split an EPD (or plain FEN) line into a full six field FEN and its operations.
+    # The hmvc and fmvn operations fill in the move clocks when the line has none of its own.
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError(f"EPD needs at least 4 fields: {line!r}")
+
+    rest = fields[4] if len(fields) > 4 else ""
+    clocks = CLOCKS.match(rest)
+    if clocks:
+        halfmove_clock, fullmove_number, rest = clocks.groups()
+        operations = parse_operations(rest)
+    else:
+        operations = parse_operations(rest)
+        halfmove_clock = operations.get("hmvc", ["0"])[0]
+        fullmove_number = operations.get("fmvn", ["1"])[0]
+
+    return " ".join(fields[:4] + [halfmove_clock, fullmove_number]), operations
+
+
+def format_epd(position, operations=None):
+    # The four position fields of the FEN, with the clocks written as hmvc/fmvn operations
+    operations = dict(operations or {})
+    operations.setdefault("hmvc", [str(position.halfmove_clock)])
+    operations.setdefault("fmvn", [str(position.fullmove_number)])
+    fields = position.to_fen().split()[:4]
+    return " ".join(fields) + " " + format_operations(operations)
+
+
+def read_epd(path):
+    # Yields (fen, operations) lazily, one line at a time. The file is read through a buffered
+    # stream in fixed size chunks, so memory use doesn't grow with the size of the file.
+    with open(path, "r", encoding="utf-8", errors="replace") as file:
+        for line in file:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield parse_epd(line)
@@ -0,0 +1,96 @@
+from piece import Piece
+from position import SQUARES
+
+PIECE_VALUES = {
+    Piece.pawn: 100,
+    Piece.knight: 320,
+    Piece.bishop: 330,
+    Piece.rook: 500,
+    Piece.queen: 900,
+    Piece.king: 0
+}
+
+# Piece-square bonuses from white's point of view, listed from a8 to h1 in the same
+# order as the ranks of Board.board (the simplified evaluation function tables)
+PIECE_SQUARE_TABLES = {
+    Piece.pawn: [
+         0,   0,   0,   0,   0,   0,   0,   0,
+        50,  50,  50,  50,  50,  50,  50,  50,
+        10,  10,  20,  30,  30,  20,  10,  10,
+         5,   5,  10,  25,  25,  10,   5,   5,
+         0,   0,   0,  20,  20,   0,   0,   0,
+         5,  -5, -10,   0,   0, -10,  -5,   5,
+         5,  10,  10, -20, -20,  10,  10,   5,
+         0,   0,   0,   0,   0,   0,   0,   0
+    ],
+    Piece.knight: [
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20,   0,   0,   0,   0, -20, -40,
+        -30,   0,  10,  15,  15,  10,   0, -30,
+        -30,   5,  15,  20,  20,  15,   5, -30,
+        -30,   0,  15,  20,  20,  15,   0, -30,
+        -30,   5,  10,  15,  15,  10,   5, -30,
+        -40, -20,   0,   5,   5,   0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50
+    ],
+    Piece.bishop: [
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10,   0,   0,   0,   0,   0,   0, -10,
+        -10,   0,   5,  10,  10,   5,   0, -10,
+        -10,   5,   5,  10,  10,   5,   5, -10,
+        -10,   0,  10,  10,  10,  10,   0, -10,
+        -10,  10,  10,  10,  10,  10,  10, -10,
+        -10,   5,   0,   0,   0,   0,   5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20
+    ],
+    Piece.rook: [
+         0,   0,   0,   0,   0,   0,   0,   0,
+         5,  10,  10,  10,  10,  10,  10,   5,
+        -5,   0,   0,   0,   0,   0,   0,  -5,
+        -5,   0,   0,   0,   0,   0,   0,  -5,
+        -5,   0,   0,   0,   0,   0,   0,  -5,
+        -5,   0,   0,   0,   0,   0,   0,  -5,
+        -5,   0,   0,   0,   0,   0,   0,  -5,
+         0,   0,   0,   5,   5,   0,   0,   0
+    ],
+    Piece.queen: [
+        -20, -10, -10,  -5,  -5, -10, -10, -20,
+        -10,   0,   0,   0,   0,   0,   0, -10,
+        -10,   0,   5,   5,   5,   5,   0, -10,
+         -5,   0,   5,   5,   5,   5,   0,  -5,
+          0,   0,   5,   5,   5,   5,   0,  -5,
+        -10,   5,   5,   5,   5,   5,   0, -10,
+        -10,   0,   5,   0,   0,   0,   0, -10,
+        -20, -10, -10,  -5,  -5, -10, -10, -20
+    ],
+    Piece.king: [
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+         20,  20,   0,   0,   0,   0,  20,  20,
+         20,  30,  10,   0,   0,  10,  30,  20
+    ]
+}
+
+# Material and piece-square bonus folded together per piece code and 0x88 square, positive for
+# white and negative for black, so evaluating a position is one lookup per piece
+SQUARE_SCORES = [[0] * 128 for _ in range(32)]
+for _piece_type, _table in PIECE_SQUARE_TABLES.items():
+    for _sq in SQUARES:
+        _rank, _file = _sq >> 4, _sq & 7
+        SQUARE_SCORES[_piece_type | Piece.white][_sq] = PIECE_VALUES[_piece_type] + _table[_rank * 8 + _file]
+        SQUARE_SCORES[_piece_type | Piece.black][_sq] = -(PIECE_VALUES[_piece_type] + _table[(7 - _rank) * 8 + _file])
+
+
+def evaluate(position):
+    # Static score in centipawns from the point of view of the side to move
+    score = 0
+    squares = position.squares
+    for sq in SQUARES:
+        piece = squares[sq]
+        if piece:
+            score += SQUARE_SCORES[piece][sq]
+    return score if position.color_to_move == Piece.white else -score
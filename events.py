@@ -0,0 +1,242 @@
+import json
+import threading
+import time
+from collections import deque
+
+from piece import Piece
+from position import PIECE_LETTERS, TYPE_MASK, COLOR_MASK, square_name, move_name
+
+# Structured game events. A Board publishes them on its EventBus; observers subscribe to the kinds
+# they care about. Events are only built when someone is subscribed to their kind, so a board
+# nobody listens to pays one dict lookup per would-be event. Every event carries the wall clock
+# time, the FEN and the Zobrist key of the position it describes (after the move, for move events).
+
+
+def piece_letter(code):
+    # FEN letter: upper case for white
+    letter = PIECE_LETTERS[code & TYPE_MASK]
+    return letter.upper() if code & COLOR_MASK == Piece.white else letter
+
+
+def color_name(color):
+    return "white" if color == Piece.white else "black"
+
+
+class Event:
+    __slots__ = ("time", "fen", "key")
+    kind = "event"
+    # The subclass's own slots, written out by to_dict after the common fields
+    fields = ()
+
+    def __init__(self, position):
+        self.time = time.time()
+        self.fen = position.to_fen()
+        self.key = position.key
+
+    def to_dict(self):
+        data = {"event": self.kind, "time": self.time, "fen": self.fen, "key": f"{self.key:016x}"}
+        for name in self.fields:
+            data[name] = getattr(self, name)
+        return data
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()})"
+
+
+class MoveMade(Event):
+    fields = __slots__ = ("move", "piece", "color", "captured")
+    kind = "move"
+
+    def __init__(self, position, move, piece, captured):
+        super().__init__(position)
+        self.move = move_name(move)
+        self.piece = piece_letter(piece)
+        self.color = color_name(piece & COLOR_MASK)
+        self.captured = piece_letter(captured) if captured else None
+
+
+class Capture(Event):
+    fields = __slots__ = ("move", "piece", "captured", "square")
+    kind = "capture"
+
+    def __init__(self, position, move, piece, captured, captured_sq):
+        super().__init__(position)
+        self.move = move_name(move)
+        self.piece = piece_letter(piece)
+        self.captured = piece_letter(captured)
+        self.square = square_name(captured_sq)
+
+
+class Promotion(Event):
+    fields = __slots__ = ("move", "promotion", "color")
+    kind = "promotion"
+
+    def __init__(self, position, move, color):
+        super().__init__(position)
+        self.move = move_name(move)
+        self.promotion = piece_letter(move[2] | color)
+        self.color = color_name(color)
+
+
+class Check(Event):
+    fields = __slots__ = ("color",)
+    kind = "check"
+
+    def __init__(self, position, color):
+        super().__init__(position)
+        # The side in check
+        self.color = color_name(color)
+
+
+class Checkmate(Event):
+    fields = __slots__ = ("winner", "result")
+    kind = "checkmate"
+
+    def __init__(self, position, result):
+        super().__init__(position)
+        self.winner = color_name(position.color_to_move ^ COLOR_MASK)
+        self.result = result
+
+
+class GameEnded(Event):
+    fields = __slots__ = ("result", "reason")
+    kind = "game_end"
+
+    def __init__(self, position, result, reason):
+        super().__init__(position)
+        self.result = result
+        self.reason = reason
+
+
+class TurnChanged(Event):
+    fields = __slots__ = ("color",)
+    kind = "turn"
+
+    def __init__(self, position):
+        super().__init__(position)
+        self.color = color_name(position.color_to_move)
+
+
+class InvalidMove(Event):
+    fields = __slots__ = ("reason", "square")
+    kind = "invalid_move"
+
+    # reason is one of these
+    WRONG_TURN = "wrong_turn"
+    ILLEGAL = "illegal"
+    PROMOTION_PENDING = "promotion_pending"
+
+    def __init__(self, position, reason, square):
+        super().__init__(position)
+        self.reason = reason
+        self.square = square_name(square) if square is not None else None
+
+
+EVENT_TYPES = (MoveMade, Capture, Promotion, Check, Checkmate, GameEnded, TurnChanged, InvalidMove)
+
+
+class EventBus:
+    # Observers are callables taking one event. subscribe(observer) gets every event,
+    # subscribe(observer, MoveMade, Check) only those kinds.
+    __slots__ = ("subscribers",)
+
+    def __init__(self):
+        # kind -> [observer, ...], with None for observers of every kind. Empty when nobody listens.
+        self.subscribers = {}
+
+    def subscribe(self, observer, *event_types):
+        for kind in [event_type.kind for event_type in event_types] or [None]:
+            self.subscribers.setdefault(kind, []).append(observer)
+        return observer
+
+    def unsubscribe(self, observer):
+        # Compared with ==, since a bound method is a new object every time it is looked up
+        for kind in list(self.subscribers):
+            observers = [other for other in self.subscribers[kind] if other != observer]
+            if observers:
+                self.subscribers[kind] = observers
+            else:
+                del self.subscribers[kind]
+
+    def wants(self, event_type):
+        subscribers = self.subscribers
+        return bool(subscribers) and (event_type.kind in subscribers or None in subscribers)
+
+    def publish(self, event):
+        subscribers = self.subscribers
+        for observer in subscribers.get(event.kind, ()):
+            observer(event)
+        for observer in subscribers.get(None, ()):
+            observer(event)
+
+
+class ConsoleObserver:
+    # The messages the game used to print, for playing in a terminal
+    def __call__(self, event):
+        if isinstance(event, MoveMade):
+            print(event.move)
+        elif isinstance(event, TurnChanged):
+            print(f"it is now {event.color}s turn")
+        elif isinstance(event, InvalidMove):
+            if event.reason == InvalidMove.WRONG_TURN:
+                print(f"waiting for {'white' if event.fen.split()[1] == 'w' else 'black'} to move")
+            elif event.reason == InvalidMove.PROMOTION_PENDING:
+                print("choose a promotion piece first")
+            else:
+                print("Invalid move for the selected piece.")
+        elif isinstance(event, GameEnded):
+            print(event.reason.upper(), event.result)
+
+
+class JsonlEventLog:
+    # Appends events to a JSON lines file from a background thread. Observing an event only puts it
+    # on a deque; the thread turns batches of them into JSON and writes each batch with one call,
+    # every flush_interval seconds or as soon as batch_size events are waiting.
+    def __init__(self, path, flush_interval=0.5, batch_size=256):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.pending = deque()
+        self.wakeup = threading.Event()
+        self.closed = False
+        self.written = 0
+        self.file = open(path, "a", encoding="utf-8")
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def __call__(self, event):
+        self.pending.append(event)
+        if len(self.pending) >= self.batch_size:
+            self.wakeup.set()
+
+    def run(self):
+        while not self.closed:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.write_pending()
+        self.write_pending()
+
+    def write_pending(self):
+        lines = []
+        pending = self.pending
+        while pending:
+            lines.append(json.dumps(pending.popleft().to_dict(), separators=(",", ":")))
+        if lines:
+            self.file.write("\n".join(lines) + "\n")
+            self.file.flush()
+            self.written += len(lines)
+
+    def close(self):
+        # Writes whatever is still waiting
+        if self.closed:
+            return
+        self.closed = True
+        self.wakeup.set()
+        self.thread.join()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
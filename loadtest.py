@@ -0,0 +1,166 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from profiler import percentile
+from server import DEFAULT_HOST, DEFAULT_PORT, MAX_LINE
+
+# Simulated clients for server.py: many games at once, each playing random legal moves with a pause
+# between them like a person would, spread over a few connections. Reports the move latency seen by
+# the clients next to the server's own metrics.
+
+
+class Connection:
+    # One socket shared by many games. Replies are matched to requests by id.
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.ids = itertools.count(1)
+        self.pending = {}
+        self.listener = asyncio.create_task(self.listen())
+
+    async def listen(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            reply = json.loads(line)
+            future = self.pending.pop(reply.get("id"), None)
+            if future is not None:
+                future.set_result(reply)
+        for future in self.pending.values():
+            future.set_exception(ConnectionError("server closed the connection"))
+
+    async def request(self, **payload):
+        payload["id"] = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[payload["id"]] = future
+        self.writer.write(json.dumps(payload, separators=(",", ":")).encode() + b"\n")
+        return await future
+
+    async def close(self):
+        self.writer.close()
+        self.listener.cancel()
+
+
+async def play(connection, think, max_plies, engine, latencies, rng):
+    # One game of random moves (black played by the engine when engine is set); returns the plies played
+    reply = await connection.request(cmd="new", legal=True)
+    if "error" in reply:
+        raise RuntimeError(reply["error"])
+    game = reply["game"]
+    plies = 0
+    while reply["result"] is None and plies < max_plies:
+        await asyncio.sleep(rng.uniform(0.5, 1.5) * think)
+        start = time.perf_counter()
+        if engine and reply["to_move"] == "b":
+            reply = await connection.request(cmd="engine", game=game, depth=1, legal=True)
+        else:
+            reply = await connection.request(cmd="move", game=game, move=rng.choice(reply["legal"]), legal=True)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        plies += 1
+    await connection.request(cmd="close", game=game)
+    return plies
+
+
+async def open_connection(host, port, unix_path):
+    if unix_path:
+        return await asyncio.open_unix_connection(unix_path, limit=MAX_LINE)
+    return await asyncio.open_connection(host, port, limit=MAX_LINE)
+
+
+async def run_load(host, port, unix_path, games, connections, think, max_plies, engine_every, seed):
+    rng = random.Random(seed)
+    pool = [Connection(*await open_connection(host, port, unix_path)) for _ in range(connections)]
+    latencies = []
+
+    async def game_task(index):
+        # Spread the starts over one think time so the games don't all move in step
+        await asyncio.sleep(rng.uniform(0, think))
+        engine = engine_every > 0 and index % engine_every == 0
+        return await play(pool[index % connections], think, max_plies, engine, latencies, rng)
+
+    start = time.perf_counter()
+    plies = await asyncio.gather(*(game_task(index) for index in range(games)))
+    elapsed = time.perf_counter() - start
+    server_metrics = await pool[0].request(cmd="metrics")
+    for connection in pool:
+        await connection.close()
+    return sum(plies), elapsed, sorted(latencies), server_metrics
+
+
+async def wait_for_server(host, port, unix_path, process, timeout=10.0):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            _, writer = await open_connection(host, port, unix_path)
+            writer.close()
+            return
+        except OSError:
+            if process.poll() is not None or time.perf_counter() > deadline:
+                raise RuntimeError("server didn't start")
+            await asyncio.sleep(0.1)
+
+
+def stop_on_signal(signum, frame):
+    raise SystemExit(128 + signum)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test server.py with simulated clients.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", help="connect to this Unix socket instead of TCP")
+    parser.add_argument("--spawn", action="store_true", help="start a server on a temporary Unix socket for the test")
+    parser.add_argument("--games", type=int, default=2000, help="games played at the same time")
+    parser.add_argument("--connections", type=int, default=50)
+    parser.add_argument("--think", type=float, default=1.0, help="average pause before each move, in seconds")
+    parser.add_argument("--max-plies", type=int, default=40, help="plies per game")
+    parser.add_argument("--engine-every", type=int, default=0, help="let the engine play black in every Nth game")
+    parser.add_argument("--p99-budget", type=float, default=None, help="fail if the p99 move latency (ms) is above this")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    process = None
+    unix_path = args.unix
+    # Being killed has to take the spawned server down too, so SIGTERM unwinds like Ctrl+C does
+    previous_handler = signal.signal(signal.SIGTERM, stop_on_signal)
+    try:
+        if args.spawn:
+            unix_path = os.path.join(tempfile.mkdtemp(), "chess.sock")
+            process = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py"),
+                                        "--unix", unix_path], stdout=subprocess.DEVNULL)
+            asyncio.run(wait_for_server(args.host, args.port, unix_path, process))
+        plies, elapsed, latencies, server_metrics = asyncio.run(run_load(
+            args.host, args.port, unix_path, args.games, args.connections, args.think, args.max_plies,
+            args.engine_every, args.seed))
+    finally:
+        signal.signal(signal.SIGTERM, previous_handler)
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    p99 = percentile(latencies, 0.99)
+    print(f"{args.games} games, {plies} moves in {elapsed:.1f}s ({plies / elapsed:,.0f} moves/s)")
+    print(f"client move latency p50 {percentile(latencies, 0.5):.2f} / p95 {percentile(latencies, 0.95):.2f}"
+          f" / p99 {p99:.2f} / max {latencies[-1] if latencies else 0:.2f} ms")
+    print(f"server request latency p50 {server_metrics['p50_ms']:.2f} / p95 {server_metrics['p95_ms']:.2f}"
+          f" / p99 {server_metrics['p99_ms']:.2f} ms over {server_metrics['requests']} requests")
+    if args.p99_budget is not None and p99 > args.p99_budget:
+        print(f"p99 {p99:.2f} ms is over the {args.p99_budget} ms budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,20 @@
+import argparse
+import time
+
 import pygame as pg
 from board import Board
+from engine import EngineWorker
+from events import ConsoleObserver, JsonlEventLog
 from piece import Piece
+from position import square_file, square_rank
+from profiler import profiler, PerformanceOverlay
+
+# Posted from the engine's listener thread once the computer has picked its move
+ENGINE_MOVE = pg.USEREVENT + 1
 
 class Game:
-    def __init__(self):
+    def __init__(self, stats_path=None, profile_path=None, book_path=None, tablebase_dir=None, events_path=None,
+                 verbose=False):
         pg.init()
 
         self.screen = pg.display.set_mode((1200, 900))
@@ -13,16 +24,80 @@ class Game:
         self.running = True
 
         self.board = Board(self.screen)
-        
+
+        # events_path logs every game event as JSON lines, written from a background thread;
+        # verbose prints moves and turns to the terminal
+        self.event_log = None
+        if events_path:
+            self.event_log = self.board.events.subscribe(JsonlEventLog(events_path))
+        if verbose:
+            self.board.events.subscribe(ConsoleObserver())
+
+        # Pressing E lets the computer play the side to move, thinking for think_time seconds a move.
+        # The engine only starts the first time it's needed.
+        self.engine = None
+        self.engine_color = None
+        self.engine_search = None
+        self.think_time = 1.0
+        self.book_path = book_path
+        self.tablebase_dir = tablebase_dir
+
+        # F3 shows the performance overlay, which switches on the hot path counters while it's up.
+        # stats_path keeps them on for the whole game and writes them out as JSON at the end,
+        # profile_path runs the game under cProfile.
+        self.overlay = PerformanceOverlay(self.screen)
+        self.stats_path = stats_path
+        self.profile_path = profile_path
+        if stats_path:
+            profiler.enable()
+        if profile_path:
+            profiler.start_cprofile()
+
     
-    def handle_events(self):
-        for event in pg.event.get():
+    def handle_events(self, block=False):
+        # Returns when the events were in hand, so frame timing can leave out the wait for them
+        events = pg.event.get()
+        # Sleep until the next event instead of spinning when there's nothing to do
+        if block and not events:
+            events = [pg.event.wait()]
+        start = time.perf_counter()
+
+        for event in events:
             if event.type == pg.QUIT or (event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE):
                 self.running = False
+
+            # The window was uncovered or restored, so everything has to be repainted
+            if event.type in (pg.VIDEOEXPOSE, pg.WINDOWEXPOSED, pg.WINDOWRESTORED):
+                self.board.renderer.mark_all_dirty()
             
             if event.type == pg.MOUSEBUTTONDOWN:
-                if event.button == 1:  # Left click
+                # Clicks are ignored while the computer is to move
+                if event.button == 1 and self.engine_color != self.board.color_to_move:  # Left click
                     self.board.handle_click(event.pos[0], event.pos[1])
+
+            if event.type == pg.KEYDOWN and event.key == pg.K_F3:
+                pg.display.update(self.overlay.toggle())
+                if self.stats_path:
+                    profiler.enable()
+
+            if event.type == pg.KEYDOWN and event.key == pg.K_e and not self.board.promoting:
+                if self.engine_color is None:
+                    self.engine_color = self.board.color_to_move
+                else:
+                    self.engine_color = None
+                    self.engine_search = None
+                    if self.engine is not None:
+                        self.engine.cancel()
+
+            if event.type == ENGINE_MOVE and event.search_id == self.engine_search:
+                self.engine_search = None
+                if event.move is None:
+                    # No legal move left, the game is over
+                    self.engine_color = None
+                else:
+                    from_sq, to_sq, promotion = event.move
+                    self.board.play_move((square_file(from_sq), square_rank(from_sq)),
+                                         (square_file(to_sq), square_rank(to_sq)), promotion or None)
             
             # Handles promotion logic
             if self.board.promoting:
@@ -39,29 +114,64 @@ class Game:
                     else:
                         continue
 
-                    file, rank = self.board.promotion_square
-                    color = self.board.promotion_color
-                    self.board.board[file][rank] = Piece(self.board.screen, piece_type, color, 
-                                                         (file * self.board.square_size, rank * self.board.square_size))
-                    self.board.promoting = False
-                    self.board.promotion_square = None
-                    self.board.promotion_color = None
-                    self.board.switch_turns()
+                    self.board.promote(piece_type)
+
+        self.start_engine_if_its_turn()
+        return start
+
+    def start_engine_if_its_turn(self):
+        board = self.board
+        if (self.engine_color != board.color_to_move or self.engine_search is not None
+                or board.game_over or board.promoting):
+            return
+
+        if self.engine is None:
+            # A separate process, so the search never holds up the frame rate
+            self.engine = EngineWorker(self.post_engine_move, self.record_engine_info, use_process=True,
+                                       book_path=self.book_path, tablebase_dir=self.tablebase_dir)
+        self.engine_search = self.engine.start(board.start_fen, board.position.moves_played(), movetime=self.think_time)
+
+    def post_engine_move(self, search_id, move, ponder_move, score):
+        # Runs on the engine's listener thread; pygame's event queue is safe to post to from there
+        pg.event.post(pg.event.Event(ENGINE_MOVE, search_id=search_id, move=move))
+
+    def record_engine_info(self, search_id, info):
+        self.overlay.engine_nps = info["nps"]
 
     def run(self):
         while self.running:
-            self.handle_events()
+            # The overlay keeps frames coming so its numbers stay live
+            start = self.handle_events(block=not self.board.renderer.needs_redraw() and not self.overlay.visible)
 
-            self.screen.fill((0, 0, 0))
+            # Update board, pushing only the squares that changed
+            rects = self.board.draw() + self.overlay.draw(self.clock)
+            if rects:
+                pg.display.update(rects)
 
-            # Update board
-            self.board.draw()
-
-            pg.display.flip()
+            # Frame times are the work on a frame only: not the idle wait for events, nor the 60 fps cap
+            if profiler.enabled:
+                profiler.record_frame((time.perf_counter() - start) * 1000)
             self.clock.tick(60)
 
+        if self.engine is not None:
+            self.engine.close()
+        if self.stats_path:
+            profiler.dump_json(self.stats_path)
+        if self.profile_path:
+            profiler.stop_cprofile(self.profile_path)
+        if self.event_log is not None:
+            self.event_log.close()
         pg.quit()
 
 if __name__ == "__main__":
-    game = Game()
+    parser = argparse.ArgumentParser(description="Play chess.")
+    parser.add_argument("--stats", help="count and time the move generation calls, and write them to this JSON file on exit")
+    parser.add_argument("--profile", help="run under cProfile and write the profile to this file on exit")
+    parser.add_argument("--book", help="Polyglot opening book (.bin) for the computer to play from")
+    parser.add_argument("--endgames", help="directory of endgame tables built with python endgame.py --generate")
+    parser.add_argument("--events", help="append game events (moves, captures, checks, ...) to this JSON lines file")
+    parser.add_argument("--verbose", action="store_true", help="print moves and turns to the terminal")
+    args = parser.parse_args()
+
+    game = Game(args.stats, args.profile, args.book, args.endgames, args.events, args.verbose)
     game.run()
\ No newline at end of file
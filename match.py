@@ -0,0 +1,244 @@
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from book import OpeningBook
+from endgame import EndgameTables
+from engine import Search
+from epd import read_epd
+from piece import Piece
+from position import Position, STARTING_FEN, move_name
+
+# Games are cut off as drawn after this many plies
+DEFAULT_MAX_PLIES = 400
+
+# Settings understood by --first/--second, with how to read their values
+SETTINGS = {"name": str, "depth": int, "movetime": float, "nodes": int, "hash": int, "book": str, "endgames": str}
+
+# Each worker process keeps one Search (and book and tables) per engine, reused from game to game
+_players = {}
+
+
+def parse_settings(text, default_name):
+    # "name=new,depth=4,hash=32" -> {"name": "new", "depth": 4, "hash": 32}
+    settings = {"name": default_name}
+    for item in text.split(","):
+        if not item:
+            continue
+        key, _, value = item.partition("=")
+        if key not in SETTINGS:
+            raise ValueError(f"unknown engine setting {key!r}, expected one of {', '.join(SETTINGS)}")
+        settings[key] = SETTINGS[key](value)
+    if not any(limit in settings for limit in ("depth", "movetime", "nodes")):
+        settings["depth"] = 3
+    return settings
+
+
+def player(settings):
+    name = settings["name"]
+    if name not in _players:
+        _players[name] = (
+            Search(settings.get("hash", 16), EndgameTables(settings["endgames"]) if "endgames" in settings else None),
+            OpeningBook(settings["book"]) if "book" in settings else None
+        )
+    return _players[name]
+
+
+def adjudicate(position, max_plies):
+    # (result, reason) once the game is over, otherwise None
+    outcome = position.game_result()
+    if outcome is None and len(position.undo_stack) >= max_plies:
+        return "1/2-1/2", "move limit"
+    return outcome
+
+
+def play_game(game_number, opening, fen, white, black, max_plies):
+    # Plays one game in a worker process and returns a compact result dict
+    position = Position(fen)
+    engines = {Piece.white: white, Piece.black: black}
+    nodes = {white["name"]: 0, black["name"]: 0}
+    seconds = {white["name"]: 0.0, black["name"]: 0.0}
+
+    while True:
+        outcome = adjudicate(position, max_plies)
+        if outcome is not None:
+            break
+
+        settings = engines[position.color_to_move]
+        search, book = player(settings)
+        start = time.perf_counter()
+        move = book.pick(position) if book is not None else None
+        if move is None:
+            move, _, _ = search.search(position, depth=settings.get("depth"), movetime=settings.get("movetime"),
+                                       nodes=settings.get("nodes"))
+            nodes[settings["name"]] += search.nodes
+        seconds[settings["name"]] += time.perf_counter() - start
+        position.make_move(move)
+
+    result, reason = outcome
+    return {
+        "game": game_number,
+        "opening": opening,
+        "white": white["name"],
+        "black": black["name"],
+        "result": result,
+        "reason": reason,
+        "plies": len(position.undo_stack),
+        "nodes": nodes,
+        "seconds": {name: round(value, 3) for name, value in seconds.items()},
+        "moves": " ".join(move_name(entry[0]) for entry in position.undo_stack)
+    }
+
+
+def expected_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    # Log likelihood ratio of elo1 against elo0, using the normal approximation of the game scores.
+    # Half a game of each outcome is added so the variance isn't zero while all results agree.
+    if wins + draws + losses == 0:
+        return 0.0
+    games = wins + draws + losses + 1.5
+    score = (wins + 0.5 + (draws + 0.5) / 2) / games
+    variance = ((wins + 0.5) * (1 - score) ** 2 + (draws + 0.5) * (0.5 - score) ** 2
+                + (losses + 0.5) * score ** 2) / games
+    score0, score1 = expected_score(elo0), expected_score(elo1)
+    return games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+
+def elo_difference(wins, draws, losses):
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0
+    score = min(max((wins + draws / 2) / games, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def schedule(openings, games, first, second, max_plies):
+    # Each opening is played twice in a row, so both engines get both colors from it
+    for game_number in range(games):
+        opening = (game_number // 2) % len(openings)
+        if game_number % 2 == 0:
+            yield (game_number + 1, opening, openings[opening], first, second, max_plies)
+        else:
+            yield (game_number + 1, opening, openings[opening], second, first, max_plies)
+
+
+def run_match(openings, first, second, games, workers=None, max_plies=DEFAULT_MAX_PLIES,
+              sprt=None, on_result=None):
+    # Plays the match across worker processes and returns (wins, draws, losses) for first. With
+    # sprt = (elo0, elo1, alpha, beta) it stops as soon as the log likelihood ratio crosses a bound.
+    # on_result(result, wins, draws, losses, llr) is called for every finished game.
+    workers = workers or os.cpu_count() or 1
+    wins = draws = losses = 0
+    bounds = None
+    if sprt is not None:
+        elo0, elo1, alpha, beta = sprt
+        bounds = (math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha))
+
+    tasks = schedule(openings, games, first, second, max_plies)
+    pending = set()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Only a couple of games per worker are queued at a time, so stopping early wastes little
+        for task in tasks:
+            pending.add(executor.submit(play_game, *task))
+            if len(pending) >= workers * 2:
+                break
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                first_is_white = result["white"] == first["name"]
+                if result["result"] == "1/2-1/2":
+                    draws += 1
+                elif (result["result"] == "1-0") == first_is_white:
+                    wins += 1
+                else:
+                    losses += 1
+
+                llr = sprt_llr(wins, draws, losses, elo0, elo1) if bounds else None
+                if on_result is not None:
+                    on_result(result, wins, draws, losses, llr)
+                if bounds and not bounds[0] < llr < bounds[1]:
+                    # Games already running are left to finish, queued ones are dropped
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    return wins, draws, losses
+
+                task = next(tasks, None)
+                if task is not None:
+                    pending.add(executor.submit(play_game, *task))
+    return wins, draws, losses
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play two engine settings against each other in parallel.")
+    parser.add_argument("--first", default="", help="first engine, e.g. name=new,depth=4 (settings: "
+                                                    + ", ".join(SETTINGS) + ")")
+    parser.add_argument("--second", default="", help="second engine, same format")
+    parser.add_argument("--openings", help="FEN or EPD file of start positions (default: the initial position)")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--max-plies", type=int, default=DEFAULT_MAX_PLIES, help="adjudicate a draw after this many plies")
+    parser.add_argument("--sprt", help="stop early: elo0,elo1[,alpha,beta], e.g. 0,10,0.05,0.05")
+    parser.add_argument("--output", help="append one JSON line per game to this file")
+    args = parser.parse_args(argv)
+
+    first = parse_settings(args.first, "first")
+    second = parse_settings(args.second, "second")
+    if first["name"] == second["name"]:
+        second["name"] += "-2"
+    openings = [fen for fen, _ in read_epd(args.openings)] if args.openings else [STARTING_FEN]
+
+    sprt = None
+    if args.sprt:
+        values = [float(value) for value in args.sprt.split(",")]
+        if len(values) == 2:
+            values += [0.05, 0.05]
+        sprt = tuple(values[:4])
+
+    output = open(args.output, "a", encoding="utf-8") if args.output else None
+    start = time.perf_counter()
+    totals = {"nodes": {}, "seconds": {}}
+
+    def report(result, wins, draws, losses, llr):
+        if output is not None:
+            output.write(json.dumps(result, separators=(",", ":")) + "\n")
+            output.flush()
+        for kind in ("nodes", "seconds"):
+            for name, value in result[kind].items():
+                totals[kind][name] = totals[kind].get(name, 0) + value
+        games = wins + draws + losses
+        line = (f"games {games}: +{wins} ={draws} -{losses}, {first['name']} "
+                f"{elo_difference(wins, draws, losses):+.1f} elo")
+        if llr is not None:
+            line += f", LLR {llr:.2f}"
+        print(line, flush=True)
+
+    try:
+        wins, draws, losses = run_match(openings, first, second, args.games, args.workers, args.max_plies, sprt, report)
+    finally:
+        if output is not None:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    games = wins + draws + losses
+    print(f"{games} games in {elapsed:.1f}s ({games / elapsed if elapsed else 0:.2f} games/s)")
+    for name, seconds in totals["seconds"].items():
+        nodes = totals["nodes"].get(name, 0)
+        print(f"  {name}: {nodes / seconds if seconds else 0:,.0f} nodes/s")
+    if sprt is not None:
+        llr = sprt_llr(wins, draws, losses, sprt[0], sprt[1])
+        lower, upper = math.log(sprt[3] / (1 - sprt[2])), math.log((1 - sprt[3]) / sprt[2])
+        verdict = "H1 accepted" if llr >= upper else "H0 accepted" if llr <= lower else "inconclusive"
+        print(f"SPRT [{sprt[0]}, {sprt[1]}]: LLR {llr:.2f} ({lower:.2f}, {upper:.2f}) {verdict}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+import argparse
+import gc
+import sys
+import tracemalloc
+
+from board import Board
+from position import STARTING_FEN
+
+# A middlegame with most pieces still on the board
+DEFAULT_FEN = "r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP2BPPP/R2QKB1R w KQ - 0 8"
+
+
+def measure(make, count):
+    # Bytes allocated per object by make(), averaged over count live objects
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [make() for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return (after - before) / count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report how much memory boards and positions take.")
+    parser.add_argument("--fen", default=DEFAULT_FEN)
+    parser.add_argument("--count", type=int, default=2000, help="live copies to average over")
+    args = parser.parse_args(argv)
+
+    board = Board()
+    board.load_fen(args.fen or STARTING_FEN)
+    board_size = measure(board.copy_board, args.count)
+    position_size = measure(board.position.copy, args.count)
+    print(f"Board (copy_board)    {board_size:10,.0f} bytes")
+    print(f"  Position            {position_size:10,.0f} bytes")
+    print(f"  pieces and the rest {board_size - position_size:10,.0f} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+import argparse
+import sys
+import time
+
+from epd import read_epd
+from position import Position, STARTING_FEN, move_name
+from profiler import profiler
+
+# Reference positions with known leaf counts for depth 1, 2, 3, ...
+# Sources: the standard perft positions and Martin Sedlak's en passant/castling/promotion edge cases.
+REFERENCE_POSITIONS = [
+    ("start", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     [20, 400, 8902, 197281, 4865609]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603]),
+    ("position_3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624]),
+    ("position_4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333]),
+    ("position_5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487]),
+    ("position_6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594]),
+    ("illegal_ep_1", "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1",
+     [18, 92, 1670, 10138, 185429]),
+    ("illegal_ep_2", "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1",
+     [13, 102, 1266, 10276, 135655]),
+    ("ep_capture_checks", "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1",
+     [15, 126, 1928, 13931, 206379]),
+    ("short_castling_check", "5k2/8/8/8/8/8/8/4K2R w K - 0 1",
+     [15, 66, 1198, 6399, 120330]),
+    ("long_castling_check", "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1",
+     [16, 71, 1286, 7418, 141077]),
+    ("castle_rights", "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1",
+     [26, 1141, 27826, 1274206]),
+    ("castling_prevented", "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1",
+     [44, 1494, 50509, 1720476]),
+    ("promote_out_of_check", "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1",
+     [11, 133, 1442, 19174, 266199]),
+    ("discovered_check", "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1",
+     [29, 165, 5160, 31961, 1004658]),
+    ("promote_to_give_check", "4k3/1P6/8/8/8/8/K7/8 w - - 0 1",
+     [9, 40, 472, 2661, 38983]),
+    ("underpromote_to_check", "8/P1k5/K7/8/8/8/8/8 w - - 0 1",
+     [6, 27, 273, 1329, 18135]),
+    ("self_stalemate", "K1k5/8/P7/8/8/8/8/8 w - - 0 1",
+     [2, 6, 13, 63, 382]),
+    ("stalemate_checkmate", "8/k1P5/8/1K6/8/8/8/8 w - - 0 1",
+     [10, 25, 268, 926, 10857]),
+]
+
+
+def perft(position, depth):
+    # Count the leaf nodes of the legal move tree, depth plies deep
+    if depth == 0:
+        return 1
+
+    moves = position.legal_moves()
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        position.make_move(move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move()
+    return nodes
+
+
+def divide(position, depth):
+    # Leaf counts below each root move, for tracking down which move a wrong total comes from
+    results = []
+    for move in position.legal_moves():
+        position.make_move(move)
+        results.append((move_name(move), perft(position, depth - 1)))
+        position.unmake_move()
+    return results
+
+
+def timed_perft(position, depth):
+    start = time.perf_counter()
+    nodes = perft(position, depth)
+    elapsed = time.perf_counter() - start
+    return nodes, elapsed
+
+
+def format_speed(nodes, elapsed):
+    nps = nodes / elapsed if elapsed > 0 else 0
+    return f"{nodes} nodes in {elapsed:.3f}s ({nps:,.0f} nodes/s)"
+
+
+def check_positions(positions, max_depth):
+    # positions yields (name, fen, {depth: expected count}); returns the number of wrong counts
+    position = Position(None)
+    failures = 0
+    total_nodes = 0
+    total_time = 0.0
+
+    for name, fen, expected in positions:
+        for depth in sorted(expected):
+            if depth > max_depth:
+                break
+            position.set_fen(fen)
+            nodes, elapsed = timed_perft(position, depth)
+            total_nodes += nodes
+            total_time += elapsed
+
+            status = "ok" if nodes == expected[depth] else f"FAIL (expected {expected[depth]})"
+            if nodes != expected[depth]:
+                failures += 1
+            print(f"{name} depth {depth}: {format_speed(nodes, elapsed)} {status}")
+
+    print(f"total: {format_speed(total_nodes, total_time)}, {failures} failures")
+    return failures
+
+
+def run_suite(max_depth):
+    return check_positions(((name, fen, dict(enumerate(expected, 1))) for name, fen, expected in REFERENCE_POSITIONS),
+                           max_depth)
+
+
+def run_epd(path, max_depth):
+    # Perft EPD files give the expected counts as "D1 20; D2 400; ..." operations
+    def positions():
+        for index, (fen, operations) in enumerate(read_epd(path), 1):
+            name = operations.get("id", [f"line {index}"])[0]
+            expected = {int(opcode[1:]): int(operands[0]) for opcode, operands in operations.items()
+                        if opcode[:1] == "D" and opcode[1:].isdigit()}
+            yield name, fen, expected
+
+    return check_positions(positions(), max_depth)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count move generator leaf nodes from a position.")
+    parser.add_argument("--fen", default=STARTING_FEN,
+                        help="position to search from (default: the starting position)")
+    parser.add_argument("--depth", type=int, default=3, help="number of plies to search")
+    parser.add_argument("--divide", action="store_true", help="print the leaf count below each root move")
+    parser.add_argument("--suite", action="store_true", help="run the bundled reference positions instead")
+    parser.add_argument("--epd", help="check every position of an EPD file with D1, D2, ... perft operations")
+    parser.add_argument("--max-depth", type=int, default=3, help="deepest depth to check in --suite and --epd")
+    parser.add_argument("--stats", help="count and time the generator calls, and write them to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.stats:
+        # The counters slow the run down a lot, so nodes/s figures are only comparable between --stats runs
+        profiler.enable()
+        try:
+            return run(args)
+        finally:
+            profiler.disable()
+            profiler.dump_json(args.stats)
+    return run(args)
+
+
+def run(args):
+    if args.suite:
+        return 1 if run_suite(args.max_depth) else 0
+    if args.epd:
+        return 1 if run_epd(args.epd, args.max_depth) else 0
+
+    position = Position(args.fen)
+
+    start = time.perf_counter()
+    if args.divide:
+        results = divide(position, args.depth)
+        for name, nodes in results:
+            print(f"{name}: {nodes}")
+        nodes = sum(nodes for _, nodes in results)
+    else:
+        nodes = perft(position, args.depth)
+    elapsed = time.perf_counter() - start
+
+    print(format_speed(nodes, elapsed))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,417 @@
+import argparse
+import re
+import sys
+import time
+
+from position import Position, STARTING_FEN
+from san import move_to_san, parse_san
+
+# Events produced by pgn_events, one game after another:
+#   (HEADER, name, value), (MOVE, san), (COMMENT, text), (NAG, number),
+#   (START_VARIATION,), (END_VARIATION,), and (RESULT, result) closing every game
+HEADER = "header"
+MOVE = "move"
+COMMENT = "comment"
+NAG = "nag"
+START_VARIATION = "start_variation"
+END_VARIATION = "end_variation"
+RESULT = "result"
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+# The seven tags every exported game starts with, in this order
+SEVEN_TAG_ROSTER = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+
+HEADER_LINE = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+ESCAPED = re.compile(r'\\(.)')
+TOKEN = re.compile(r'1-0|0-1|1/2-1/2|\*|\d+\.+|\$\d+|[{;()]|[^\s{};()$]+')
+
+# Glyphs written after a move instead of $1..$6
+SUFFIX_NAGS = {"!": 1, "?": 2, "!!": 3, "??": 4, "!?": 5, "?!": 6}
+
+
+def pgn_events(lines):
+    # Turns any iterable of lines (an open file, stdin) into a stream of events, holding on to no
+    # more than the current line and any comment that spans several lines
+    comment = None
+    depth = 0
+    in_game = False
+    in_movetext = False
+
+    for line in lines:
+        position = 0
+
+        if comment is not None:
+            end = line.find('}')
+            if end < 0:
+                comment.append(line.strip())
+                continue
+            comment.append(line[:end].strip())
+            yield (COMMENT, " ".join(part for part in comment if part))
+            comment = None
+            position = end + 1
+
+        elif line.startswith('%'):
+            # Escaped line, ignored by the standard
+            continue
+
+        elif line.lstrip().startswith('['):
+            header = HEADER_LINE.match(line.strip())
+            if header:
+                if in_movetext:
+                    # The previous game ended without a result
+                    yield (RESULT, "*")
+                    depth = 0
+                    in_movetext = False
+                in_game = True
+                yield (HEADER, header.group(1), ESCAPED.sub(r"\1", header.group(2)))
+                continue
+
+        while True:
+            token = TOKEN.search(line, position)
+            if token is None:
+                break
+            text = token.group()
+            position = token.end()
+            in_game = True
+            in_movetext = True
+
+            if text == '{':
+                end = line.find('}', position)
+                if end < 0:
+                    comment = [line[position:].strip()]
+                    break
+                yield (COMMENT, line[position:end].strip())
+                position = end + 1
+            elif text == ';':
+                yield (COMMENT, line[position:].strip())
+                break
+            elif text == '(':
+                depth += 1
+                yield (START_VARIATION,)
+            elif text == ')':
+                if depth:
+                    depth -= 1
+                    yield (END_VARIATION,)
+            elif text in RESULTS:
+                if depth == 0:
+                    yield (RESULT, text)
+                    in_game = False
+                    in_movetext = False
+            elif text[0] == '$':
+                yield (NAG, int(text[1:]))
+            elif text[0].isdigit() and text.rstrip('.').isdigit():
+                # Move number
+                continue
+            else:
+                san = text.rstrip("!?")
+                if san:
+                    yield (MOVE, san)
+                if san != text and text[len(san):] in SUFFIX_NAGS:
+                    yield (NAG, SUFFIX_NAGS[text[len(san):]])
+
+    if comment is not None:
+        yield (COMMENT, " ".join(part for part in comment if part))
+    if in_game:
+        while depth:
+            depth -= 1
+            yield (END_VARIATION,)
+        yield (RESULT, "*")
+
+
+class GameMove:
+    def __init__(self, san):
+        self.san = san
+        self.nags = []
+        # Comment written after the move, and one written before it (only at the start of a line of moves)
+        self.comment = None
+        self.starting_comment = None
+        # Alternatives to this move, each a list of GameMoves
+        self.variations = []
+
+
+class Game:
+    def __init__(self, headers=None):
+        self.headers = dict(headers or {})
+        self.comment = None
+        self.moves = []
+        self.result = self.headers.get("Result", "*")
+
+    def start_fen(self):
+        return self.headers.get("FEN", STARTING_FEN)
+
+    def mainline(self):
+        # The moves as (from, to, promotion) tuples, checked against the rules as they are played.
+        # Raises ValueError at the first illegal move.
+        position = Position(self.start_fen())
+        for game_move in self.moves:
+            move = parse_san(position, game_move.san)
+            position.make_move(move)
+            yield move
+
+
+def read_games(lines):
+    # Yields one Game at a time from a stream of PGN lines; only the game being read is held in memory
+    game = None
+    line_stack = []
+    pending_comment = None
+
+    for event in pgn_events(lines):
+        kind = event[0]
+        if game is None:
+            game = Game()
+            line_stack = [game.moves]
+
+        if kind == HEADER:
+            game.headers[event[1]] = event[2]
+        elif kind == MOVE:
+            game_move = GameMove(event[1])
+            game_move.starting_comment = pending_comment
+            pending_comment = None
+            line_stack[-1].append(game_move)
+        elif kind == COMMENT:
+            moves = line_stack[-1]
+            if moves:
+                moves[-1].comment = event[1] if moves[-1].comment is None else moves[-1].comment + " " + event[1]
+            elif len(line_stack) == 1:
+                game.comment = event[1] if game.comment is None else game.comment + " " + event[1]
+            else:
+                pending_comment = event[1]
+        elif kind == NAG:
+            if line_stack[-1]:
+                line_stack[-1][-1].nags.append(event[1])
+        elif kind == START_VARIATION:
+            # A variation replaces the move just played; one at the very start has nothing to hang from
+            moves = line_stack[-1]
+            variation = []
+            if moves:
+                moves[-1].variations.append(variation)
+            line_stack.append(variation)
+        elif kind == END_VARIATION:
+            if len(line_stack) > 1:
+                line_stack.pop()
+        elif kind == RESULT:
+            game.result = event[1]
+            game.headers.setdefault("Result", event[1])
+            yield game
+            game = None
+            pending_comment = None
+
+
+def read_pgn(path):
+    # Games from a PGN file, read lazily through a buffered stream
+    with open(path, "r", encoding="utf-8", errors="replace") as file:
+        yield from read_games(file)
+
+
+def game_from_moves(moves, start_fen=STARTING_FEN, headers=None, result="*"):
+    # A Game for a line of (from, to, promotion) moves played from start_fen
+    game = Game(headers)
+    game.result = result
+    game.headers["Result"] = result
+    if start_fen != STARTING_FEN:
+        game.headers["SetUp"] = "1"
+        game.headers["FEN"] = start_fen
+
+    position = Position(start_fen)
+    for move in moves:
+        game.moves.append(GameMove(move_to_san(position, move)))
+        position.make_move(move)
+    return game
+
+
+def escape_header(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def escape_comment(text):
+    # A comment can't contain the closing brace
+    return text.replace('}', ')')
+
+
+def format_moves(moves, color_to_move, fullmove_number, tokens):
+    # Append the movetext tokens for a line of moves (and its variations) to tokens
+    show_number = True
+    for game_move in moves:
+        if game_move.starting_comment:
+            tokens.append("{" + escape_comment(game_move.starting_comment) + "}")
+            show_number = True
+
+        if color_to_move == "w":
+            tokens.append(f"{fullmove_number}.")
+        elif show_number:
+            tokens.append(f"{fullmove_number}...")
+        tokens.append(game_move.san)
+        show_number = False
+
+        for nag in game_move.nags:
+            tokens.append(f"${nag}")
+        if game_move.comment:
+            tokens.append("{" + escape_comment(game_move.comment) + "}")
+            show_number = True
+
+        for variation in game_move.variations:
+            tokens.append("(")
+            format_moves(variation, color_to_move, fullmove_number, tokens)
+            tokens.append(")")
+            show_number = True
+
+        if color_to_move == "b":
+            fullmove_number += 1
+        color_to_move = "b" if color_to_move == "w" else "w"
+
+
+def format_game(game, width=80):
+    # The game as PGN text: headers first, then movetext wrapped at width columns
+    headers = {name: game.headers.get(name, "?") for name in SEVEN_TAG_ROSTER}
+    headers["Result"] = game.result
+    for name, value in game.headers.items():
+        if name not in headers:
+            headers[name] = value
+    lines = [f'[{name} "{escape_header(value)}"]' for name, value in headers.items()]
+    lines.append("")
+
+    fen_fields = game.start_fen().split()
+    tokens = []
+    if game.comment:
+        tokens.append("{" + escape_comment(game.comment) + "}")
+    format_moves(game.moves, fen_fields[1], int(fen_fields[5]) if len(fen_fields) > 5 else 1, tokens)
+    tokens.append(game.result)
+
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > width:
+            lines.append(line)
+            line = token
+        elif not line or line.endswith("(") or token == ")":
+            line += token
+        else:
+            line += " " + token
+    lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def write_pgn(games, file):
+    # Writes games one after another, so a generator of games streams straight to disk
+    count = 0
+    for game in games:
+        if count:
+            file.write("\n")
+        file.write(format_game(game))
+        count += 1
+    return count
+
+
+def validate_games(lines, variations=True, on_error=None):
+    # Replays every game of a PGN stream move by move, straight from the event stream, so not even a
+    # single game is held in memory. Each illegal or unreadable move calls
+    # on_error(game_number, headers, ply, san, message); the rest of that game is skipped.
+    # Returns (games, invalid_games, moves checked).
+    games = invalid = moves_checked = 0
+    headers = {}
+    position = None
+    failed = False
+    # One entry per open line of moves, the mainline first: [moves played on it, the move it replaced]
+    open_lines = [[0, None]]
+    # Variations being skipped when only the mainline is checked
+    skipped = 0
+
+    for event in pgn_events(lines):
+        kind = event[0]
+
+        if kind == HEADER:
+            headers[event[1]] = event[2]
+            continue
+
+        if kind == RESULT:
+            games += 1
+            if failed:
+                invalid += 1
+            headers = {}
+            position = None
+            failed = False
+            open_lines = [[0, None]]
+            skipped = 0
+            continue
+
+        if failed:
+            continue
+
+        if position is None:
+            try:
+                position = Position(headers.get("FEN", STARTING_FEN))
+            except ValueError as error:
+                failed = True
+                if on_error:
+                    on_error(games + 1, headers, 0, None, str(error))
+                continue
+
+        if skipped or (kind == START_VARIATION and not variations):
+            if kind == START_VARIATION:
+                skipped += 1
+            elif kind == END_VARIATION:
+                skipped -= 1
+            continue
+
+        if kind == MOVE:
+            try:
+                move = parse_san(position, event[1])
+            except ValueError as error:
+                failed = True
+                if on_error:
+                    on_error(games + 1, headers, len(position.undo_stack) + 1, event[1], str(error))
+                continue
+            position.make_move(move)
+            open_lines[-1][0] += 1
+            moves_checked += 1
+
+        elif kind == START_VARIATION:
+            # The variation is played instead of the last move of the line it branches from
+            replaced = None
+            if open_lines[-1][0]:
+                replaced = position.undo_stack[-1][0]
+                position.unmake_move()
+                open_lines[-1][0] -= 1
+            open_lines.append([0, replaced])
+
+        elif kind == END_VARIATION and len(open_lines) > 1:
+            played, replaced = open_lines.pop()
+            for _ in range(played):
+                position.unmake_move()
+            if replaced is not None:
+                position.make_move(replaced)
+                open_lines[-1][0] += 1
+
+    return games, invalid, moves_checked
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check every move of every game in a PGN file against the rules.")
+    parser.add_argument("pgn", nargs="?", default="-", help="PGN file to check (default: stdin)")
+    parser.add_argument("--mainline", action="store_true", help="skip the moves inside variations")
+    parser.add_argument("--quiet", action="store_true", help="only print the totals")
+    args = parser.parse_args(argv)
+
+    def report(game_number, headers, ply, san, message):
+        if args.quiet:
+            return
+        players = f'{headers.get("White", "?")} - {headers.get("Black", "?")}'
+        where = f"ply {ply} ({san})" if san else "setup"
+        print(f"game {game_number} [{players}] {where}: {message}")
+
+    file = sys.stdin if args.pgn == "-" else open(args.pgn, "r", encoding="utf-8", errors="replace")
+    start = time.perf_counter()
+    try:
+        games, invalid, moves = validate_games(file, not args.mainline, report)
+    finally:
+        if file is not sys.stdin:
+            file.close()
+    elapsed = time.perf_counter() - start
+
+    rate = f"{games / elapsed:,.0f} games/s, {moves / elapsed:,.0f} moves/s" if elapsed else ""
+    print(f"{games} games, {invalid} with illegal moves, {moves} moves in {elapsed:.2f}s ({rate})")
+    return 1 if invalid else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
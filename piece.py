@@ -1,6 +1,24 @@
-import pygame as pg
+PIECE_IMAGES = [
+    "Pieces/b_rook.png",
+    "Pieces/b_knight.png",
+    "Pieces/b_bishop.png",
+    "Pieces/b_queen.png",
+    "Pieces/b_king.png",
+    "Pieces/b_pawn.png",
+    "Pieces/w_rook.png",
+    "Pieces/w_knight.png",
+    "Pieces/w_bishop.png",
+    "Pieces/w_queen.png",
+    "Pieces/w_king.png",
+    "Pieces/w_pawn.png"
+]
 
 class Piece:
+    # Pieces are flyweights: there is one shared, immutable Piece per type and color, so a board
+    # holds 64 references rather than a fresh object per piece. Where a piece stands, and where it
+    # is drawn, belong to the board and its renderer; whether it has moved is in the position's
+    # castling rights and en passant square.
+    __slots__ = ("piece_type", "color", "code", "image")
 
     none = 0
     pawn = 1
@@ -13,62 +31,47 @@ class Piece:
     white = 8
     black = 16
 
-    def __init__(self, screen, piece_type, color, position):
-        self.screen = screen
-        self.piece_type = piece_type
-        self.color = color
-        self.position = position
+    _interned = {}
 
-        self.has_moved = False
-        self.just_moved = False
+    def __new__(cls, piece_type, color):
+        code = piece_type | color
+        piece = cls._interned.get(code)
+        if piece is None:
+            piece = object.__new__(cls)
+            object.__setattr__(piece, "piece_type", piece_type)
+            object.__setattr__(piece, "color", color)
+            object.__setattr__(piece, "code", code)
+            # Image order: rook, knight, bishop, queen, king, pawn, black first
+            index = (cls.rook, cls.knight, cls.bishop, cls.queen, cls.king, cls.pawn).index(piece_type)
+            object.__setattr__(piece, "image", PIECE_IMAGES[index + (6 if color == cls.white else 0)])
+            cls._interned[code] = piece
+        return piece
 
-        self.piece_img = None
-        self.piece_imgs = [
-            "Pieces/b_rook.png",
-            "Pieces/b_knight.png",
-            "Pieces/b_bishop.png",
-            "Pieces/b_queen.png",
-            "Pieces/b_king.png",
-            "Pieces/b_pawn.png",
-            "Pieces/w_rook.png",
-            "Pieces/w_knight.png",
-            "Pieces/w_bishop.png",
-            "Pieces/w_queen.png",
-            "Pieces/w_king.png",
-            "Pieces/w_pawn.png"
-        ]
+    @classmethod
+    def from_code(cls, code):
+        piece = cls._interned.get(code)
+        return piece if piece is not None else cls(code & 7, code & (cls.white | cls.black))
 
-    def display_piece(self):
-        if self.color == Piece.white:
-            match self.piece_type:
-                case self.rook:
-                    self.piece_img = self.piece_imgs[6]
-                case self.knight:
-                    self.piece_img = self.piece_imgs[7]
-                case self.bishop:
-                    self.piece_img = self.piece_imgs[8]
-                case self.queen:
-                    self.piece_img = self.piece_imgs[9]
-                case self.king:
-                    self.piece_img = self.piece_imgs[10]
-                case self.pawn:
-                    self.piece_img = self.piece_imgs[11]
-        elif self.color == Piece.black:
-            match self.piece_type:
-                case self.rook:
-                    self.piece_img = self.piece_imgs[0]
-                case self.knight:
-                    self.piece_img = self.piece_imgs[1]
-                case self.bishop:
-                    self.piece_img = self.piece_imgs[2]
-                case self.queen:
-                    self.piece_img = self.piece_imgs[3]
-                case self.king:
-                    self.piece_img = self.piece_imgs[4]
-                case self.pawn:
-                    self.piece_img = self.piece_imgs[5]
-        
-        img = pg.image.load(self.piece_img)
-        img = pg.transform.scale(img, (100, 100))
-        self.screen.blit(img, (self.position[0], self.position[1]))
+    def __setattr__(self, name, value):
+        raise AttributeError("pieces are shared and can't be changed")
 
+    def __delattr__(self, name):
+        raise AttributeError("pieces are shared and can't be changed")
+
+    def __reduce__(self):
+        return Piece, (self.piece_type, self.color)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self):
+        return f"Piece({self.piece_type}, {self.color})"
+
+    def display_piece(self, screen, position, size=100):
+        # Imported here so the rules code can use Piece without loading pygame
+        from sprites import piece_sprites
+
+        screen.blit(piece_sprites.get(self.image, size), position)
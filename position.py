@@ -0,0 +1,631 @@
+from piece import Piece
+from tables import KNIGHT_TARGETS, KING_TARGETS, PAWN_ATTACKS, ROOK_RAYS, BISHOP_RAYS, QUEEN_RAYS
+from zobrist import PIECE_KEYS, SIDE_KEY, CASTLING_KEYS, EN_PASSANT_KEYS
+
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Squares use the 0x88 layout: square = rank * 16 + file, with rank 0 at the top of the board
+# (the 8th rank) just like Board.board. Any index with a bit of 0x88 set is off the board,
+# which is how tables.py works out which steps stay on the board.
+# Each square holds a piece code: Piece.pawn..Piece.king | Piece.white/Piece.black, or 0 when empty.
+TYPE_MASK = 7
+COLOR_MASK = Piece.white | Piece.black
+
+SQUARES = [rank * 16 + file for rank in range(8) for file in range(8)]
+
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+
+PROMOTION_PIECES = (Piece.queen, Piece.rook, Piece.bishop, Piece.knight)
+PROMOTION_LETTERS = {Piece.rook: 'r', Piece.knight: 'n', Piece.bishop: 'b', Piece.queen: 'q'}
+
+PIECE_LETTERS = {
+    Piece.pawn: 'p',
+    Piece.rook: 'r',
+    Piece.knight: 'n',
+    Piece.bishop: 'b',
+    Piece.queen: 'q',
+    Piece.king: 'k'
+}
+
+# Moving a piece from or to one of these squares takes away the matching castling rights
+CASTLING_MASKS = [15] * 128
+for _square, _rights in ((0x74, WHITE_KINGSIDE | WHITE_QUEENSIDE), (0x77, WHITE_KINGSIDE), (0x70, WHITE_QUEENSIDE),
+                         (0x04, BLACK_KINGSIDE | BLACK_QUEENSIDE), (0x07, BLACK_KINGSIDE), (0x00, BLACK_QUEENSIDE)):
+    CASTLING_MASKS[_square] = 15 & ~_rights
+
+
+def square(file, rank):
+    return rank << 4 | file
+
+
+def square_file(sq):
+    return sq & 7
+
+
+def square_rank(sq):
+    return sq >> 4
+
+
+def square_name(sq):
+    # rank 0 is the top of the board, which is the 8th rank
+    return "abcdefgh"[sq & 7] + str(8 - (sq >> 4))
+
+
+def parse_square(name):
+    return square(ord(name[0]) - ord('a'), 8 - int(name[1]))
+
+
+def move_name(move):
+    # Long algebraic notation, e.g. e2e4 or e7e8q
+    from_sq, to_sq, promotion = move
+    name = square_name(from_sq) + square_name(to_sq)
+    if promotion:
+        name += PROMOTION_LETTERS[promotion]
+    return name
+
+
+class Position:
+    def __init__(self, fen=STARTING_FEN):
+        self.squares = bytearray(128)
+
+        self.color_to_move = Piece.white
+        self.castling = 0
+        self.en_passant = None
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+
+        # Kept up to date by make_move/unmake_move so check detection never has to search for the king
+        self.king_squares = {Piece.white: None, Piece.black: None}
+
+        # Zobrist key of the position, also kept up to date by make_move/unmake_move
+        self.key = 0
+
+        # Every make_move pushes enough state here for unmake_move to restore the position exactly
+        self.undo_stack = []
+
+        if fen:
+            self.set_fen(fen)
+
+    def set_fen(self, fen):
+        # Missing trailing fields fall back to white to move, no castling, no en passant and fresh clocks
+        fields = fen.split()
+        if not 1 <= len(fields) <= 6:
+            raise ValueError(f"FEN should have 1 to 6 fields: {fen!r}")
+
+        self.squares = bytearray(128)
+        self.place_pieces_from_fen(fields[0])
+
+        # Move generation assumes one king a side and no pawn on the last rank it would promote on
+        for color, name in ((Piece.white, "white"), (Piece.black, "black")):
+            if self.squares.count(Piece.king | color) != 1:
+                raise ValueError(f"FEN should have exactly one {name} king: {fen!r}")
+        for sq in [*range(0x00, 0x08), *range(0x70, 0x78)]:
+            if self.squares[sq] & TYPE_MASK == Piece.pawn:
+                raise ValueError(f"FEN has a pawn on the first or eighth rank: {fen!r}")
+
+        side = fields[1] if len(fields) > 1 else 'w'
+        if side not in ('w', 'b'):
+            raise ValueError(f"FEN side to move should be w or b: {fen!r}")
+        self.color_to_move = Piece.black if side == 'b' else Piece.white
+
+        # Only keep castling rights that still have their king and rook at home
+        castling = fields[2] if len(fields) > 2 else '-'
+        if castling != '-' and not set(castling) <= set("KQkq"):
+            raise ValueError(f"FEN castling rights should be - or some of KQkq: {fen!r}")
+        self.castling = 0
+        for letter, right, king_sq, rook_sq, color in (('K', WHITE_KINGSIDE, 0x74, 0x77, Piece.white),
+                                                       ('Q', WHITE_QUEENSIDE, 0x74, 0x70, Piece.white),
+                                                       ('k', BLACK_KINGSIDE, 0x04, 0x07, Piece.black),
+                                                       ('q', BLACK_QUEENSIDE, 0x04, 0x00, Piece.black)):
+            if (letter in castling and self.squares[king_sq] == Piece.king | color
+                    and self.squares[rook_sq] == Piece.rook | color):
+                self.castling |= right
+
+        en_passant = fields[3] if len(fields) > 3 else '-'
+        if en_passant == '-':
+            self.en_passant = None
+        elif len(en_passant) == 2 and en_passant[0] in "abcdefgh" and en_passant[1] == ('6' if side == 'w' else '3'):
+            # The square the other side's pawn just skipped: it and the square the pawn came from are
+            # empty, and the pawn stands right in front of it. make_move relies on all three.
+            sq = parse_square(en_passant)
+            step = 16 if side == 'w' else -16
+            if (self.squares[sq] or self.squares[sq - step]
+                    or self.squares[sq + step] != Piece.pawn | (self.color_to_move ^ COLOR_MASK)):
+                raise ValueError(f"FEN en passant square {en_passant} doesn't follow a two square pawn move: {fen!r}")
+            self.en_passant = sq
+        else:
+            raise ValueError(f"FEN en passant square should be - or on the {'6th' if side == 'w' else '3rd'} rank: {fen!r}")
+
+        if any(not field.isdigit() for field in fields[4:]):
+            raise ValueError(f"FEN move clocks should be whole numbers: {fen!r}")
+        self.halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        self.fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+
+        for color in (Piece.white, Piece.black):
+            king_sq = self.squares.find(Piece.king | color)
+            self.king_squares[color] = None if king_sq == -1 else king_sq
+
+        # The side that just moved can't have left its king in check
+        if self.is_in_check(self.color_to_move ^ COLOR_MASK):
+            raise ValueError(f"FEN has the side not to move in check: {fen!r}")
+
+        self.key = self.compute_key()
+        self.undo_stack = []
+
+    def place_pieces_from_fen(self, placement):
+        piece_map = {letter: piece_type for piece_type, letter in PIECE_LETTERS.items()}
+
+        rows = placement.split('/')
+        if len(rows) != 8:
+            raise ValueError(f"FEN placement should have 8 ranks: {placement!r}")
+
+        for rank, row in enumerate(rows):
+            file = 0
+            for char in row:
+                if char.isdigit():
+                    file += int(char)
+                elif char.lower() in piece_map and file < 8:
+                    color = Piece.white if char.isupper() else Piece.black
+                    self.squares[square(file, rank)] = piece_map[char.lower()] | color
+                    file += 1
+                else:
+                    raise ValueError(f"FEN placement has a bad rank {row!r}: {placement!r}")
+            if file != 8:
+                raise ValueError(f"FEN placement rank {row!r} doesn't cover 8 files: {placement!r}")
+
+    def to_fen(self):
+        rows = []
+        for rank in range(8):
+            row = ""
+            empty = 0
+            for file in range(8):
+                piece = self.squares[rank << 4 | file]
+                if piece == 0:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                letter = PIECE_LETTERS[piece & TYPE_MASK]
+                row += letter.upper() if piece & Piece.white else letter
+            if empty:
+                row += str(empty)
+            rows.append(row)
+
+        side = 'w' if self.color_to_move == Piece.white else 'b'
+        castling = "".join(letter for letter, right in (('K', WHITE_KINGSIDE), ('Q', WHITE_QUEENSIDE),
+                                                        ('k', BLACK_KINGSIDE), ('q', BLACK_QUEENSIDE))
+                           if self.castling & right) or '-'
+        en_passant = '-' if self.en_passant is None else square_name(self.en_passant)
+
+        return f"{'/'.join(rows)} {side} {castling} {en_passant} {self.halfmove_clock} {self.fullmove_number}"
+
+    def copy(self):
+        # A copy is one 128 byte buffer copy plus a few integers; the undo history is not carried over
+        new_position = Position.__new__(Position)
+        new_position.squares = self.squares[:]
+        new_position.color_to_move = self.color_to_move
+        new_position.castling = self.castling
+        new_position.en_passant = self.en_passant
+        new_position.halfmove_clock = self.halfmove_clock
+        new_position.fullmove_number = self.fullmove_number
+        new_position.king_squares = dict(self.king_squares)
+        new_position.key = self.key
+        new_position.undo_stack = []
+        return new_position
+
+    def piece_at(self, file, rank):
+        return self.squares[rank << 4 | file]
+
+    def moves_played(self):
+        # Every move made since the position was set up, oldest first
+        return [entry[0] for entry in self.undo_stack]
+
+    def compute_key(self):
+        # The Zobrist key from scratch; make_move only ever updates it incrementally
+        key = 0
+        squares = self.squares
+        for sq in SQUARES:
+            if squares[sq]:
+                key ^= PIECE_KEYS[squares[sq]][sq]
+        if self.color_to_move == Piece.black:
+            key ^= SIDE_KEY
+        return key ^ CASTLING_KEYS[self.castling] ^ self.en_passant_key()
+
+    def en_passant_key(self):
+        # The en passant square only changes the position when a pawn of the side to move
+        # stands next to the pawn that just moved two squares and could take it
+        if self.en_passant is None:
+            return 0
+
+        # The capturing squares are the ones a pawn of the other color on the en passant square would attack
+        pawn = Piece.pawn | self.color_to_move
+        for sq in PAWN_ATTACKS[self.color_to_move ^ COLOR_MASK][self.en_passant]:
+            if self.squares[sq] == pawn:
+                return EN_PASSANT_KEYS[self.en_passant & 7]
+        return 0
+
+    def make_move(self, move):
+        # Play a (from, to, promotion) move in place, handling captures, castling, en passant and promotion
+        from_sq, to_sq, promotion = move
+        squares = self.squares
+        piece = squares[from_sq]
+        captured = squares[to_sq]
+        kind = piece & TYPE_MASK
+        color = piece & COLOR_MASK
+
+        self.undo_stack.append((move, piece, captured, self.castling, self.en_passant, self.halfmove_clock, self.key))
+
+        key = self.key ^ SIDE_KEY ^ CASTLING_KEYS[self.castling] ^ PIECE_KEYS[piece][from_sq]
+        if self.en_passant is not None:
+            key ^= self.en_passant_key()
+        if captured:
+            key ^= PIECE_KEYS[captured][to_sq]
+
+        moved = promotion | color if promotion else piece
+        squares[from_sq] = 0
+        squares[to_sq] = moved
+        key ^= PIECE_KEYS[moved][to_sq]
+
+        self.en_passant = None
+        if kind == Piece.pawn:
+            self.halfmove_clock = 0
+            if to_sq - from_sq in (32, -32):
+                self.en_passant = (from_sq + to_sq) >> 1
+            elif captured == 0 and (to_sq - from_sq) & 15:
+                # En passant: the captured pawn sits beside the moving pawn, not on the target square
+                captured_sq = to_sq + 16 if color == Piece.white else to_sq - 16
+                key ^= PIECE_KEYS[squares[captured_sq]][captured_sq]
+                squares[captured_sq] = 0
+        else:
+            self.halfmove_clock = 0 if captured else self.halfmove_clock + 1
+            if kind == Piece.king:
+                self.king_squares[color] = to_sq
+                if to_sq - from_sq in (2, -2):
+                    # Castling: bring the rook over to the other side of the king
+                    rook_from, rook_to = (from_sq + 3, from_sq + 1) if to_sq > from_sq else (from_sq - 4, from_sq - 1)
+                    rook = squares[rook_from]
+                    squares[rook_to] = rook
+                    squares[rook_from] = 0
+                    key ^= PIECE_KEYS[rook][rook_from] ^ PIECE_KEYS[rook][rook_to]
+
+        self.castling &= CASTLING_MASKS[from_sq] & CASTLING_MASKS[to_sq]
+
+        if color == Piece.black:
+            self.fullmove_number += 1
+        self.color_to_move = color ^ COLOR_MASK
+
+        key ^= CASTLING_KEYS[self.castling]
+        if self.en_passant is not None:
+            key ^= self.en_passant_key()
+        self.key = key
+
+    def unmake_move(self):
+        # Take back the last move made with make_move
+        move, piece, captured, castling, en_passant, halfmove_clock, key = self.undo_stack.pop()
+        from_sq, to_sq, promotion = move
+        squares = self.squares
+        kind = piece & TYPE_MASK
+        color = piece & COLOR_MASK
+
+        squares[from_sq] = piece
+        squares[to_sq] = captured
+
+        if kind == Piece.pawn and to_sq == en_passant:
+            squares[to_sq + 16 if color == Piece.white else to_sq - 16] = Piece.pawn | (color ^ COLOR_MASK)
+        elif kind == Piece.king:
+            self.king_squares[color] = from_sq
+            if to_sq - from_sq in (2, -2):
+                if to_sq > from_sq:
+                    squares[from_sq + 3] = squares[from_sq + 1]
+                    squares[from_sq + 1] = 0
+                else:
+                    squares[from_sq - 4] = squares[from_sq - 1]
+                    squares[from_sq - 1] = 0
+
+        self.castling = castling
+        self.en_passant = en_passant
+        self.halfmove_clock = halfmove_clock
+        self.key = key
+        if color == Piece.black:
+            self.fullmove_number -= 1
+        self.color_to_move = color
+
+    def piece_moves(self, sq, moves):
+        # Append the pseudo-legal moves of the piece on sq
+        piece = self.squares[sq]
+        kind = piece & TYPE_MASK
+        color = piece & COLOR_MASK
+
+        if kind == Piece.pawn:
+            self.pawn_valid_moves(sq, color, moves)
+        elif kind == Piece.knight:
+            self.knight_valid_moves(sq, color, moves)
+        elif kind == Piece.bishop:
+            self.bishop_valid_moves(sq, color, moves)
+        elif kind == Piece.rook:
+            self.rook_valid_moves(sq, color, moves)
+        elif kind == Piece.queen:
+            self.queen_valid_moves(sq, color, moves)
+        elif kind == Piece.king:
+            self.king_valid_moves(sq, color, moves)
+
+    def pseudo_legal_moves(self, color):
+        moves = []
+        squares = self.squares
+        for sq in SQUARES:
+            piece = squares[sq]
+            if piece and piece & color:
+                self.piece_moves(sq, moves)
+        return moves
+
+    def pawn_valid_moves(self, sq, color, moves):
+        squares = self.squares
+        if color == Piece.white:
+            step, start_rank, last_rank = -16, 6, 0
+        else:
+            step, start_rank, last_rank = 16, 1, 7
+
+        # One square forward, and two from the starting rank
+        to_sq = sq + step
+        if squares[to_sq] == 0:
+            self.add_pawn_move(sq, to_sq, last_rank, moves)
+            if sq >> 4 == start_rank and squares[to_sq + step] == 0:
+                moves.append((sq, to_sq + step, 0))
+
+        # Captures, including en passant for the side to move
+        for to_sq in PAWN_ATTACKS[color][sq]:
+            target = squares[to_sq]
+            if target:
+                if not target & color:
+                    self.add_pawn_move(sq, to_sq, last_rank, moves)
+            elif to_sq == self.en_passant and color == self.color_to_move:
+                moves.append((sq, to_sq, 0))
+
+    def add_pawn_move(self, from_sq, to_sq, last_rank, moves):
+        if to_sq >> 4 == last_rank:
+            for promotion in PROMOTION_PIECES:
+                moves.append((from_sq, to_sq, promotion))
+        else:
+            moves.append((from_sq, to_sq, 0))
+
+    def knight_valid_moves(self, sq, color, moves):
+        squares = self.squares
+        for to_sq in KNIGHT_TARGETS[sq]:
+            if not squares[to_sq] & color:
+                moves.append((sq, to_sq, 0))
+
+    def slider_valid_moves(self, sq, color, rays, moves):
+        squares = self.squares
+        for ray in rays:
+            for to_sq in ray:
+                target = squares[to_sq]
+                if target == 0:
+                    moves.append((sq, to_sq, 0))
+                else:
+                    if not target & color:
+                        moves.append((sq, to_sq, 0))
+                    break
+
+    def rook_valid_moves(self, sq, color, moves):
+        self.slider_valid_moves(sq, color, ROOK_RAYS[sq], moves)
+
+    def bishop_valid_moves(self, sq, color, moves):
+        self.slider_valid_moves(sq, color, BISHOP_RAYS[sq], moves)
+
+    def queen_valid_moves(self, sq, color, moves):
+        self.slider_valid_moves(sq, color, QUEEN_RAYS[sq], moves)
+
+    def king_valid_moves(self, sq, color, moves):
+        squares = self.squares
+        for to_sq in KING_TARGETS[sq]:
+            if not squares[to_sq] & color:
+                moves.append((sq, to_sq, 0))
+
+        # Castling, only while the rights are still there (which implies king and rook are at home)
+        if color == Piece.white:
+            kingside, queenside = self.castling & WHITE_KINGSIDE, self.castling & WHITE_QUEENSIDE
+        else:
+            kingside, queenside = self.castling & BLACK_KINGSIDE, self.castling & BLACK_QUEENSIDE
+
+        if kingside and squares[sq + 1] == 0 and squares[sq + 2] == 0:
+            moves.append((sq, sq + 2, 0))
+        if queenside and squares[sq - 1] == 0 and squares[sq - 2] == 0 and squares[sq - 3] == 0:
+            moves.append((sq, sq - 2, 0))
+
+    def is_square_attacked(self, sq, by_color):
+        # Work backwards from the target square: look for a pawn, knight or king of by_color
+        # that could reach it, then walk the rays for a slider
+        squares = self.squares
+
+        # A by_color pawn attacks sq from the squares a pawn of the other color on sq would capture on
+        pawn = Piece.pawn | by_color
+        for from_sq in PAWN_ATTACKS[by_color ^ COLOR_MASK][sq]:
+            if squares[from_sq] == pawn:
+                return True
+
+        knight = Piece.knight | by_color
+        for from_sq in KNIGHT_TARGETS[sq]:
+            if squares[from_sq] == knight:
+                return True
+
+        king = Piece.king | by_color
+        for from_sq in KING_TARGETS[sq]:
+            if squares[from_sq] == king:
+                return True
+
+        queen = Piece.queen | by_color
+        rook = Piece.rook | by_color
+        for ray in ROOK_RAYS[sq]:
+            for from_sq in ray:
+                piece = squares[from_sq]
+                if piece:
+                    if piece == rook or piece == queen:
+                        return True
+                    break
+
+        bishop = Piece.bishop | by_color
+        for ray in BISHOP_RAYS[sq]:
+            for from_sq in ray:
+                piece = squares[from_sq]
+                if piece:
+                    if piece == bishop or piece == queen:
+                        return True
+                    break
+        return False
+
+    def is_in_check(self, color):
+        king_sq = self.king_squares[color]
+        if king_sq is None:
+            return False
+        return self.is_square_attacked(king_sq, color ^ COLOR_MASK)
+
+    def pinned_pieces(self, color):
+        # Squares of color's pieces that stand alone between their king and an enemy slider on the same line
+        king_sq = self.king_squares[color]
+        pinned = set()
+        if king_sq is None:
+            return pinned
+
+        squares = self.squares
+        opponent = color ^ COLOR_MASK
+        queen = Piece.queen | opponent
+        for rays, slider in ((ROOK_RAYS[king_sq], Piece.rook | opponent), (BISHOP_RAYS[king_sq], Piece.bishop | opponent)):
+            for ray in rays:
+                blocker = None
+                for sq in ray:
+                    piece = squares[sq]
+                    if piece:
+                        if piece & color and blocker is None:
+                            blocker = sq
+                        else:
+                            if blocker is not None and (piece == slider or piece == queen):
+                                pinned.add(blocker)
+                            break
+        return pinned
+
+    def filter_legal_moves(self, moves, color, checks=None):
+        # checks is (in_check, pinned) when the caller has worked them out already
+        king_sq = self.king_squares[color]
+        if king_sq is None:
+            return moves
+
+        squares = self.squares
+        opponent = color ^ COLOR_MASK
+        if checks is None:
+            in_check = self.is_square_attacked(king_sq, opponent)
+            pinned = self.pinned_pieces(color)
+        else:
+            in_check, pinned = checks
+
+        legal_moves = []
+        for move in moves:
+            from_sq, to_sq, _ = move
+
+            if from_sq == king_sq:
+                # Castling may not start from, or pass through, an attacked square
+                if to_sq - from_sq in (2, -2) and (in_check or self.is_square_attacked((from_sq + to_sq) >> 1, opponent)):
+                    continue
+
+                # Lift the king off its square so sliders checking it along the line of the move see through it
+                squares[from_sq] = 0
+                attacked = self.is_square_attacked(to_sq, opponent)
+                squares[from_sq] = Piece.king | color
+                if not attacked:
+                    legal_moves.append(move)
+
+            elif in_check or from_sq in pinned or (to_sq == self.en_passant and squares[from_sq] & TYPE_MASK == Piece.pawn):
+                # Only these can expose the king, so only these need the move played out
+                self.make_move(move)
+                if not self.is_square_attacked(king_sq, opponent):
+                    legal_moves.append(move)
+                self.unmake_move()
+
+            else:
+                legal_moves.append(move)
+        return legal_moves
+
+    def legal_moves_from(self, sq):
+        moves = []
+        self.piece_moves(sq, moves)
+        return self.filter_legal_moves(moves, self.squares[sq] & COLOR_MASK)
+
+    def legal_moves(self, color=None):
+        if color is None:
+            color = self.color_to_move
+        return self.filter_legal_moves(self.pseudo_legal_moves(color), color)
+
+    def iter_legal_moves(self, color=None):
+        # Legal moves one piece at a time, so a caller that stops early only pays for the pieces it
+        # got through. Check and pins are worked out once up front.
+        if color is None:
+            color = self.color_to_move
+        squares = self.squares
+        checks = None
+        if self.king_squares[color] is not None:
+            checks = (self.is_in_check(color), self.pinned_pieces(color))
+
+        for sq in SQUARES:
+            piece = squares[sq]
+            if piece and piece & color:
+                moves = []
+                self.piece_moves(sq, moves)
+                yield from self.filter_legal_moves(moves, color, checks)
+
+    def has_any_legal_move(self, color=None):
+        for _ in self.iter_legal_moves(color):
+            return True
+        return False
+
+    def is_checkmate(self, color):
+        # Mated means in check with no legal move for any piece
+        return self.is_in_check(color) and not self.has_any_legal_move(color)
+
+    def is_stalemate(self, color):
+        return not self.is_in_check(color) and not self.has_any_legal_move(color)
+
+    def game_result(self):
+        # (result, reason) once the game is over by the rules, otherwise None. In the usual case this
+        # costs a check test and the first legal move found.
+        color = self.color_to_move
+        if not self.has_any_legal_move(color):
+            if self.is_in_check(color):
+                return ("0-1" if color == Piece.white else "1-0"), "checkmate"
+            return "1/2-1/2", "stalemate"
+        if self.halfmove_clock >= 100:
+            return "1/2-1/2", "fifty moves"
+        if self.repetition_count() >= 3:
+            return "1/2-1/2", "repetition"
+        if self.insufficient_material():
+            return "1/2-1/2", "insufficient material"
+        return None
+
+    def repetition_count(self):
+        # How many times the current position has occurred in the game, this time included. Only
+        # positions since the last capture or pawn move can repeat, with the same side to move.
+        key = self.key
+        stack = self.undo_stack
+        count = 1
+        for plies_back in range(2, min(self.halfmove_clock, len(stack)) + 1, 2):
+            if stack[-plies_back][6] == key:
+                count += 1
+        return count
+
+    def insufficient_material(self):
+        # Neither side can possibly mate: bare kings, a single minor piece, or only bishops that
+        # all stand on squares of one color
+        knights = bishops = 0
+        bishop_colors = set()
+        for sq in SQUARES:
+            kind = self.squares[sq] & TYPE_MASK
+            if kind in (Piece.pawn, Piece.rook, Piece.queen):
+                return False
+            if kind == Piece.knight:
+                knights += 1
+            elif kind == Piece.bishop:
+                bishops += 1
+                bishop_colors.add(((sq >> 4) + sq) & 1)
+        return knights + bishops <= 1 or (knights == 0 and len(bishop_colors) == 1)
@@ -0,0 +1,170 @@
+import cProfile
+import importlib
+import json
+import time
+from collections import deque
+
+# Methods on the move generation and legality paths that get a call counter and a cumulative timer.
+# They are only wrapped while instrumentation is enabled, so when it's off they run untouched and
+# cost nothing extra. Timers are inclusive: filter_legal_moves includes its is_square_attacked calls.
+HOT_PATHS = (
+    ("position", "Position", ("legal_moves", "pseudo_legal_moves", "filter_legal_moves", "legal_moves_from",
+                              "is_in_check", "is_square_attacked", "pinned_pieces", "make_move", "unmake_move",
+                              "copy")),
+    ("board", "Board", ("copy_board", "update_move_table", "get_valid_moves", "handle_click", "play_move", "draw"))
+)
+
+# Frame times kept for the percentiles, about ten seconds at 60 fps
+FRAME_HISTORY = 600
+
+# How often the overlay text is redrawn, in seconds
+OVERLAY_INTERVAL = 0.25
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def counted(function, counter):
+    # counter is [calls, seconds], updated in place
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            counter[0] += 1
+            counter[1] += time.perf_counter() - start
+
+    wrapper.__name__ = function.__name__
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        # "Position.legal_moves" -> [calls, seconds]
+        self.counters = {}
+        self.originals = []
+        self.frame_times = deque(maxlen=FRAME_HISTORY)
+        self.profile = None
+
+    def enable(self):
+        if self.enabled:
+            return
+        for module_name, class_name, method_names in HOT_PATHS:
+            cls = getattr(importlib.import_module(module_name), class_name)
+            for method_name in method_names:
+                function = cls.__dict__[method_name]
+                counter = self.counters.setdefault(f"{class_name}.{method_name}", [0, 0.0])
+                self.originals.append((cls, method_name, function))
+                setattr(cls, method_name, counted(function, counter))
+        self.enabled = True
+
+    def disable(self):
+        # Put the original methods back; the counts gathered so far are kept
+        for cls, method_name, function in reversed(self.originals):
+            setattr(cls, method_name, function)
+        self.originals = []
+        self.enabled = False
+
+    def reset(self):
+        for counter in self.counters.values():
+            counter[0] = 0
+            counter[1] = 0.0
+        self.frame_times.clear()
+
+    def record_frame(self, milliseconds):
+        self.frame_times.append(milliseconds)
+
+    def frame_percentiles(self):
+        frames = sorted(self.frame_times)
+        return {"p50": percentile(frames, 0.5), "p95": percentile(frames, 0.95), "p99": percentile(frames, 0.99)}
+
+    def mean_ms(self, name):
+        calls, seconds = self.counters.get(name, (0, 0.0))
+        return seconds * 1000 / calls if calls else 0.0
+
+    def snapshot(self):
+        return {
+            "counters": {name: {"calls": calls, "seconds": round(seconds, 6)}
+                         for name, (calls, seconds) in sorted(self.counters.items()) if calls},
+            "frames": dict(self.frame_percentiles(), count=len(self.frame_times))
+        }
+
+    def dump_json(self, path):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.snapshot(), file, indent=2)
+
+    def start_cprofile(self):
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop_cprofile(self, path):
+        # Writes pstats data, readable with python -m pstats or snakeviz
+        self.profile.disable()
+        self.profile.dump_stats(path)
+        self.profile = None
+
+
+profiler = Profiler()
+
+
+class PerformanceOverlay:
+    # FPS, frame time percentiles, move generation cost and engine speed drawn beside the board.
+    # pygame is only imported by the methods that draw.
+    def __init__(self, screen, position=(820, 60), size=(360, 160)):
+        self.screen = screen
+        self.position = position
+        self.size = size
+        self.visible = False
+        self.font = None
+        self.next_update = 0.0
+        self.engine_nps = 0
+
+    def toggle(self):
+        # Returns the rect to push to the display: the overlay, or the area it leaves blank
+        self.visible = not self.visible
+        self.next_update = 0.0
+        if self.visible:
+            profiler.enable()
+            return []
+        profiler.disable()
+        return [self.clear()]
+
+    def clear(self):
+        import pygame as pg
+
+        rect = pg.Rect(self.position, self.size)
+        self.screen.fill((0, 0, 0), rect)
+        return rect
+
+    def draw(self, clock):
+        # Returns the rects to update on the display, at most every OVERLAY_INTERVAL seconds
+        import pygame as pg
+
+        now = time.perf_counter()
+        if not self.visible or now < self.next_update:
+            return []
+        self.next_update = now + OVERLAY_INTERVAL
+
+        if self.font is None:
+            self.font = pg.font.SysFont(None, 26)
+
+        frames = profiler.frame_percentiles()
+        generation_calls = profiler.counters.get("Position.legal_moves", (0, 0.0))[0]
+        lines = [
+            f"FPS {clock.get_fps():.0f}",
+            f"frame p50 {frames['p50']:.1f} / p95 {frames['p95']:.1f} / p99 {frames['p99']:.1f} ms",
+            f"move generation {profiler.mean_ms('Position.legal_moves'):.2f} ms ({generation_calls} calls)",
+            f"check tests {profiler.counters.get('Position.is_in_check', (0, 0.0))[0]}",
+            f"engine {self.engine_nps:,} nodes/s"
+        ]
+
+        rect = self.clear()
+        for index, line in enumerate(lines):
+            text = self.font.render(line, True, (200, 200, 200))
+            self.screen.blit(text, (rect.x + 8, rect.y + 8 + index * 28))
+        return [rect]
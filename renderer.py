@@ -0,0 +1,73 @@
+class BoardRenderer:
+    # Retained-mode drawing for a Board: the empty board is rendered once into a background surface,
+    # and each frame only the squares marked dirty are repainted and pushed to the display.
+    # Dirty tracking works without pygame; it is only imported by the methods that draw.
+    def __init__(self, board):
+        self.board = board
+        self.background = None
+
+        self.dirty = set()
+        self.full_redraw = True
+
+    def mark_dirty(self, file, rank):
+        # A full redraw repaints every square anyway
+        if not self.full_redraw:
+            self.dirty.add((file, rank))
+
+    def mark_all_dirty(self):
+        self.full_redraw = True
+
+    def needs_redraw(self):
+        return self.full_redraw or bool(self.dirty)
+
+    def square_rect(self, file, rank):
+        import pygame as pg
+
+        size = self.board.square_size
+        return pg.Rect(file * size, rank * size + self.board.offset, size, size)
+
+    def build_background(self, screen):
+        import pygame as pg
+
+        self.background = pg.Surface(screen.get_size()).convert()
+        self.background.fill((0, 0, 0))
+        self.board.create_graphical_board(self.background)
+
+    def draw(self):
+        # Returns the rects that changed, ready for pg.display.update
+        import pygame as pg
+
+        board = self.board
+        screen = board.screen
+
+        if self.background is None or self.background.get_size() != screen.get_size():
+            self.build_background(screen)
+            self.full_redraw = True
+
+        if self.full_redraw:
+            screen.blit(self.background, (0, 0))
+            squares = [(file, rank) for file in range(board.dim) for rank in range(board.dim)]
+            rects = [screen.get_rect()]
+        elif self.dirty:
+            squares = self.dirty
+            rects = []
+        else:
+            return []
+
+        for file, rank in squares:
+            rect = self.square_rect(file, rank)
+            if not self.full_redraw:
+                screen.blit(self.background, rect, rect)
+                rects.append(rect)
+
+            # Pieces don't know where they stand; they're drawn at the square being painted
+            piece = board.board[file][rank]
+            if piece != 0 and board.draw_pieces:
+                piece.display_piece(screen, rect.topleft, board.square_size)
+
+            if (file, rank) in board.highlighted:
+                pg.draw.rect(screen, board.highlight_color, rect, 3)
+
+        self.dirty.clear()
+        self.full_redraw = False
+        return rects
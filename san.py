@@ -0,0 +1,122 @@
+import re
+
+from piece import Piece
+from position import SQUARES, TYPE_MASK, PIECE_LETTERS, PROMOTION_LETTERS, parse_square, square_name
+
+# Standard algebraic notation, e.g. e4, Nbd7, exd8=Q+, O-O-O
+SAN = re.compile(r"([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQnbrq]))?$")
+
+SAN_PIECES = {letter.upper(): piece_type for piece_type, letter in PIECE_LETTERS.items() if piece_type != Piece.pawn}
+
+
+def move_to_san(position, move, legal_moves=None):
+    # SAN for a legal move in position. legal_moves can be passed in when the caller already has them.
+    from_sq, to_sq, promotion = move
+    squares = position.squares
+    kind = squares[from_sq] & TYPE_MASK
+
+    if kind == Piece.king and to_sq - from_sq in (2, -2):
+        san = "O-O" if to_sq > from_sq else "O-O-O"
+    elif kind == Piece.pawn:
+        san = ""
+        if from_sq & 7 != to_sq & 7:
+            san = square_name(from_sq)[0] + "x"
+        san += square_name(to_sq)
+        if promotion:
+            san += "=" + PROMOTION_LETTERS[promotion].upper()
+    else:
+        if legal_moves is None:
+            legal_moves = position.legal_moves()
+
+        # Name the from file, rank or whole square only when another piece of the same kind can reach to_sq too
+        rivals = [other for other, other_to, _ in legal_moves
+                  if other_to == to_sq and other != from_sq and squares[other] & TYPE_MASK == kind]
+        from_name = square_name(from_sq)
+        if not rivals:
+            disambiguation = ""
+        elif all(other & 7 != from_sq & 7 for other in rivals):
+            disambiguation = from_name[0]
+        elif all(other >> 4 != from_sq >> 4 for other in rivals):
+            disambiguation = from_name[1]
+        else:
+            disambiguation = from_name
+
+        san = PIECE_LETTERS[kind].upper() + disambiguation
+        if squares[to_sq]:
+            san += "x"
+        san += square_name(to_sq)
+
+    position.make_move(move)
+    if position.is_in_check(position.color_to_move):
+        san += "#" if not position.legal_moves() else "+"
+    position.unmake_move()
+    return san
+
+
+def parse_san(position, san, legal_moves=None):
+    # The legal move in position that san names. Raises ValueError for an illegal or ambiguous move.
+    text = san.rstrip("+#!?")
+    squares = position.squares
+
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        step = 2 if len(text) == 3 else -2
+        if legal_moves is None:
+            legal_moves = candidate_moves(position, Piece.king, None)
+        for move in legal_moves:
+            from_sq, to_sq, _ = move
+            if squares[from_sq] & TYPE_MASK == Piece.king and to_sq - from_sq == step:
+                return move
+        raise ValueError(f"illegal move {san}")
+
+    match = SAN.match(text)
+    if not match:
+        raise ValueError(f"can't read move {san!r}")
+    letter, from_file, from_rank, to_name, promotion_letter = match.groups()
+
+    kind = SAN_PIECES[letter] if letter else Piece.pawn
+    to_sq = parse_square(to_name)
+    promotion = SAN_PIECES[promotion_letter.upper()] if promotion_letter else 0
+    file = ord(from_file) - ord('a') if from_file else None
+    rank = 8 - int(from_rank) if from_rank else None
+    if legal_moves is None:
+        legal_moves = candidate_moves(position, kind, to_sq)
+
+    found = None
+    for move in legal_moves:
+        from_sq, move_to, move_promotion = move
+        if (move_to != to_sq or move_promotion != promotion or squares[from_sq] & TYPE_MASK != kind
+                or (file is not None and from_sq & 7 != file) or (rank is not None and from_sq >> 4 != rank)):
+            continue
+        if found is not None:
+            raise ValueError(f"ambiguous move {san}")
+        found = move
+
+    if found is None:
+        raise ValueError(f"illegal move {san}")
+    return found
+
+
+def candidate_moves(position, kind, to_sq):
+    # Legal moves of the side to move's pieces of one kind (onto to_sq, unless it's None). Checking
+    # legality for only these is much cheaper than generating every legal move.
+    color = position.color_to_move
+    piece = kind | color
+    squares = position.squares
+    moves = []
+    for sq in SQUARES:
+        if squares[sq] == piece:
+            position.piece_moves(sq, moves)
+    if to_sq is not None:
+        moves = [move for move in moves if move[1] == to_sq]
+    return position.filter_legal_moves(moves, color)
+
+
+def moves_to_san(position, moves):
+    # SAN for a line of moves played one after another from position, which is left unchanged
+    names = []
+    for move in moves:
+        names.append(move_to_san(position, move))
+        position.make_move(move)
+    for _ in moves:
+        position.unmake_move()
+    return names
@@ -0,0 +1,299 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from engine import Search
+from piece import Piece
+from position import Position, STARTING_FEN, move_name
+from profiler import percentile
+from uci import parse_move
+
+# Hosts many headless games in one process. Clients connect over TCP or a Unix socket and send one
+# JSON object per line; every request gets one JSON line back, carrying the request's "id" so
+# replies can be matched up when they arrive out of order. Commands:
+#   {"cmd": "new", "fen": ...}                          start a game (fen optional)
+#   {"cmd": "move", "game": 1, "move": "e2e4"}          play a move, long algebraic like UCI
+#   {"cmd": "engine", "game": 1, "depth": 3}            let the engine move (depth, movetime in seconds or nodes)
+#   {"cmd": "state", "game": 1}                         the game as it stands
+#   {"cmd": "metrics"} / {"cmd": "metrics", "game": 1}  request latencies, for the server or one game
+#   {"cmd": "close", "game": 1}                         forget a game
+# new, move, engine and state replies describe the game: game, fen, to_move, last, result, reason,
+# and the legal moves too when the request has "legal": true. Errors come back as {"error": ...}.
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 7878
+
+# Request latencies kept for the percentiles, per game and for the whole server
+GAME_LATENCY_HISTORY = 256
+SERVER_LATENCY_HISTORY = 100000
+
+MAX_LINE = 64 * 1024
+
+# The most a client may ask of one engine move. Every search also stops at MAX_ENGINE_MOVETIME,
+# whatever limit it was given, so no client can tie up an executor process for long.
+MAX_ENGINE_DEPTH = 8
+MAX_ENGINE_MOVETIME = 10.0
+MAX_ENGINE_NODES = 1000000
+ENGINE_LIMITS = {"depth": MAX_ENGINE_DEPTH, "movetime": MAX_ENGINE_MOVETIME, "nodes": MAX_ENGINE_NODES}
+
+# Each executor process keeps one Search, reused for every engine move it is asked for
+_search = None
+
+
+def engine_move(fen, moves, limits):
+    # Runs in an executor process: (move, score, nodes) for the position reached from fen by moves
+    global _search
+    if _search is None:
+        _search = Search()
+    position = Position(fen)
+    for move in moves:
+        position.make_move(move)
+    move, _, score = _search.search(position, **limits)
+    return move, score, _search.nodes
+
+
+def engine_limits(request):
+    # The search limits a request asks for, checked and held to the server's maxima
+    limits = {}
+    for name, maximum in ENGINE_LIMITS.items():
+        if name not in request:
+            continue
+        value = request[name]
+        # depth and nodes are whole numbers, movetime can be a fraction of a second
+        kinds = (int, float) if name == "movetime" else int
+        if isinstance(value, bool) or not isinstance(value, kinds) or not value > 0:
+            raise ValueError(f"{name} should be a positive {'number' if name == 'movetime' else 'whole number'}, "
+                             f"not {value!r}")
+        limits[name] = min(value, maximum)
+    if not limits:
+        limits["depth"] = 2
+    limits.setdefault("movetime", MAX_ENGINE_MOVETIME)
+    return limits
+
+
+def latency_summary(latencies, requests):
+    values = sorted(latencies)
+    return {
+        "requests": requests,
+        "p50_ms": round(percentile(values, 0.5), 3),
+        "p95_ms": round(percentile(values, 0.95), 3),
+        "p99_ms": round(percentile(values, 0.99), 3),
+        "max_ms": round(values[-1], 3) if values else 0.0
+    }
+
+
+class ServerGame:
+    # One game's state. The rules run on a Position, the same compact board Board plays on; the lock
+    # keeps a slow engine move and a client's move from interleaving.
+    def __init__(self, game_id, fen=STARTING_FEN):
+        self.game_id = game_id
+        self.start_fen = fen
+        self.position = Position(fen)
+        self.result = self.position.game_result()
+        self.lock = asyncio.Lock()
+        self.requests = 0
+        self.latencies = deque(maxlen=GAME_LATENCY_HISTORY)
+
+    def play(self, move):
+        self.position.make_move(move)
+        # Usually decided by the first legal move found, so cheap enough to run on the event loop
+        self.result = self.position.game_result()
+
+    def describe(self, legal=False):
+        position = self.position
+        stack = position.undo_stack
+        reply = {
+            "game": self.game_id,
+            "fen": position.to_fen(),
+            "to_move": "w" if position.color_to_move == Piece.white else "b",
+            "last": move_name(stack[-1][0]) if stack else None,
+            "result": self.result[0] if self.result else None,
+            "reason": self.result[1] if self.result else None
+        }
+        if legal:
+            reply["legal"] = [] if self.result else [move_name(move) for move in position.legal_moves()]
+        return reply
+
+    def record(self, milliseconds):
+        self.requests += 1
+        self.latencies.append(milliseconds)
+
+
+class GameServer:
+    def __init__(self, executor):
+        # executor runs the engine searches, so a search never holds up the event loop
+        self.executor = executor
+        self.games = {}
+        self.next_game_id = 1
+        self.connections = 0
+        self.requests = 0
+        self.latencies = deque(maxlen=SERVER_LATENCY_HISTORY)
+        self.commands = {
+            "new": self.new_game,
+            "move": self.play_move,
+            "engine": self.engine_move,
+            "state": self.state,
+            "metrics": self.metrics,
+            "close": self.close_game
+        }
+
+    async def handle_connection(self, reader, writer):
+        # Requests are answered concurrently, so an engine move doesn't hold up the connection's other games
+        self.connections += 1
+        tasks = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    break
+                if not line:
+                    break
+                task = asyncio.create_task(self.respond(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                # Stop reading while the client isn't reading its replies
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            self.connections -= 1
+            writer.close()
+
+    async def respond(self, line, writer):
+        start = time.perf_counter()
+        request = {}
+        game = None
+        try:
+            parsed = json.loads(line)
+            if not isinstance(parsed, dict):
+                raise ValueError("a request should be a JSON object")
+            request = parsed
+            command = self.commands.get(request.get("cmd"))
+            if command is None:
+                raise ValueError(f"unknown command {request.get('cmd')!r}, expected one of {', '.join(self.commands)}")
+            if "game" in request:
+                game = self.games.get(request["game"])
+                if game is None:
+                    raise ValueError(f"no game {request['game']!r}")
+            reply = await command(request, game)
+        except ValueError as error:
+            reply = {"error": str(error)}
+        except Exception as error:
+            reply = {"error": f"{type(error).__name__}: {error}"}
+
+        if "id" in request:
+            reply["id"] = request["id"]
+        if not writer.is_closing():
+            writer.write(json.dumps(reply, separators=(",", ":")).encode() + b"\n")
+
+        milliseconds = (time.perf_counter() - start) * 1000
+        self.requests += 1
+        self.latencies.append(milliseconds)
+        if game is not None:
+            game.record(milliseconds)
+        elif "game" in reply and reply["game"] in self.games:
+            self.games[reply["game"]].record(milliseconds)
+
+    async def new_game(self, request, game):
+        game = ServerGame(self.next_game_id, request.get("fen") or STARTING_FEN)
+        self.games[game.game_id] = game
+        self.next_game_id += 1
+        return game.describe(request.get("legal", False))
+
+    async def play_move(self, request, game):
+        if game is None:
+            raise ValueError("move needs a game")
+        async with game.lock:
+            if game.result:
+                raise ValueError(f"game {game.game_id} is over: {game.result[1]}")
+            game.play(parse_move(game.position, str(request.get("move"))))
+            return game.describe(request.get("legal", False))
+
+    async def engine_move(self, request, game):
+        if game is None:
+            raise ValueError("engine needs a game")
+        limits = engine_limits(request)
+        async with game.lock:
+            if game.result:
+                raise ValueError(f"game {game.game_id} is over: {game.result[1]}")
+            loop = asyncio.get_running_loop()
+            move, score, nodes = await loop.run_in_executor(
+                self.executor, engine_move, game.start_fen, game.position.moves_played(), limits)
+            game.play(move)
+            reply = game.describe(request.get("legal", False))
+            reply["score"] = score
+            reply["nodes"] = nodes
+            return reply
+
+    async def state(self, request, game):
+        if game is None:
+            raise ValueError("state needs a game")
+        reply = game.describe(request.get("legal", False))
+        reply["moves"] = [move_name(move) for move in game.position.moves_played()]
+        return reply
+
+    async def metrics(self, request, game):
+        if game is not None:
+            return dict(latency_summary(game.latencies, game.requests), game=game.game_id)
+        return dict(latency_summary(self.latencies, self.requests), games=len(self.games),
+                    connections=self.connections)
+
+    async def close_game(self, request, game):
+        if game is None:
+            raise ValueError("close needs a game")
+        del self.games[game.game_id]
+        return {"game": game.game_id, "closed": True}
+
+
+async def report_metrics(game_server, interval):
+    while True:
+        await asyncio.sleep(interval)
+        summary = await game_server.metrics({}, None)
+        print(f"{summary['games']} games, {summary['connections']} connections, {summary['requests']} requests,"
+              f" p50 {summary['p50_ms']:.2f} / p99 {summary['p99_ms']:.2f} ms", flush=True)
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None, workers=None, report=0):
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        game_server = GameServer(executor)
+        if unix_path:
+            server = await asyncio.start_unix_server(game_server.handle_connection, unix_path, limit=MAX_LINE)
+            print(f"listening on {unix_path}", flush=True)
+        else:
+            server = await asyncio.start_server(game_server.handle_connection, host, port, limit=MAX_LINE)
+            print(f"listening on {host}:{port}", flush=True)
+
+        if report:
+            asyncio.create_task(report_metrics(game_server, report))
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Host many games over a line based JSON protocol.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=None, help="engine processes (default: one per core)")
+    parser.add_argument("--report", type=float, default=0, help="print server metrics every this many seconds")
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers, args.report))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.unix and os.path.exists(args.unix):
+            os.remove(args.unix)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
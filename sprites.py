@@ -0,0 +1,40 @@
+import pygame as pg
+from piece import PIECE_IMAGES
+
+
+class SpriteCache:
+    # Decodes each image once and keeps it scaled to the current square size,
+    # packed side by side into a single atlas surface
+    def __init__(self, paths):
+        self.paths = paths
+        self.images = None
+        self.size = None
+        self.atlas = None
+        self.sprites = {}
+
+    def load(self):
+        # convert_alpha needs the display mode to be set, so this runs on first use rather than at import
+        self.images = {path: pg.image.load(path).convert_alpha() for path in self.paths}
+
+    def rebuild(self, size):
+        if self.images is None:
+            self.load()
+
+        self.atlas = pg.Surface((size * len(self.paths), size), pg.SRCALPHA).convert_alpha()
+        self.atlas.fill((0, 0, 0, 0))
+        self.sprites = {}
+        for index, path in enumerate(self.paths):
+            area = pg.Rect(index * size, 0, size, size)
+            # BLEND_RGBA_MAX onto the cleared atlas copies the pixels and alpha exactly
+            self.atlas.blit(pg.transform.scale(self.images[path], (size, size)), area, special_flags=pg.BLEND_RGBA_MAX)
+            self.sprites[path] = self.atlas.subsurface(area)
+        self.size = size
+
+    def get(self, path, size):
+        if size != self.size:
+            self.rebuild(size)
+        return self.sprites[path]
+
+
+# Shared by every piece so each image is only read from disk and scaled once
+piece_sprites = SpriteCache(PIECE_IMAGES)
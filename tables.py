@@ -0,0 +1,46 @@
+from piece import Piece
+
+# Per-square lookup tables for the move generators, built once at import. They are indexed by
+# 0x88 square and only list squares on the board, so walking them needs no bounds checks.
+# Off-board indices get empty tuples.
+
+KNIGHT_OFFSETS = (-33, -31, -18, -14, 14, 18, 31, 33)
+KING_OFFSETS = (-17, -16, -15, -1, 1, 15, 16, 17)
+ROOK_DIRECTIONS = (-16, 16, -1, 1)
+BISHOP_DIRECTIONS = (-17, -15, 15, 17)
+QUEEN_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+
+def _targets(sq, offsets):
+    return tuple(sq + offset for offset in offsets if not (sq + offset) & 0x88)
+
+
+def _ray(sq, direction):
+    # Squares from sq outwards in one direction, nearest first
+    ray = []
+    sq += direction
+    while not sq & 0x88:
+        ray.append(sq)
+        sq += direction
+    return tuple(ray)
+
+
+_ON_BOARD = [not sq & 0x88 for sq in range(128)]
+
+# Squares a knight or king on the square can step to
+KNIGHT_TARGETS = [_targets(sq, KNIGHT_OFFSETS) if _ON_BOARD[sq] else () for sq in range(128)]
+KING_TARGETS = [_targets(sq, KING_OFFSETS) if _ON_BOARD[sq] else () for sq in range(128)]
+
+# PAWN_ATTACKS[color][sq]: squares a pawn of color on sq captures on. White moves up the board (towards rank 0).
+PAWN_ATTACKS = {
+    Piece.white: [_targets(sq, (-17, -15)) if _ON_BOARD[sq] else () for sq in range(128)],
+    Piece.black: [_targets(sq, (15, 17)) if _ON_BOARD[sq] else () for sq in range(128)]
+}
+
+# Rays per square with empty rays left out, so sliders near the edge skip dead directions entirely.
+# The queen gets the rook rays followed by the bishop rays.
+ROOK_RAYS = [tuple(ray for ray in (_ray(sq, d) for d in ROOK_DIRECTIONS) if ray) if _ON_BOARD[sq] else ()
+             for sq in range(128)]
+BISHOP_RAYS = [tuple(ray for ray in (_ray(sq, d) for d in BISHOP_DIRECTIONS) if ray) if _ON_BOARD[sq] else ()
+               for sq in range(128)]
+QUEEN_RAYS = [ROOK_RAYS[sq] + BISHOP_RAYS[sq] for sq in range(128)]
@@ -0,0 +1,89 @@
+import pytest
+
+from archive import ArchiveReader, ArchiveWriter, decode_move, encode_move
+from position import Position, STARTING_FEN
+from uci import parse_move
+
+PROMOTION_FEN = "7k/P7/8/8/8/8/8/K7 w - - 0 1"
+
+
+def line(fen, names):
+    position = Position(fen)
+    moves = []
+    for name in names.split():
+        moves.append(parse_move(position, name))
+        position.make_move(moves[-1])
+    return moves
+
+
+GAMES = [
+    (line(STARTING_FEN, "f2f3 e7e5 g2g4 d8h4"), STARTING_FEN, "0-1"),
+    (line(STARTING_FEN, "e2e4 c7c5 g1f3"), STARTING_FEN, "1-0"),
+    (line(PROMOTION_FEN, "a7a8q h8g7 a8b8"), PROMOTION_FEN, "*"),
+    ([], STARTING_FEN, "1/2-1/2"),
+]
+
+
+@pytest.fixture
+def archive(tmp_path):
+    path = str(tmp_path / "games.arc")
+    with ArchiveWriter(path) as writer:
+        for number, (moves, fen, result) in enumerate(GAMES):
+            assert writer.append(moves, fen, result) == number
+    return path
+
+
+def test_moves_round_trip_through_encoding():
+    position = Position("r3k2r/1P4P1/8/8/8/8/1p4p1/R3K2R w KQkq - 0 1")
+    for move in position.legal_moves():
+        assert decode_move(encode_move(move)) == move
+
+
+def test_write_then_read(archive):
+    with ArchiveReader(archive) as reader:
+        assert len(reader) == len(GAMES)
+        for record, (moves, fen, result) in zip(reader, GAMES):
+            assert (record.moves, record.start_fen, record.result) == (moves, fen, result)
+        # Random access
+        assert reader[2].moves == GAMES[2][0]
+        with pytest.raises(IndexError):
+            reader[len(GAMES)]
+
+
+def test_append_to_existing_archive(archive):
+    with ArchiveWriter(archive) as writer:
+        assert writer.append(GAMES[1][0], result="1-0") == len(GAMES)
+    with ArchiveReader(archive) as reader:
+        assert len(reader) == len(GAMES) + 1
+        assert reader[len(GAMES)].moves == GAMES[1][0]
+
+
+def test_replay(archive):
+    with ArchiveReader(archive) as reader:
+        fens = [position.to_fen() for position in reader.replay(1)]
+    assert fens[-1] == "rnbqkbnr/pp1ppppp/8/2p5/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2"
+    assert len(fens) == 3
+
+
+def test_board_has_result_and_last_move(archive):
+    with ArchiveReader(archive) as reader:
+        mated = reader.board(0)
+        assert mated.result == ("0-1", "checkmate")
+        assert mated.checkmate
+        # d8h4, as (from file, from rank, to file, to rank) with rank 0 at the top
+        assert mated.last_move == (3, 0, 7, 4)
+
+        # A result the rules don't explain comes from the record
+        resigned = reader.board(1)
+        assert resigned.result == ("1-0", "recorded")
+        assert resigned.get_pgn().rstrip().endswith("1-0")
+
+        # Part way through, the game isn't over
+        early = reader.board(0, ply=2)
+        assert early.result is None
+        assert early.last_move == (4, 1, 4, 3)
+        assert early.get_fen() == "rnbqkbnr/pppp1ppp/8/4p3/8/5P2/PPPPP1PP/RNBQKBNR w KQkq e6 0 2"
+
+        unfinished = reader.board(2)
+        assert unfinished.result is None
+        assert unfinished.get_fen() == "1Q6/6k1/8/8/8/8/8/K7 b - - 2 2"
@@ -0,0 +1,26 @@
+import pytest
+
+from batch import analyze, analyze_stream
+from perft import REFERENCE_POSITIONS
+from position import Position, STARTING_FEN
+
+
+def test_analyze():
+    result = analyze(Position(None), "rnbqkbnr/pppp1ppp/8/4p3/6P1/5P2/PPPPP2P/RNBQKBNR b KQkq - 0 2")
+    assert (result["legal_moves"], result["in_check"], result["checkmate"]) == (30, False, False)
+    result = analyze(Position(None), "k7/8/1Q6/8/8/8/8/7K b - - 0 1")
+    assert result["stalemate"] and not result["checkmate"]
+
+
+@pytest.mark.parametrize("line", ["not a fen", "kk6/8/8/8/8/8/8/KK6 w - - 0 1", "4k3/8/8/8/8/8/8/p3K3 b - - 0 1"])
+def test_analyze_reports_bad_lines(line):
+    result = analyze(Position(None), line)
+    assert result["fen"] == line
+    assert result["error"]
+
+
+def test_analyze_stream_keeps_order_past_bad_lines():
+    lines = [STARTING_FEN, "4k3/8/8/8/8/8/8/p3K3 b - - 0 1", "# a comment", "", REFERENCE_POSITIONS[1][1]]
+    results = list(analyze_stream(lines, workers=1, chunk_size=2))
+    assert [result.get("legal_moves") for result in results] == [20, None, 48]
+    assert "error" in results[1]
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from batch_eval import TERMS, evaluate_fens, pack_fens, pack_positions
+from evaluate import evaluate
+from perft import REFERENCE_POSITIONS
+from position import Position, STARTING_FEN
+
+FENS = [STARTING_FEN] + [fen for _, fen, _ in REFERENCE_POSITIONS]
+
+
+def test_batch_score_matches_evaluate():
+    scores = evaluate_fens(FENS)[:, TERMS.index("score")]
+    assert scores.tolist() == [evaluate(Position(fen)) for fen in FENS]
+
+
+def test_batch_score_matches_evaluate_after_every_move():
+    position = Position(REFERENCE_POSITIONS[1][1])
+    fens = []
+    for move in position.legal_moves():
+        position.make_move(move)
+        fens.append(position.to_fen())
+        position.unmake_move()
+    scores = evaluate_fens(fens)[:, TERMS.index("score")]
+    assert scores.tolist() == [evaluate(Position(fen)) for fen in fens]
+
+
+def test_start_position_terms_are_level():
+    assert evaluate_fens([STARTING_FEN]).tolist() == [[0, 0, 0, 0]]
+
+
+def test_pack_fens_matches_pack_positions():
+    boards, white_to_move = pack_fens(FENS)
+    expected_boards, expected_white = pack_positions([Position(fen) for fen in FENS])
+    assert np.array_equal(boards, expected_boards)
+    assert np.array_equal(white_to_move, expected_white)
+
+
+@pytest.mark.parametrize("fens", [["8/8/8 w - -"], [STARTING_FEN, "rnbqkbnr/ppppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w"],
+                                  ["rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR"],
+                                  # 64 squares, but ranks of 9 and 7 (or 12 and 4)
+                                  [STARTING_FEN, "ppppppppp/7/8/8/8/8/8/8 w - - 0 1"],
+                                  ["pppp4pppp/4/8/8/8/8/8/8 w - - 0 1", STARTING_FEN],
+                                  ["8/8/8/8/8/8/8/8/ w - - 0 1"]])
+def test_pack_fens_rejects_bad_placements(fens):
+    with pytest.raises(ValueError):
+        pack_fens(fens)
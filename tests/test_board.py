@@ -0,0 +1,29 @@
+from board import Board
+from position import STARTING_FEN
+
+
+def test_unmake_move_restores_last_move():
+    board = Board()
+    board.load_fen(STARTING_FEN)
+    # e2e4 then e7e5, as (file, rank) with rank 0 at the top
+    board.play_move((4, 6), (4, 4))
+    board.play_move((4, 1), (4, 3))
+    assert board.last_move == (4, 1, 4, 3)
+
+    board.unmake_move()
+    assert board.last_move == (4, 6, 4, 4)
+    assert board.get_fen() == "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1"
+    board.unmake_move()
+    assert board.last_move is None
+    assert board.get_fen() == STARTING_FEN
+
+
+def test_unmake_move_reopens_a_finished_game():
+    board = Board()
+    board.load_fen(STARTING_FEN)
+    for from_pos, to_pos in (((5, 6), (5, 5)), ((4, 1), (4, 3)), ((6, 6), (6, 4)), ((3, 0), (7, 4))):
+        board.play_move(from_pos, to_pos)
+    assert board.result == ("0-1", "checkmate")
+    board.unmake_move()
+    assert board.result is None and not board.checkmate
+    assert board.last_move == (6, 6, 6, 4)
@@ -0,0 +1,50 @@
+import pytest
+
+from book import OpeningBook, decode_move, encode_move, polyglot_key, write_book
+from position import Position
+from uci import parse_move
+
+# The reference keys published with the Polyglot book format
+REFERENCE_KEYS = [
+    ("", 0x463b96181691fc9c),
+    ("e2e4", 0x823c9b50fd114196),
+    ("e2e4 d7d5", 0x0756b94461c50fb0),
+    ("e2e4 d7d5 e4e5", 0x662fafb965db29d4),
+    ("e2e4 d7d5 e4e5 f7f5", 0x22a48b5a8e47ff78),
+    ("e2e4 d7d5 e4e5 f7f5 e1e2", 0x652a607ca3f242c1),
+    ("e2e4 d7d5 e4e5 f7f5 e1e2 e8f7", 0x00fdd303c946bdd9),
+    ("a2a4 b7b5 h2h4 b5b4 c2c4", 0x3c8123ea7b067637),
+    ("a2a4 b7b5 h2h4 b5b4 c2c4 b4c3 a1a3", 0x5c3f9b829b279560),
+]
+
+
+@pytest.mark.parametrize("moves, key", REFERENCE_KEYS)
+def test_polyglot_reference_keys(moves, key):
+    position = Position()
+    for name in moves.split():
+        position.make_move(parse_move(position, name))
+    assert polyglot_key(position) == key
+
+
+def test_castling_moves_round_trip_through_polyglot_encoding():
+    position = Position("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1")
+    for move in position.legal_moves():
+        assert decode_move(position, encode_move(position, move)) == move
+
+
+def test_book_returns_only_legal_moves(tmp_path):
+    position = Position()
+    e4 = parse_move(position, "e2e4")
+    d4 = parse_move(position, "d2d4")
+    key = polyglot_key(position)
+    path = str(tmp_path / "book.bin")
+    # The last entry is a move that isn't legal here (e2e5) and has to be left out
+    write_book(path, [(key, encode_move(position, e4), 3, 0), (key, encode_move(position, d4), 1, 0),
+                      (key, encode_move(position, (0x64, 0x34, 0)), 9, 0), (key ^ 1, encode_move(position, d4), 5, 0)])
+
+    with OpeningBook(path) as book:
+        assert len(book) == 4
+        assert sorted(book.entries(position)) == sorted([(e4, 3, 0), (d4, 1, 0)])
+        assert book.pick(position, best=True) == e4
+        position.make_move(e4)
+        assert book.pick(position) is None
@@ -0,0 +1,65 @@
+import pytest
+
+from endgame import DRAW, LOSS, TABLE_SIZES, WIN, EndgameTables, decode, generate_table
+from position import Position
+
+
+@pytest.fixture(scope="module")
+def tables(tmp_path_factory):
+    # Only KQK: it is the quickest table to build, and the others come from the same code
+    directory = tmp_path_factory.mktemp("endgames")
+    values = generate_table("kqk", {})
+    (directory / "kqk.bin").write_bytes(values)
+    tables = EndgameTables(str(directory))
+    yield values, tables
+    tables.close()
+
+
+def test_decode():
+    assert decode(0) == (DRAW, 0)
+    assert decode(1) == (LOSS, 0)
+    assert decode(2) == (WIN, 1)
+    assert decode(11) == (LOSS, 10)
+
+
+def test_kqk_longest_mate(tables):
+    values, _ = tables
+    assert len(values) == TABLE_SIZES["kqk"]
+    # King and queen mate a lone king in at most ten moves: with the lone king to move, 20 plies
+    assert max(values) - 1 == 20
+
+
+def test_probe(tables):
+    _, endgames = tables
+    assert endgames.probe(Position("8/8/8/8/8/1K6/7Q/k7 w - - 0 1")) == (WIN, 1)
+    assert endgames.probe(Position("8/8/8/8/8/1K6/1Q6/k7 b - - 0 1")) == (LOSS, 0)
+    # Stalemated, or the queen simply taken
+    assert endgames.probe(Position("k7/8/1Q6/8/8/8/8/7K b - - 0 1")) == (DRAW, 0)
+    assert endgames.probe(Position("8/8/8/8/8/8/1Q6/k6K b - - 0 1")) == (DRAW, 0)
+    # The colors swapped
+    assert endgames.probe(Position("K7/7q/1k6/8/8/8/8/8 b - - 0 1")) == (WIN, 1)
+    # Bare kings, and material with no table loaded
+    assert endgames.probe(Position("8/8/8/4k3/8/8/8/4K3 w - - 0 1")) == (DRAW, 0)
+    assert endgames.probe(Position("8/8/8/4k3/8/8/8/R3K3 w - - 0 1")) is None
+
+
+def test_best_move_mates(tables):
+    _, endgames = tables
+    position = Position("8/8/8/8/8/1K6/7Q/k7 w - - 0 1")
+    move, result, plies = endgames.best_move(position)
+    assert (result, plies) == (WIN, 1)
+    position.make_move(move)
+    assert position.game_result() == ("1-0", "checkmate")
+
+
+def test_best_move_keeps_winning(tables):
+    _, endgames = tables
+    position = Position("8/8/8/4k3/8/8/8/3QK3 w - - 0 1")
+    result, plies = endgames.probe(position)
+    assert result == WIN
+    while position.game_result() is None:
+        move, _, _ = endgames.best_move(position)
+        position.make_move(move)
+        plies -= 1
+    assert plies == 0
+    assert position.game_result() == ("1-0", "checkmate")
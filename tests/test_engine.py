@@ -0,0 +1,54 @@
+import threading
+
+from engine import EngineWorker, Search
+from position import Position, STARTING_FEN
+
+MATE_IN_ONE = "6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1"
+
+
+def test_search_finds_mate_in_one():
+    search = Search(1)
+    position = Position(MATE_IN_ONE)
+    move, _, _ = search.search(position, depth=3)
+    assert move == (0x70, 0x00, 0)
+    # The search leaves the position as it found it
+    assert position.to_fen() == MATE_IN_ONE
+
+
+def test_worker_searches_off_the_calling_thread():
+    done = threading.Event()
+    found = []
+
+    def on_bestmove(search_id, move, ponder_move, score):
+        found.append((search_id, move))
+        done.set()
+
+    worker = EngineWorker(on_bestmove, tt_size_mb=1)
+    try:
+        search_id = worker.start(MATE_IN_ONE, depth=2)
+        assert done.wait(10)
+        assert found == [(search_id, (0x70, 0x00, 0))]
+        assert not worker.is_searching()
+    finally:
+        worker.close()
+
+
+
+def test_worker_survives_a_bad_request():
+    done = threading.Event()
+    found = []
+
+    def on_bestmove(search_id, move, ponder_move, score):
+        found.append(move)
+        done.set()
+
+    worker = EngineWorker(on_bestmove, tt_size_mb=1)
+    try:
+        worker.start("not a fen", depth=1)
+        assert done.wait(10)
+        done.clear()
+        worker.start(STARTING_FEN, depth=1)
+        assert done.wait(10)
+        assert found[0] is None and found[1] is not None
+    finally:
+        worker.close()
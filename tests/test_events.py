@@ -0,0 +1,94 @@
+import json
+
+from board import Board
+from events import Capture, Check, Checkmate, EventBus, GameEnded, InvalidMove, JsonlEventLog, MoveMade, Promotion
+from position import STARTING_FEN
+
+
+def board_at(fen=STARTING_FEN):
+    board = Board()
+    board.load_fen(fen)
+    return board
+
+
+def play(board, *moves):
+    # Moves as ((file, rank), (file, rank)) with rank 0 at the top, like the board's own squares
+    for from_pos, to_pos, *promotion in moves:
+        board.play_move(from_pos, to_pos, *promotion)
+
+
+def test_bus_delivers_by_kind():
+    bus = EventBus()
+    moves, everything = [], []
+    bus.subscribe(moves.append, MoveMade)
+    bus.subscribe(everything.append)
+    assert bus.wants(Check)
+    board = board_at()
+    board.events = bus
+    play(board, ((4, 6), (4, 4)))
+    assert [event.kind for event in moves] == ["move"]
+    assert [event.kind for event in everything] == ["move", "turn"]
+
+    bus.unsubscribe(everything.append)
+    assert not bus.wants(Check)
+    bus.unsubscribe(moves.append)
+    assert bus.subscribers == {}
+
+
+def test_move_event_fields():
+    board = board_at()
+    events = []
+    board.events.subscribe(events.append, MoveMade)
+    play(board, ((6, 7), (5, 5)))
+    data = events[0].to_dict()
+    assert (data["move"], data["piece"], data["color"], data["captured"]) == ("g1f3", "N", "white", None)
+    assert data["fen"] == board.get_fen()
+    assert data["key"] == f"{board.position.key:016x}"
+
+
+def test_en_passant_capture():
+    board = board_at("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1")
+    events = []
+    board.events.subscribe(events.append, Capture)
+    play(board, ((4, 3), (3, 2)))
+    assert (events[0].piece, events[0].captured, events[0].square) == ("P", "p", "d5")
+
+
+def test_promotion_and_check():
+    board = board_at("7k/P7/8/8/8/8/8/K7 w - - 0 1")
+    events = []
+    board.events.subscribe(events.append, Promotion, Check)
+    play(board, ((0, 1), (0, 0), 5))
+    assert [type(event) for event in events] == [Promotion, Check]
+    assert events[0].promotion == "Q"
+    assert events[1].color == "black"
+
+
+def test_checkmate_ends_the_game():
+    board = board_at()
+    events = []
+    board.events.subscribe(events.append, Checkmate, GameEnded)
+    play(board, ((5, 6), (5, 5)), ((4, 1), (4, 3)), ((6, 6), (6, 4)), ((3, 0), (7, 4)))
+    assert [(event.kind, event.result) for event in events] == [("checkmate", "0-1"), ("game_end", "0-1")]
+    assert events[0].winner == "black"
+    assert events[1].reason == "checkmate"
+
+
+def test_invalid_click():
+    board = board_at()
+    events = []
+    board.events.subscribe(events.append, InvalidMove)
+    # A black pawn, with white to move
+    board.handle_click(board.square_size // 2, board.offset + board.square_size + board.square_size // 2)
+    assert (events[0].reason, events[0].square) == (InvalidMove.WRONG_TURN, "a7")
+
+
+def test_jsonl_event_log(tmp_path):
+    path = tmp_path / "events.jsonl"
+    board = board_at()
+    with JsonlEventLog(str(path), flush_interval=60) as log:
+        board.events.subscribe(log)
+        play(board, ((4, 6), (4, 4)), ((4, 1), (4, 3)))
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [record["event"] for record in records] == ["move", "turn", "move", "turn"]
+    assert records[2]["move"] == "e7e5"
@@ -0,0 +1,25 @@
+import pytest
+
+from perft import REFERENCE_POSITIONS, divide, perft
+from position import Position, STARTING_FEN
+
+# Counts above this take too long for a quick run; perft.py --suite checks the deep ones
+MAX_TEST_NODES = 10000
+
+
+@pytest.mark.parametrize("name, fen, counts", REFERENCE_POSITIONS, ids=[entry[0] for entry in REFERENCE_POSITIONS])
+def test_perft_reference_counts(name, fen, counts):
+    position = Position(fen)
+    for depth, expected in enumerate(counts, 1):
+        if expected > MAX_TEST_NODES and depth > 1:
+            break
+        assert perft(position, depth) == expected, f"{name} depth {depth}"
+    # perft leaves the position as it found it
+    assert position.to_fen() == fen
+
+
+def test_divide_adds_up_to_perft():
+    results = divide(Position(STARTING_FEN), 3)
+    assert len(results) == 20
+    assert dict(results)["e2e4"] == 600
+    assert sum(nodes for _, nodes in results) == 8902
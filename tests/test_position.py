@@ -0,0 +1,104 @@
+import pytest
+
+from epd import format_epd, parse_epd, read_epd
+from perft import REFERENCE_POSITIONS
+from position import Position, STARTING_FEN
+from uci import parse_move
+
+
+def play(position, names):
+    for name in names.split():
+        position.make_move(parse_move(position, name))
+    return position
+
+
+@pytest.mark.parametrize("fen", [STARTING_FEN] + [fen for _, fen, _ in REFERENCE_POSITIONS])
+def test_fen_round_trip(fen):
+    assert Position(fen).to_fen() == fen
+
+
+def test_fen_defaults_missing_fields():
+    assert Position("8/8/8/8/8/8/8/K1k5").to_fen() == "8/8/8/8/8/8/8/K1k5 w - - 0 1"
+
+
+def test_castling_rights_need_king_and_rook_at_home():
+    assert Position("4k3/8/8/8/8/8/8/4K3 w KQkq - 0 1").to_fen() == "4k3/8/8/8/8/8/8/4K3 w - - 0 1"
+
+
+@pytest.mark.parametrize("fen", [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w KQkq - 0 1",
+    "rnbqkbnr/pppppppp/9/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x KQkq - 0 1",
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkx - 0 1",
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq e5 0 1",
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - x 1",
+    "8/8/8/8/8/8/8/8 w - - 0 1",
+    "kk6/8/8/8/8/8/8/KK6 w - - 0 1",
+    "4k3/8/8/8/8/8/8/8 w - - 0 1",
+    "4k3/8/8/8/8/8/8/p3K3 b - - 0 1",
+    "P3k3/8/8/8/8/8/8/4K3 w - - 0 1",
+    # En passant squares that no two square pawn move could have left
+    "4k3/8/8/8/3pN3/8/8/4K3 b - e3 0 1",
+    "4k3/8/8/8/8/8/3PP3/4K3 w - e3 0 1",
+    "4k3/8/8/3pP3/8/8/8/4K3 b - d6 0 1",
+    "4k3/8/8/8/4Pp2/8/4P3/4K3 b - e3 0 1",
+    # The side that just moved left its king in check
+    "4k3/8/8/8/8/8/8/4R1K1 w - - 0 1",
+])
+def test_bad_fens_are_rejected(fen):
+    with pytest.raises(ValueError):
+        Position(fen)
+
+
+@pytest.mark.parametrize("fen", ["4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1", "4k3/8/8/8/4Pp2/8/8/4K3 b - e3 0 1"])
+def test_en_passant_square_after_a_two_square_move(fen):
+    position = Position(fen)
+    assert position.to_fen() == fen
+    captures = [move for move in position.legal_moves() if move[1] == position.en_passant]
+    assert len(captures) == 1
+    position.make_move(captures[0])
+    position.unmake_move()
+    assert position.to_fen() == fen
+
+
+def test_epd_round_trip(tmp_path):
+    line = 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - bm Qxh3; id "kiwi; pete"; hmvc 3; fmvn 9;'
+    fen, operations = parse_epd(line)
+    assert fen == "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 3 9"
+    assert operations["bm"] == ["Qxh3"] and operations["id"] == ["kiwi; pete"]
+    assert format_epd(Position(fen), {"bm": ["Qxh3"], "id": ["kiwi; pete"]}) == line
+
+    path = tmp_path / "positions.epd"
+    path.write_text(f"# a comment\n\n{line}\n{STARTING_FEN}\n")
+    assert [fen for fen, _ in read_epd(str(path))] == [fen, STARTING_FEN]
+
+
+def test_checkmate():
+    position = play(Position(), "f2f3 e7e5 g2g4 d8h4")
+    assert position.is_checkmate(position.color_to_move)
+    assert position.game_result() == ("0-1", "checkmate")
+
+
+def test_stalemate():
+    position = Position("k7/8/1Q6/8/8/8/8/7K b - - 0 1")
+    assert position.is_stalemate(position.color_to_move)
+    assert position.game_result() == ("1/2-1/2", "stalemate")
+
+
+def test_repetition():
+    position = play(Position(), "g1f3 g8f6 f3g1 f6g8 g1f3 g8f6 f3g1")
+    assert position.game_result() is None
+    play(position, "f6g8")
+    assert position.game_result() == ("1/2-1/2", "repetition")
+
+
+def test_fifty_moves():
+    position = Position("4k3/8/8/8/8/8/8/R3K3 w - - 99 80")
+    assert position.game_result() is None
+    play(position, "a1a2")
+    assert position.game_result() == ("1/2-1/2", "fifty moves")
+
+
+def test_insufficient_material():
+    assert Position("4k3/8/8/8/8/8/8/2B1K3 w - - 0 1").game_result() == ("1/2-1/2", "insufficient material")
+    assert Position("4k3/8/8/8/8/8/8/2R1K3 w - - 0 1").game_result() is None
@@ -0,0 +1,100 @@
+import io
+
+import pytest
+
+from pgn import format_game, game_from_moves, read_games, validate_games, write_pgn
+from position import Position, STARTING_FEN
+from san import move_to_san, moves_to_san, parse_san
+from uci import parse_move
+
+RUY_LOPEZ = """[Event "Test"]
+[Site "?"]
+[Date "2024.01.01"]
+[Round "1"]
+[White "A"]
+[Black "B"]
+[Result "1/2-1/2"]
+
+{Breyer} 1. e4 e5 2. Nf3 Nc6 3. Bb5 a6 4. Ba4 Nf6 5. O-O Be7 (5... b5 6. Bb3 Bc5)
+6. Re1 b5 7. Bb3 d6 $1 8. c3 O-O {both castled} 9. h3 Nb8 10. d4 Nbd7 1/2-1/2
+"""
+
+
+@pytest.mark.parametrize("fen, move, san", [
+    (STARTING_FEN, "e2e4", "e4"),
+    (STARTING_FEN, "g1f3", "Nf3"),
+    ("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", "e1g1", "O-O"),
+    ("r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1", "e8c8", "O-O-O"),
+    ("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1", "e5d6", "exd6"),
+    ("7k/P7/8/8/8/8/8/K7 w - - 0 1", "a7a8q", "a8=Q+"),
+    ("7k/P7/8/8/8/8/8/K7 w - - 0 1", "a7a8n", "a8=N"),
+    ("rnbqkbnr/pppp1ppp/8/4p3/6P1/5P2/PPPPP2P/RNBQKBNR b KQkq - 0 2", "d8h4", "Qh4#"),
+    # Knights on b1 and f3 can both reach d2: the file tells them apart
+    ("4k3/8/8/8/8/5N2/8/1N2K3 w - - 0 1", "b1d2", "Nbd2"),
+    # Rooks on a1 and a5 share the file: the rank tells them apart
+    ("4k3/8/8/R7/8/8/8/R3K3 w - - 0 1", "a1a3", "R1a3"),
+])
+def test_san_round_trip(fen, move, san):
+    position = Position(fen)
+    legal = parse_move(position, move)
+    assert move_to_san(position, legal) == san
+    assert parse_san(position, san) == legal
+
+
+def test_parse_san_accepts_annotations():
+    position = Position()
+    assert parse_san(position, "e4!?") == parse_move(position, "e2e4")
+
+
+@pytest.mark.parametrize("san", ["e5", "Nf4", "O-O", "exd5", "Qz9"])
+def test_parse_san_rejects_illegal_moves(san):
+    with pytest.raises(ValueError):
+        parse_san(Position(), san)
+
+
+def test_moves_to_san_leaves_position_unchanged():
+    position = Position()
+    moves = []
+    for name in "e2e4 e7e5 g1f3 b8c6".split():
+        moves.append(parse_move(position, name))
+        position.make_move(moves[-1])
+    start = Position()
+    assert moves_to_san(start, moves) == ["e4", "e5", "Nf3", "Nc6"]
+    assert start.to_fen() == STARTING_FEN
+
+
+def test_pgn_parse_and_write_round_trip():
+    game = next(read_games(io.StringIO(RUY_LOPEZ)))
+    assert game.headers["White"] == "A"
+    assert game.result == "1/2-1/2"
+    assert game.comment == "Breyer"
+    assert [move.san for move in game.moves][-2:] == ["d4", "Nbd7"]
+    assert len(list(game.mainline())) == 20
+
+    text = format_game(game)
+    again = next(read_games(io.StringIO(text)))
+    assert format_game(again) == text
+    assert list(again.mainline()) == list(game.mainline())
+    assert [move.san for move in again.moves[9].variations[0]] == ["b5", "Bb3", "Bc5"]
+    assert again.moves[13].nags == [1]
+    assert again.moves[15].comment == "both castled"
+
+
+def test_game_from_moves_writes_setup_headers():
+    fen = "4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1"
+    position = Position(fen)
+    game = game_from_moves([parse_move(position, "e5d6")], fen, result="*")
+    text = format_game(game)
+    assert '[FEN "4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1"]' in text
+    assert "1. exd6 *" in text
+    assert list(next(read_games(io.StringIO(text))).mainline()) == [parse_move(Position(fen), "e5d6")]
+
+
+def test_validate_games_reports_illegal_moves():
+    errors = []
+    output = io.StringIO()
+    write_pgn([next(read_games(io.StringIO(RUY_LOPEZ)))], output)
+    text = output.getvalue() + "\n" + RUY_LOPEZ.replace("Nbd7", "Nbd6")
+    games, invalid, _ = validate_games(io.StringIO(text), on_error=lambda *error: errors.append(error))
+    assert (games, invalid) == (2, 1)
+    assert errors[0][3] == "Nbd6"
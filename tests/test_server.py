@@ -0,0 +1,72 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from server import MAX_ENGINE_DEPTH, MAX_ENGINE_MOVETIME, MAX_ENGINE_NODES, GameServer, engine_limits
+
+
+class Replies:
+    # Stands in for a connection's StreamWriter
+    def __init__(self):
+        self.lines = []
+
+    def is_closing(self):
+        return False
+
+    def write(self, data):
+        self.lines.append(json.loads(data))
+
+
+def exchange(requests):
+    # The reply to each request, sent one after another to a fresh server
+    async def run():
+        with ThreadPoolExecutor(1) as executor:
+            server = GameServer(executor)
+            replies = Replies()
+            for request in requests:
+                await server.respond(json.dumps(request).encode(), replies)
+            return replies.lines
+    return asyncio.run(run())
+
+
+def test_engine_limits_are_capped():
+    assert engine_limits({}) == {"depth": 2, "movetime": MAX_ENGINE_MOVETIME}
+    assert engine_limits({"depth": 3, "movetime": 0.5}) == {"depth": 3, "movetime": 0.5}
+    assert engine_limits({"depth": 10 ** 6, "nodes": 10 ** 12, "movetime": 10 ** 6}) == {
+        "depth": MAX_ENGINE_DEPTH, "nodes": MAX_ENGINE_NODES, "movetime": MAX_ENGINE_MOVETIME}
+
+
+@pytest.mark.parametrize("request_limits", [{"depth": "3"}, {"depth": 0}, {"depth": 2.5}, {"depth": True},
+                                            {"nodes": -1}, {"movetime": None}, {"movetime": float("nan")}])
+def test_bad_engine_limits_are_refused(request_limits):
+    with pytest.raises(ValueError):
+        engine_limits(request_limits)
+
+
+def test_game_over_the_protocol():
+    replies = exchange([
+        {"cmd": "new", "id": "a", "legal": True},
+        {"cmd": "move", "game": 1, "move": "f2f3"},
+        {"cmd": "engine", "game": 1, "depth": "deep", "id": 7},
+        {"cmd": "engine", "game": 1, "depth": 1},
+        {"cmd": "state", "game": 1},
+        {"cmd": "move", "game": 1, "move": "e2e5"},
+        {"cmd": "new", "fen": "kk6/8/8/8/8/8/8/KK6 w - - 0 1"},
+        {"cmd": "metrics", "game": 1},
+        {"cmd": "close", "game": 1},
+        {"cmd": "state", "game": 1},
+        [1, 2],
+    ])
+    new, move, bad_engine, engine, state, bad_move, bad_new, metrics, closed, gone, not_an_object = replies
+    assert new["id"] == "a" and len(new["legal"]) == 20
+    assert move["last"] == "f2f3" and move["to_move"] == "b"
+    assert bad_engine["id"] == 7 and "depth" in bad_engine["error"]
+    assert engine["to_move"] == "w" and "nodes" in engine
+    assert state["moves"] == ["f2f3", engine["last"]]
+    assert "illegal move" in bad_move["error"]
+    assert "king" in bad_new["error"]
+    assert metrics["game"] == 1 and metrics["requests"] == 6
+    assert closed == {"game": 1, "closed": True}
+    assert "error" in gone and "error" in not_an_object
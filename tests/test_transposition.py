@@ -0,0 +1,73 @@
+from perft import REFERENCE_POSITIONS
+from position import Position
+from transposition import EXACT, LOWER_BOUND, UPPER_BOUND, TranspositionTable, pack_move, unpack_move
+from uci import parse_move
+
+
+def test_moves_round_trip_through_packing():
+    assert unpack_move(pack_move(None)) is None
+    position = Position("r3k2r/1P4P1/8/8/8/8/1p4p1/R3K2R w KQkq - 0 1")
+    for move in position.legal_moves():
+        assert unpack_move(pack_move(move)) == move
+
+
+def test_size_is_a_power_of_two_within_budget():
+    table = TranspositionTable(1)
+    assert table.size & table.mask == 0
+    assert table.memory_bytes() <= 1024 * 1024 < 2 * table.memory_bytes()
+
+
+def test_store_and_probe():
+    table = TranspositionTable(1)
+    move = (0x64, 0x44, 0)
+    table.store(0x1234, 5, -250, UPPER_BOUND, move)
+    assert table.probe(0x1234) == (5, -250, UPPER_BOUND, move)
+    # Same slot, different key
+    assert table.probe(0x1234 + table.size) is None
+    assert table.probe(0x4321) is None
+
+
+def test_deeper_entries_survive_within_a_search():
+    table = TranspositionTable(1)
+    other = 0x77 + table.size
+    table.store(0x77, 6, 10, EXACT)
+    table.store(other, 2, 20, LOWER_BOUND)
+    assert table.probe(0x77) == (6, 10, EXACT, None)
+    assert table.probe(other) is None
+
+    # The same position is always updated, and a new search may replace anything
+    table.store(0x77, 1, 30, EXACT)
+    assert table.probe(0x77)[:2] == (1, 30)
+    table.store(0x77, 6, 10, EXACT)
+    table.new_search()
+    table.store(other, 2, 20, LOWER_BOUND)
+    assert table.probe(other) == (2, 20, LOWER_BOUND, None)
+    assert table.probe(0x77) is None
+
+
+def test_clear_and_hashfull():
+    table = TranspositionTable(1)
+    for key in range(500):
+        table.store(key, 1, 0, EXACT)
+    assert table.hashfull() == 500
+    table.clear()
+    assert table.hashfull() == 0
+    assert table.probe(1) is None
+
+
+def test_unmake_restores_position_and_key():
+    position = Position(REFERENCE_POSITIONS[1][1])
+    fen, key = position.to_fen(), position.key
+    for move in position.legal_moves():
+        position.make_move(move)
+        assert position.key == position.compute_key()
+        position.unmake_move()
+        assert position.to_fen() == fen
+        assert position.key == key
+
+
+def test_incremental_key_matches_fresh_position():
+    position = Position()
+    for name in "e2e4 c7c5 e4e5 d7d5 e5d6 b8c6 g1f3 g8f6 f1e2 e7e6 e1g1".split():
+        position.make_move(parse_move(position, name))
+    assert position.key == Position(position.to_fen()).key
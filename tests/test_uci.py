@@ -0,0 +1,64 @@
+import io
+import time
+
+import pytest
+
+from uci import UciEngine, format_score, parse_int
+
+
+def engine_output(commands, wait_for=None, timeout=10.0):
+    # Runs commands through an engine and returns what it printed. With wait_for, waits for a line
+    # starting with it before quitting, for answers that come from the search thread.
+    output = io.StringIO()
+    engine = UciEngine(io.StringIO(), output)
+    try:
+        for command in commands:
+            assert engine.handle(command.split())
+        deadline = time.perf_counter() + timeout
+        while wait_for and not any(line.startswith(wait_for) for line in output.getvalue().splitlines()):
+            assert time.perf_counter() < deadline, f"no {wait_for} in {output.getvalue()!r}"
+            time.sleep(0.01)
+    finally:
+        engine.close()
+    return output.getvalue().splitlines()
+
+
+def test_format_score():
+    assert format_score(35) == "cp 35"
+    assert format_score(100000 - 1) == "mate 1"
+    assert format_score(-(100000 - 2)) == "mate -1"
+
+
+def test_parse_int():
+    assert parse_int("12") == 12
+    assert parse_int("x") is None
+    assert parse_int(None) is None
+
+
+def test_handshake():
+    lines = engine_output(["uci", "isready"])
+    assert lines[-2:] == ["uciok", "readyok"]
+
+
+def test_position_and_perft():
+    lines = engine_output(["position startpos moves e2e4 e7e5", "d", "perft 2"])
+    assert lines[0] == "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq e6 0 2"
+    assert lines[-1] == "Nodes searched: 835"
+
+
+def test_go_depth_gives_bestmove():
+    lines = engine_output(["position fen 6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1", "go depth 2"], wait_for="bestmove")
+    assert [line for line in lines if line.startswith("bestmove")][0].split()[1] == "a1a8"
+
+
+@pytest.mark.parametrize("command", [
+    "go depth x", "go movetime -5", "go wtime soon", "perft x", "perft 0",
+    "setoption name Hash value big", "setoption name Book value /nonexistent/book.bin",
+    "position fen kk6/8/8/8/8/8/8/KK6 w - - 0 1", "position fen 4k3/8/8/8/8/8/8/p3K3 b - - 0 1",
+    "position fen garbage", "position startpos moves e2e5",
+])
+def test_bad_input_is_reported_and_survived(command):
+    # The engine says what was wrong, keeps its position and still searches afterwards
+    lines = engine_output(["position startpos moves e2e4", command, "d", "go depth 1"], wait_for="bestmove")
+    assert any(line.startswith("info string") for line in lines)
+    assert "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1" in lines
@@ -0,0 +1,80 @@
+from array import array
+
+EXACT = 1
+LOWER_BOUND = 2
+UPPER_BOUND = 3
+
+# Each entry is two 64-bit words: the full Zobrist key, and the packed data
+#   bits 0-16   move (from square, to square, promotion piece type)
+#   bits 17-24  depth
+#   bits 25-26  bound flag (0 means the slot is empty)
+#   bits 27-58  score, offset to make it unsigned
+#   bits 59-63  search generation, so entries left over from earlier searches get replaced
+ENTRY_SIZE = 16
+SCORE_OFFSET = 1 << 31
+
+
+def pack_move(move):
+    if move is None:
+        return 0
+    from_sq, to_sq, promotion = move
+    return from_sq | to_sq << 7 | promotion << 14
+
+
+def unpack_move(packed):
+    if packed == 0:
+        return None
+    return (packed & 127, packed >> 7 & 127, packed >> 14 & 7)
+
+
+class TranspositionTable:
+    # A fixed size hash table of search results, allocated up front so memory use is known in advance
+    def __init__(self, size_mb=16):
+        # Largest power of two number of entries that fits the budget, so the index is a mask
+        entries = 1
+        while entries * 2 * ENTRY_SIZE <= size_mb * 1024 * 1024:
+            entries *= 2
+
+        self.size = entries
+        self.mask = entries - 1
+        self.keys = array('Q', bytes(8 * entries))
+        self.data = array('Q', bytes(8 * entries))
+        self.generation = 0
+
+    def memory_bytes(self):
+        return self.size * ENTRY_SIZE
+
+    def clear(self):
+        self.keys = array('Q', bytes(8 * self.size))
+        self.data = array('Q', bytes(8 * self.size))
+        self.generation = 0
+
+    def new_search(self):
+        self.generation = (self.generation + 1) & 31
+
+    def store(self, key, depth, score, flag, move=None):
+        index = key & self.mask
+        old = self.data[index]
+
+        # Replace by depth: keep a deeper result for a different position unless it's from an older search
+        if (old and self.keys[index] != key and old >> 59 == self.generation
+                and old >> 17 & 255 > depth):
+            return
+
+        self.keys[index] = key
+        self.data[index] = (pack_move(move) | max(0, min(depth, 255)) << 17 | flag << 25
+                            | (score + SCORE_OFFSET) << 27 | self.generation << 59)
+
+    def probe(self, key):
+        # (depth, score, flag, move) for key, or None if it isn't stored
+        index = key & self.mask
+        data = self.data[index]
+        if data == 0 or self.keys[index] != key:
+            return None
+        return (data >> 17 & 255, (data >> 27 & 0xFFFFFFFF) - SCORE_OFFSET, data >> 25 & 3, unpack_move(data & 0x1FFFF))
+
+    def hashfull(self):
+        # Permille of the first thousand slots used by the current search, as UCI reports it
+        sample = min(1000, self.size)
+        used = sum(1 for index in range(sample) if self.data[index] and self.data[index] >> 59 == self.generation)
+        return used * 1000 // sample
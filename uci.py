@@ -0,0 +1,286 @@
+import sys
+import threading
+
+from book import OpeningBook
+from engine import EngineWorker, MATE_SCORE, MAX_PLY
+from perft import divide
+from piece import Piece
+from position import Position, STARTING_FEN, move_name
+
+ENGINE_NAME = "SupraOng Chess"
+ENGINE_AUTHOR = "SupraOng"
+
+DEFAULT_HASH_MB = 16
+MAX_HASH_MB = 1024
+
+# With only a clock to go on, plan as if this many moves remain
+DEFAULT_MOVES_TO_GO = 30
+
+# Kept back from every clock based move time for communication lag (seconds)
+MOVE_OVERHEAD = 0.05
+
+
+def format_score(score):
+    # Centipawns, or moves to mate once a forced mate is found
+    if abs(score) >= MATE_SCORE - MAX_PLY:
+        moves = (MATE_SCORE - abs(score) + 1) // 2
+        return f"mate {moves if score > 0 else -moves}"
+    return f"cp {score}"
+
+
+def parse_move(position, name):
+    # The legal move with this long algebraic name (e2e4, e7e8q)
+    for move in position.legal_moves():
+        if move_name(move) == name:
+            return move
+    raise ValueError(f"illegal move {name}")
+
+
+def parse_int(value):
+    # None for anything that isn't a whole number
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class UciEngine:
+    # Speaks UCI on a pair of text streams. The search runs on an EngineWorker thread while this
+    # thread keeps reading commands, so stop and isready are answered during a search.
+    def __init__(self, input_stream=sys.stdin, output_stream=sys.stdout):
+        self.input = input_stream
+        self.output = output_stream
+        self.output_lock = threading.Lock()
+
+        self.hash_mb = DEFAULT_HASH_MB
+        self.book_path = None
+        self.tablebase_dir = None
+        self.worker = None
+
+        self.fen = STARTING_FEN
+        self.moves = []
+        self.position = Position()
+
+        # go infinite and go ponder may not answer before stop (or ponderhit), even once the search is done
+        self.hold_bestmove = False
+        self.held_bestmove = None
+        self.bestmove_lock = threading.Lock()
+
+    def send(self, line):
+        # Called from both this thread and the worker's listener thread
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def run(self):
+        for line in self.input:
+            if not self.handle(line.split()):
+                break
+        self.close()
+
+    def close(self):
+        if self.worker is not None:
+            self.worker.close()
+            self.worker = None
+
+    def handle(self, tokens):
+        # Returns False on quit. Unknown commands are ignored, as UCI asks, and a command that fails
+        # is reported with info string rather than ending the engine.
+        if not tokens:
+            return True
+        try:
+            return self.dispatch(tokens[0], tokens[1:])
+        except Exception as error:
+            self.send(f"info string {tokens[0]} failed: {type(error).__name__}: {error}")
+            return True
+
+    def dispatch(self, command, args):
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {DEFAULT_HASH_MB} min 1 max {MAX_HASH_MB}")
+            self.send("option name Book type string default <empty>")
+            self.send("option name EndgameTables type string default <empty>")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.set_option(args)
+        elif command == "ucinewgame":
+            # A fresh worker starts with an empty transposition table
+            self.close()
+        elif command == "position":
+            self.set_position(args)
+        elif command == "go":
+            self.go(args)
+        elif command == "stop":
+            self.release_bestmove()
+            if self.worker is not None:
+                self.worker.stop()
+        elif command == "ponderhit":
+            self.release_bestmove()
+            if self.worker is not None:
+                self.worker.ponderhit()
+        elif command == "perft":
+            depth = parse_int(args[0]) if args else 1
+            if depth is None or depth < 1:
+                self.send(f"info string perft depth should be a positive whole number, not {args[0]}")
+            else:
+                self.perft(depth)
+        elif command == "d":
+            self.send(self.position.to_fen())
+        elif command == "quit":
+            return False
+        return True
+
+    def set_option(self, args):
+        # setoption name <name> value <value>
+        if "name" not in args:
+            return
+        value_index = args.index("value") if "value" in args else len(args)
+        name = " ".join(args[args.index("name") + 1:value_index]).lower()
+        value = " ".join(args[value_index + 1:])
+
+        if name == "hash":
+            size = parse_int(value)
+            if size is None:
+                self.send(f"info string Hash should be a whole number of MB, not {value}")
+                return
+            self.hash_mb = max(1, min(size, MAX_HASH_MB))
+            self.close()
+        elif name == "book":
+            path = value if value and value != "<empty>" else None
+            if path is not None:
+                # Opened here first: a book the worker can't open would leave it unable to search
+                try:
+                    OpeningBook(path).close()
+                except (OSError, ValueError) as error:
+                    self.send(f"info string can't open book {path}: {error}")
+                    return
+            self.book_path = path
+            self.close()
+        elif name == "endgametables":
+            self.tablebase_dir = value if value and value != "<empty>" else None
+            self.close()
+
+    def set_position(self, args):
+        # position startpos|fen <six fields> [moves <move> ...]
+        moves_index = args.index("moves") if "moves" in args else len(args)
+        if args[:1] == ["startpos"]:
+            fen = STARTING_FEN
+        elif args[:1] == ["fen"]:
+            fen = " ".join(args[1:moves_index])
+        else:
+            return
+
+        try:
+            position = Position(fen)
+            moves = []
+            for name in args[moves_index + 1:]:
+                move = parse_move(position, name)
+                position.make_move(move)
+                moves.append(move)
+        except ValueError as error:
+            self.send(f"info string {error}")
+            return
+
+        self.fen = fen
+        self.moves = moves
+        self.position = position
+
+    def go(self, args):
+        limits = {}
+        ponder = False
+        infinite = False
+        clock = {}
+
+        index = 0
+        while index < len(args):
+            token = args[index]
+            value = args[index + 1] if index + 1 < len(args) else None
+            if token in ("depth", "nodes", "movetime") and value is not None:
+                number = parse_int(value)
+                if number is None or number < 1:
+                    self.send(f"info string ignoring go {token} {value}")
+                elif token == "movetime":
+                    limits["movetime"] = number / 1000
+                else:
+                    limits[token] = number
+                index += 1
+            elif token in ("wtime", "btime", "winc", "binc", "movestogo") and value is not None:
+                number = parse_int(value)
+                if number is None:
+                    self.send(f"info string ignoring go {token} {value}")
+                else:
+                    clock[token] = number
+                index += 1
+            elif token == "ponder":
+                ponder = True
+            elif token == "infinite":
+                infinite = True
+            index += 1
+
+        if "movetime" not in limits and not infinite:
+            movetime = self.allot_time(clock)
+            if movetime is not None:
+                limits["movetime"] = movetime
+
+        if self.worker is None:
+            self.worker = EngineWorker(self.on_bestmove, self.on_info, tt_size_mb=self.hash_mb, book_path=self.book_path,
+                                       tablebase_dir=self.tablebase_dir)
+
+        with self.bestmove_lock:
+            self.hold_bestmove = infinite or ponder
+            self.held_bestmove = None
+        self.worker.start(self.fen, self.moves, ponder=ponder, **limits)
+
+    def allot_time(self, clock):
+        # Seconds for this move from the side to move's remaining time and increment, if a clock was given
+        side = "w" if self.position.color_to_move == Piece.white else "b"
+        if side + "time" not in clock:
+            return None
+        remaining = clock[side + "time"] / 1000
+        increment = clock.get(side + "inc", 0) / 1000
+        moves_to_go = clock.get("movestogo", DEFAULT_MOVES_TO_GO)
+
+        movetime = remaining / max(moves_to_go, 1) + increment * 3 / 4
+        # Never risk more than half of what's left
+        return max(0.01, min(movetime, remaining / 2) - MOVE_OVERHEAD)
+
+    def release_bestmove(self):
+        with self.bestmove_lock:
+            self.hold_bestmove = False
+            held, self.held_bestmove = self.held_bestmove, None
+        if held is not None:
+            self.send(held)
+
+    def on_info(self, search_id, info):
+        self.send(f"info depth {info['depth']} score {format_score(info['score'])} nodes {info['nodes']} "
+                  f"time {int(info['time'] * 1000)} nps {info['nps']} hashfull {info['hashfull']} pv {' '.join(info['pv'])}")
+
+    def on_bestmove(self, search_id, move, ponder_move, score):
+        line = "bestmove " + (move_name(move) if move is not None else "0000")
+        if ponder_move is not None:
+            line += " ponder " + move_name(ponder_move)
+
+        with self.bestmove_lock:
+            if self.hold_bestmove:
+                self.held_bestmove = line
+                return
+        self.send(line)
+
+    def perft(self, depth):
+        results = divide(self.position, depth)
+        for name, nodes in results:
+            self.send(f"{name}: {nodes}")
+        self.send("")
+        self.send(f"Nodes searched: {sum(nodes for _, nodes in results)}")
+
+
+def main():
+    UciEngine().run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
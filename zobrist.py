@@ -0,0 +1,22 @@
+import random
+
+# 64-bit Zobrist keys. A fixed seed keeps them identical in every process, so keys can be
+# compared or shared between workers.
+_random = random.Random(0x5EED_C4E5)
+
+# PIECE_KEYS[piece code][0x88 square]
+PIECE_KEYS = [[_random.getrandbits(64) for _ in range(128)] for _ in range(32)]
+
+# Hashed in when black is to move
+SIDE_KEY = _random.getrandbits(64)
+
+# One key per castling right, combined for each of the 16 possible sets of rights
+_CASTLING_RIGHT_KEYS = [_random.getrandbits(64) for _ in range(4)]
+CASTLING_KEYS = [0] * 16
+for _rights in range(16):
+    for _bit in range(4):
+        if _rights & (1 << _bit):
+            CASTLING_KEYS[_rights] ^= _CASTLING_RIGHT_KEYS[_bit]
+
+# Per file of the en passant square, only hashed in when a pawn could actually take en passant
+EN_PASSANT_KEYS = [_random.getrandbits(64) for _ in range(8)]